@@ -0,0 +1,48 @@
+"""
+Gunicorn configuration of the production server.
+
+Gunicorn reads this file from the working directory: run ``gunicorn
+core.wsgi`` from the backend directory. Every value can be overridden
+through the environment variable next to it.
+
+Each worker process runs GUNICORN_THREADS threads, and each thread keeps
+its own database connection for DB_CONN_MAX_AGE seconds (see
+core/settings.py): size the database's connection limit for
+``workers * threads`` connections per server.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# Requests mostly wait on the database: a few threads per worker, and
+# workers to keep every CPU busy
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+
+# Load the application once in the master: workers fork with it imported,
+# start faster and share its memory pages
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Replace each worker after about this many requests, so that slow memory
+# growth never accumulates; the jitter keeps workers from restarting together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    # Loading the application may have connected to the database (see
+    # core/wsgi.py); forked workers must not share that connection
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+    connections.close_all()
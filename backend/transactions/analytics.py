@@ -0,0 +1,252 @@
+"""
+Vectorized analytics over a user's whole transaction history.
+
+``get_history()`` loads the history once into NumPy arrays sorted by day:
+
+- ``days``: int32 day ordinals (``date.toordinal()``);
+- ``cents``: int64 amounts in cents, in the user's reporting currency;
+- ``types``: int8 index in TYPE_CODES;
+- ``categories``: int8 index in CATEGORY_CODES.
+
+That is 14 bytes per transaction. The arrays are cached per user and data
+version, so a Transaction write makes them unreachable, as for cached
+responses (see caching.py). Totals, rolling windows, counts and
+distributions are then computed with array operations instead of a
+Python loop per row.
+
+NumPy is optional: without it ``available()`` is False and callers keep
+their database aggregations. Insights switch to this engine once a user
+has ANALYTICS_MIN_TRANSACTIONS transactions.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Any, NamedTuple
+
+from django.conf import settings
+from django.db.models import Sum
+
+from .caching import get_cache, get_data_version
+from .models import MonthlyRollup, Transaction
+from . import currencies, periods, rollups, timeseries
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+KEY_PREFIX = 'analytics'
+TYPE_CODES = tuple(Transaction.TransactionType.values)
+CATEGORY_CODES = tuple(Transaction.Category.values)
+EXPENSE = Transaction.TransactionType.EXPENSE
+# Ordinal of the NumPy datetime64 epoch
+EPOCH = date(1970, 1, 1).toordinal()
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def available():
+    """Return whether NumPy is installed."""
+    return np is not None
+
+
+class History(NamedTuple):
+    """A user's transactions as parallel arrays, sorted by day."""
+    days: Any
+    cents: Any
+    types: Any
+    categories: Any
+
+    @property
+    def size(self):
+        return len(self.days)
+
+    def select(self, date_range=None, transaction_type=None):
+        """Return the transactions in a DateRange and/or of one type."""
+        history = self
+        if date_range is not None:
+            # Sorted by day: a range is a slice
+            start = np.searchsorted(self.days, date_range.start.toordinal())
+            end = (
+                self.size if date_range.end is None
+                else np.searchsorted(self.days, date_range.end.toordinal())
+            )
+            history = History(*(array[start:end] for array in self))
+        if transaction_type is not None:
+            mask = history.types == TYPE_CODES.index(transaction_type)
+            history = History(*(array[mask] for array in history))
+        return history
+
+
+def to_decimal(cents):
+    """Convert a (NumPy) integer amount in cents to a Decimal."""
+    return Decimal(int(round(cents))).scaleb(-2)
+
+
+def load_history(user):
+    """Read the transactions of ``user`` into a History; one query."""
+    rows = list(
+        rollups.with_month(Transaction.objects.filter(user=user)).order_by('date', 'id')
+        .annotate(converted=currencies.converted('amount', user.reporting_currency))
+        .values_list('date', 'converted', 'transaction_type', 'category')
+    )
+    count = len(rows)
+    type_index = {code: index for index, code in enumerate(TYPE_CODES)}
+    category_index = {code: index for index, code in enumerate(CATEGORY_CODES)}
+    return History(
+        days=np.fromiter((row[0].toordinal() for row in rows), np.int32, count),
+        # Amounts have 2 decimal places
+        cents=np.fromiter((int(row[1].scaleb(2)) for row in rows), np.int64, count),
+        types=np.fromiter((type_index[row[2]] for row in rows), np.int8, count),
+        categories=np.fromiter((category_index[row[3]] for row in rows), np.int8, count),
+    )
+
+
+def get_history(user, version=None):
+    """Return the History of ``user``, cached per data version."""
+    if version is None:
+        version = get_data_version(user)
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:{user.pk}:{version}'
+    history = cache.get(key)
+    if history is None:
+        history = load_history(user)
+        cache.set(key, history, timeout=settings.ANALYTICS_CACHE_TIMEOUT)
+    return history
+
+
+def use_engine(user):
+    """Return whether analytics for ``user`` should run on the arrays."""
+    if not available():
+        return False
+    # The rollup counts give the history size without touching Transaction
+    size = MonthlyRollup.objects.filter(user=user).aggregate(size=Sum('count'))['size'] or 0
+    return size >= settings.ANALYTICS_MIN_TRANSACTIONS
+
+
+def _sums(keys, cents, size):
+    # Float weights are exact for sums below 2**53 cents
+    totals = np.bincount(keys, weights=cents, minlength=size)
+    counts = np.bincount(keys, minlength=size)
+    return totals, counts
+
+
+def grouped_totals(history):
+    """Return ``{(transaction_type, category): (total, count)}`` for non-empty groups."""
+    width = len(CATEGORY_CODES)
+    keys = history.types.astype(np.int64) * width + history.categories
+    totals, counts = _sums(keys, history.cents, len(TYPE_CODES) * width)
+    return {
+        (TYPE_CODES[key // width], CATEGORY_CODES[key % width]): (to_decimal(totals[key]), int(counts[key]))
+        for key in np.flatnonzero(counts)
+    }
+
+
+def category_totals(history, transaction_type=EXPENSE, date_range=None):
+    """Return ``{category: (total, count)}`` for categories with transactions."""
+    selected = history.select(date_range, transaction_type)
+    totals, counts = _sums(selected.categories, selected.cents, len(CATEGORY_CODES))
+    return {
+        CATEGORY_CODES[index]: (to_decimal(totals[index]), int(counts[index]))
+        for index in np.flatnonzero(counts)
+    }
+
+
+def window_stats(history, ranges):
+    """Return ``(window, transaction_type, category, total, count)`` rows for insights.
+
+    ``ranges`` maps window names to DateRanges, as in insights.collect_stats().
+    """
+    return [
+        (name, transaction_type, category, total, count)
+        for name, date_range in ranges.items()
+        for (transaction_type, category), (total, count) in grouped_totals(history.select(date_range)).items()
+    ]
+
+
+def _bucket_keys(days, granularity):
+    """Return the first day (as an ordinal) of each day's bucket."""
+    if granularity == timeseries.DAY:
+        return days
+    if granularity == timeseries.WEEK:
+        # Ordinal 1 is a Monday
+        return days - (days - 1) % 7
+    months = (days - EPOCH).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    months -= months % {timeseries.MONTH: 1, timeseries.QUARTER: 3, timeseries.YEAR: 12}[granularity]
+    return (months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + EPOCH)
+
+
+def period_totals(history, granularity=timeseries.MONTH, date_range=None):
+    """Return ``{bucket start: (income, expenses)}``, as timeseries.fill_series() takes."""
+    selected = history.select(date_range)
+    buckets, inverse = np.unique(_bucket_keys(selected.days, granularity), return_inverse=True)
+    expense = TYPE_CODES.index(EXPENSE)
+    is_expense = selected.types == expense
+    income = np.bincount(inverse, weights=np.where(is_expense, 0, selected.cents), minlength=len(buckets))
+    expenses = np.bincount(inverse, weights=np.where(is_expense, selected.cents, 0), minlength=len(buckets))
+    return {
+        date.fromordinal(int(bucket)): (to_decimal(income[index]), to_decimal(expenses[index]))
+        for index, bucket in enumerate(buckets)
+    }
+
+
+def rolling_totals(history, days, date_range, transaction_type=EXPENSE):
+    """Return the total of the last ``days`` days at each day of a bounded range.
+
+    Returns a list of ``{'date', 'total'}`` dicts, one per day.
+    """
+    start, end = date_range.start.toordinal(), date_range.end.toordinal()
+    first = start - days + 1
+    selected = history.select(periods.DateRange(date.fromordinal(first), date_range.end), transaction_type)
+    daily = np.bincount(selected.days - first, weights=selected.cents, minlength=end - first)
+    cumulative = np.concatenate(([0], np.cumsum(daily)))
+    # Each window is a difference of two prefix sums
+    windows = cumulative[days:] - cumulative[:-days]
+    return [
+        {'date': date.fromordinal(start + offset), 'total': to_decimal(total)}
+        for offset, total in enumerate(windows)
+    ]
+
+
+def weekday_counts(history, transaction_type=EXPENSE, date_range=None):
+    """Return the number of transactions per weekday, Monday first."""
+    selected = history.select(date_range, transaction_type)
+    return np.bincount((selected.days - 1) % 7, minlength=7).tolist()
+
+
+def distribution(history, category, transaction_type=EXPENSE, date_range=None):
+    """Return summary statistics of the amounts of one category, or None without any."""
+    selected = history.select(date_range, transaction_type)
+    cents = selected.cents[selected.categories == CATEGORY_CODES.index(category)]
+    if not len(cents):
+        return None
+    return {
+        'count': len(cents),
+        'mean': to_decimal(cents.mean()),
+        'std': to_decimal(cents.std()),
+        'min': to_decimal(cents.min()),
+        'max': to_decimal(cents.max()),
+        'percentiles': {
+            str(percentile): to_decimal(value)
+            for percentile, value in zip(PERCENTILES, np.percentile(cents, PERCENTILES))
+        },
+    }
+
+
+def expense_report(history, date_range, today, rolling_days=30):
+    """Return the payload of the analytics endpoint for a DateRange (or None for everything)."""
+    if date_range is None:
+        first_day = date.fromordinal(int(history.days[0])) if history.size else today
+        date_range = periods.DateRange(first_day)
+    bounded = periods.DateRange(date_range.start, date_range.end or today + timedelta(days=1))
+    totals = category_totals(history, EXPENSE, date_range)
+    return {
+        'category_totals': [
+            {'category': category, 'total': total, 'count': count}
+            for category, (total, count) in sorted(totals.items(), key=lambda item: item[1][0], reverse=True)
+        ],
+        'rolling_totals': rolling_totals(history, rolling_days, bounded),
+        'weekday_counts': weekday_counts(history, EXPENSE, date_range),
+        'distributions': {
+            category: distribution(history, category, EXPENSE, date_range)
+            for category in totals
+        },
+    }
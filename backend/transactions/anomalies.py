@@ -0,0 +1,209 @@
+"""
+Unusual-transaction detection from running per-category statistics.
+
+CategoryStats holds, per (user, transaction type, category, currency),
+Welford's running count, mean and sum of squared deviations of the
+amounts, plus an exponentially weighted mean and variance over roughly the
+last RECENT_TRANSACTIONS transactions. The signal handlers in signals.py update
+them in O(1) per written transaction, so no write ever rescans history.
+
+A new expense, or an edited one whose amount, category or currency
+changed, is compared with the statistics of its category before it is
+counted; other edits leave the statistics alone. It is flagged with an ANOMALY insight when it is
+more than ANOMALY_THRESHOLD standard deviations above both the all-time
+and the recent mean: a one-off spike, not a lasting change of habits.
+
+Removals are undone exactly for the all-time statistics but can't be
+taken out of the recent ones; ``rebuild()`` recomputes both exactly.
+"""
+import math
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from django.utils import timezone
+
+from .insights import category_display
+from .models import CategoryStats, FinancialInsight, Transaction
+
+KEY_FIELDS = ('user_id', 'transaction_type', 'category', 'currency')
+EXPENSE = Transaction.TransactionType.EXPENSE
+
+# Weight of a new transaction in the recent statistics (an N-transaction EMA)
+RECENT_TRANSACTIONS = 20
+RECENT_WEIGHT = 2 / (RECENT_TRANSACTIONS + 1)
+# Transactions a category needs before its outliers are flagged
+ANOMALY_MIN_COUNT = 10
+# Standard deviations above the mean
+ANOMALY_THRESHOLD = 3.0
+# Backdated (e.g. imported) transactions older than this are not flagged
+ANOMALY_MAX_AGE_DAYS = 30
+
+
+def _key(row):
+    return (row.user_id, row.transaction_type, row.category, row.currency)
+
+
+def add_value(stats, value):
+    """Add an amount to the statistics of a CategoryStats instance."""
+    stats.count += 1
+    delta = value - stats.mean
+    stats.mean += delta / stats.count
+    stats.m2 += delta * (value - stats.mean)
+    if stats.count == 1:
+        stats.recent_mean, stats.recent_variance = value, 0.0
+    else:
+        recent_delta = value - stats.recent_mean
+        increment = RECENT_WEIGHT * recent_delta
+        stats.recent_mean += increment
+        stats.recent_variance = (1 - RECENT_WEIGHT) * (stats.recent_variance + recent_delta * increment)
+
+
+def remove_value(stats, value):
+    """Take an amount out of the all-time statistics; Welford's update reversed."""
+    if stats.count <= 1:
+        stats.count, stats.mean, stats.m2 = 0, 0.0, 0.0
+        return
+    stats.count -= 1
+    previous_mean = stats.mean
+    stats.mean = (previous_mean * (stats.count + 1) - value) / stats.count
+    # Rounding must not make the squared deviations negative
+    stats.m2 = max(stats.m2 - (value - previous_mean) * (value - stats.mean), 0.0)
+
+
+def _score(value, mean, variance):
+    """Standard deviations of ``value`` above ``mean``."""
+    if value <= mean:
+        return 0.0
+    return (value - mean) / math.sqrt(variance) if variance > 0 else math.inf
+
+
+def anomaly_score(stats, value):
+    """Return how unusual an amount is for a category, or None when it isn't.
+
+    The score is the smaller of the all-time and recent z-scores.
+    """
+    if stats.count < ANOMALY_MIN_COUNT:
+        return None
+    score = min(
+        _score(value, stats.mean, stats.variance),
+        _score(value, stats.recent_mean, stats.recent_variance)
+    )
+    return score if score > ANOMALY_THRESHOLD else None
+
+
+def apply_changes(removed=(), added=()):
+    """Apply removed/added transaction snapshots to the statistics.
+
+    Each added expense is scored against its category before it is
+    counted. Rows removed and added again with the same key and amount (an
+    edit of e.g. the description) are skipped: they would be counted again
+    in the recent statistics and flagged again. Returns the ANOMALY
+    insights created, at most one per category and call so that an import
+    does not flood the user.
+    """
+    previous = {row.id: row for row in removed}
+    unchanged = set()
+    changes = defaultdict(lambda: ([], []))
+    for row in added:
+        old = previous.get(row.id)
+        if old is not None and _key(old) == _key(row) and old.amount == row.amount:
+            unchanged.add(row.id)
+            continue
+        changes[_key(row)][1].append(row)
+    for row in removed:
+        if row.id not in unchanged:
+            changes[_key(row)][0].append(row)
+
+    oldest = timezone.now().date() - timedelta(days=ANOMALY_MAX_AGE_DAYS)
+    insights = []
+    with db_transaction.atomic():
+        for key, (removed_rows, added_rows) in changes.items():
+            lookup = dict(zip(KEY_FIELDS, key))
+            stats = CategoryStats.objects.filter(**lookup).first()
+            if stats is None:
+                if not added_rows:
+                    # Removals never create rows, as for rollups
+                    continue
+                stats = CategoryStats(**lookup)
+
+            for row in removed_rows:
+                remove_value(stats, float(row.amount))
+            flagged = None
+            for row in added_rows:
+                value = float(row.amount)
+                if row.transaction_type == EXPENSE and row.date >= oldest:
+                    score = anomaly_score(stats, value)
+                    if score is not None and (flagged is None or score > flagged[0]):
+                        flagged = (score, row, stats.mean)
+                add_value(stats, value)
+            if flagged is not None:
+                insights.append(build_insight(*flagged))
+
+            if stats.count:
+                stats.save()
+            elif stats.pk is not None:
+                stats.delete()
+        FinancialInsight.objects.bulk_create(insights)
+    return insights
+
+
+def _money(amount, currency):
+    if currency == 'USD':
+        return f'${amount:.2f}'
+    return f'{amount:.2f} {currency}'
+
+
+def build_insight(score, row, mean):
+    """Return an unsaved ANOMALY insight about a transaction snapshot."""
+    display = category_display(row.category)
+    usual = Decimal(f'{mean:.2f}')
+    content = f"You spent {_money(row.amount, row.currency)} on {display} on {row.date:%B %d}"
+    if usual > 0:
+        content += f", {row.amount / usual:.1f} times your usual {_money(usual, row.currency)}"
+    content += ". If you don't recognize this transaction, check it with your bank."
+    insight = FinancialInsight(
+        user_id=row.user_id,
+        insight_type=FinancialInsight.InsightType.ANOMALY,
+        title=f"Unusual {display} expense",
+        content=content
+    )
+    insight.data = {
+        'transaction_id': row.id,
+        'category': row.category,
+        'category_display': display,
+        'amount': float(row.amount),
+        'usual_amount': float(usual),
+        'currency': row.currency,
+        'score': None if math.isinf(score) else round(score, 1),
+        'date': row.date.isoformat(),
+    }
+    return insight
+
+
+def rebuild(user=None, batch_size=1000):
+    """Recompute the statistics from the Transaction table.
+
+    Transactions are replayed oldest first, so the recent statistics cover
+    the latest transactions by date. Returns the number of rows written.
+    """
+    transactions = Transaction.objects.all()
+    stats_qs = CategoryStats.objects.all()
+    if user is not None:
+        transactions = transactions.filter(user=user)
+        stats_qs = stats_qs.filter(user=user)
+
+    stats = {}
+    rows = transactions.order_by('date', 'id').values_list(*KEY_FIELDS, 'amount')
+    for *key, amount in rows.iterator(chunk_size=batch_size):
+        key = tuple(key)
+        entry = stats.get(key)
+        if entry is None:
+            entry = stats[key] = CategoryStats(**dict(zip(KEY_FIELDS, key)))
+        add_value(entry, float(amount))
+
+    with db_transaction.atomic():
+        stats_qs.delete()
+        CategoryStats.objects.bulk_create(stats.values(), batch_size=batch_size)
+    return len(stats)
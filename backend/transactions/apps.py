@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TransactionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'transactions'
+
+    def ready(self):
+        # Register the handlers that keep derived tables in sync
+        from . import signals  # noqa: F401
+        from .search import restore_triggers
+        post_migrate.connect(restore_triggers, sender=self)
@@ -0,0 +1,251 @@
+"""
+Running balances from monthly BalanceCheckpoints.
+
+A checkpoint holds a user's closing balance (income minus expenses) in one
+currency at the end of a month with transactions in it. Writes keep them
+up to date: a change of ``d`` to month M adds ``d`` to the checkpoint of M
+and of every later month, so a backdated edit repairs the checkpoints after
+it with a single UPDATE. Months without a checkpoint close at the balance
+of the latest earlier one.
+
+The balance at the end of any day is then the closing balance of the
+previous month, one index seek per currency, plus the transactions of the
+day's own month up to that day. Running-balance series start from a
+checkpoint too. Balances in several currencies are added up in the user's
+reporting currency at the rates of the month they are reported for.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Subquery, Sum, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import BalanceCheckpoint, Transaction
+from . import currencies, timeseries
+
+CENT = Decimal('0.01')
+EXPENSE = Transaction.TransactionType.EXPENSE
+
+# Signed amount of a transaction, for aggregations
+NET_AMOUNT = Case(
+    When(transaction_type=EXPENSE, then=F('amount') * -1),
+    default=F('amount'),
+    output_field=DecimalField(max_digits=16, decimal_places=2)
+)
+
+
+def _net(row):
+    return -row.amount if row.transaction_type == EXPENSE else row.amount
+
+
+def apply_changes(removed=(), added=()):
+    """Apply removed/added transaction snapshots to the checkpoints.
+
+    Changes to the same month are netted first, like rollups.apply_changes().
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), False])
+    for row in removed:
+        deltas[row.user_id, row.currency, row.date.replace(day=1)][0] -= _net(row)
+    for row in added:
+        delta = deltas[row.user_id, row.currency, row.date.replace(day=1)]
+        delta[0] += _net(row)
+        delta[1] = True
+
+    with db_transaction.atomic():
+        for (user_id, currency, month), (amount, has_added) in deltas.items():
+            if not amount and not has_added:
+                continue
+            _apply_delta(user_id, currency, month, amount, has_added)
+
+
+def _apply_delta(user_id, currency, month, amount, create):
+    checkpoints = BalanceCheckpoint.objects.filter(user_id=user_id, currency=currency)
+    if amount:
+        # Backdated changes move every later closing balance
+        checkpoints.filter(month__gt=month).update(balance=F('balance') + amount)
+    updated = checkpoints.filter(month=month).update(balance=F('balance') + amount)
+    # Removals never create rows, as for rollups
+    if updated or not create:
+        return
+    opening = _closing_before(checkpoints, month)
+    try:
+        with db_transaction.atomic():
+            BalanceCheckpoint.objects.create(
+                user_id=user_id, currency=currency, month=month, balance=opening + amount
+            )
+    except IntegrityError:
+        # Created concurrently by another writer
+        checkpoints.filter(month=month).update(balance=F('balance') + amount)
+
+
+def _closing_before(checkpoints, month):
+    """Closing balance of the last month before ``month``; one index seek."""
+    closing = checkpoints.filter(month__lt=month).order_by('-month').values_list('balance', flat=True).first()
+    return Decimal('0') if closing is None else closing
+
+
+def _closings(checkpoints, month=None):
+    """Return ``{currency: closing balance}`` of the last checkpoints (before ``month``); one query."""
+    if month is not None:
+        checkpoints = checkpoints.filter(month__lt=month)
+    last = checkpoints.filter(currency=OuterRef('currency')).order_by('-month').values('month')[:1]
+    return dict(checkpoints.filter(month=Subquery(last)).values_list('currency', 'balance'))
+
+
+def _expected_checkpoints(transactions):
+    """Yield ``(user_id, currency, month, balance)`` computed from a Transaction queryset."""
+    months = (
+        transactions
+        .annotate(month=TruncMonth('date'))
+        .values_list('user_id', 'currency', 'month')
+        .annotate(net=Sum(NET_AMOUNT))
+        .order_by('user_id', 'currency', 'month')
+    )
+    key, balance = None, Decimal('0')
+    for user_id, currency, month, net in months.iterator():
+        if (user_id, currency) != key:
+            key, balance = (user_id, currency), Decimal('0')
+        balance += net
+        yield user_id, currency, month, balance
+
+
+def rebuild(user=None, batch_size=1000):
+    """Recompute the checkpoints from the Transaction table.
+
+    Returns the number of checkpoints written.
+    """
+    transactions = Transaction.objects.all()
+    checkpoints = BalanceCheckpoint.objects.all()
+    if user is not None:
+        transactions = transactions.filter(user=user)
+        checkpoints = checkpoints.filter(user=user)
+
+    with db_transaction.atomic():
+        checkpoints.delete()
+        written = len(BalanceCheckpoint.objects.bulk_create([
+            BalanceCheckpoint(user_id=user_id, currency=currency, month=month, balance=balance)
+            for user_id, currency, month, balance in _expected_checkpoints(transactions)
+        ], batch_size=batch_size))
+    return written
+
+
+def check_consistency(user=None):
+    """Compare checkpoints against balances computed from Transaction.
+
+    Returns a list of ``(user_id, currency, month, expected, actual)``
+    tuples, with ``None`` for a missing checkpoint. A checkpoint left in a
+    month whose transactions were all removed or moved is expected to hold
+    the balance of the month before. An empty list means the checkpoints are
+    consistent.
+    """
+    transactions = Transaction.objects.all()
+    checkpoints = BalanceCheckpoint.objects.all()
+    if user is not None:
+        transactions = transactions.filter(user=user)
+        checkpoints = checkpoints.filter(user=user)
+
+    expected = {
+        # SQLite sums decimals as floats; compare at the column's precision
+        (user_id, currency, month): balance.quantize(CENT)
+        for user_id, currency, month, balance in _expected_checkpoints(transactions)
+    }
+    actual = {
+        (user_id, currency, month): balance
+        for user_id, currency, month, balance in checkpoints.values_list(
+            'user_id', 'currency', 'month', 'balance'
+        ).iterator()
+    }
+
+    mismatches = []
+    carried = {}
+    for key in sorted(expected.keys() | actual.keys()):
+        account = key[:2]
+        if key in expected:
+            carried[account] = expected[key]
+        wanted = carried.get(account, Decimal('0.00'))
+        if actual.get(key) != wanted:
+            mismatches.append((*key, wanted, actual.get(key)))
+    return mismatches
+
+
+def current_balance(user):
+    """Return the balance of every transaction of ``user``, at this month's rates; one query."""
+    closings = _closings(BalanceCheckpoint.objects.filter(user=user))
+    return currencies.convert_totals(closings, user.reporting_currency, timezone.now().date())
+
+
+def balance_as_of(user, day):
+    """Return the balance of ``user`` at the end of ``day``.
+
+    Reads the last checkpoints before ``day``'s month and the transactions
+    of that month up to ``day``: two queries, whatever the user's history.
+    """
+    month = day.replace(day=1)
+    totals = defaultdict(Decimal, _closings(BalanceCheckpoint.objects.filter(user=user), month))
+    tail = Transaction.objects.filter(user=user, date__gte=month, date__lte=day).values_list(
+        'currency'
+    ).annotate(net=Sum(NET_AMOUNT)).order_by()
+    for currency, net in tail:
+        totals[currency] += net
+    return currencies.convert_totals(totals, user.reporting_currency, day)
+
+
+def balance_series(user, start, end, granularity=timeseries.MONTH):
+    """Return the balance at the end of each bucket covering ``start``..``end``.
+
+    As in timeseries.income_expense_series(), buckets cover whole periods.
+    Month, quarter and year series are read from the checkpoints; day and
+    week series from the transactions of the range, after the checkpoints
+    of the month before it. Two queries either way. Each balance is
+    converted at the rates of the month its bucket ends in.
+    """
+    if granularity not in timeseries.GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    first, stop = timeseries.bucket_bounds(start, end, granularity)
+    checkpoints = BalanceCheckpoint.objects.filter(user=user)
+    # {bucket: {currency: amount}}
+    nets = defaultdict(lambda: defaultdict(Decimal))
+    closings = defaultdict(dict)
+
+    if granularity in (timeseries.DAY, timeseries.WEEK):
+        month = first.replace(day=1)
+        balances = defaultdict(Decimal, _closings(checkpoints, month))
+        days = Transaction.objects.filter(user=user, date__gte=month, date__lt=stop).values_list(
+            'date', 'currency'
+        ).annotate(net=Sum(NET_AMOUNT)).order_by()
+        for day, currency, net in days:
+            if day < first:
+                # Between the checkpoint and the first bucket
+                balances[currency] += net
+            else:
+                nets[timeseries.bucket_start(day, granularity)][currency] += net
+    else:
+        balances = defaultdict(Decimal, _closings(checkpoints, first))
+        months = checkpoints.filter(month__gte=first, month__lt=stop).order_by('month').values_list(
+            'month', 'currency', 'balance'
+        )
+        for month, currency, closing in months:
+            # The bucket closes at its last checkpoint
+            closings[timeseries.bucket_start(month, granularity)][currency] = closing
+
+    series = []
+    period = first
+    while period < stop:
+        following = timeseries.next_bucket(period, granularity)
+        for currency, net in nets.get(period, {}).items():
+            balances[currency] += net
+        balances.update(closings.get(period, {}))
+        series.append({
+            'period': period,
+            'year': period.year,
+            'month': period.month,
+            'balance': currencies.convert_totals(
+                balances, user.reporting_currency, following - timedelta(days=1)
+            ),
+        })
+        period = following
+    return series
@@ -0,0 +1,229 @@
+"""
+Batch create/update/delete of transactions.
+
+Every operation of a batch is validated before anything is written; the
+batch is then applied inside one database transaction with one
+``bulk_create``, one ``bulk_update`` and one ``DELETE ... WHERE id IN``.
+Bulk writes bypass the model signals, so the changed rows are reported
+through ``transaction_rows_changed`` once for the whole batch, together
+with the deletions, and derived data (rollups, cache versions) is kept up
+to date as for single writes.
+
+Batches sent with an idempotency key store their response in the same
+database transaction, so a retry of a batch that was applied gets the
+original response back instead of applying it twice.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction as db_transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from .models import BatchRequest, Transaction
+from .serializers import TransactionCreateUpdateSerializer
+from .signals import TransactionRow, collect_row_changes
+
+CREATE = 'create'
+UPDATE = 'update'
+DELETE = 'delete'
+OPERATIONS = (CREATE, UPDATE, DELETE)
+
+# Rows per INSERT / UPDATE statement
+BULK_BATCH_SIZE = 500
+
+
+class BatchInvalid(Exception):
+    """Raised when operations fail validation; nothing has been written."""
+
+    def __init__(self, errors):
+        super().__init__('Invalid batch')
+        # [{'index': ..., 'errors': ...}] in operation order
+        self.errors = [
+            {'index': index, 'errors': errors[index]} for index in sorted(errors)
+        ]
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused with a different batch."""
+
+
+def request_fingerprint(operations):
+    """Return a stable hash of a batch, to detect reused idempotency keys."""
+    raw = json.dumps(operations, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def validate_operations(operations):
+    """Validate a list of operations.
+
+    Returns ``(creates, updates, deletes)``: lists of ``(index, id, data)``
+    with validated data (``id`` is None for creates, ``data`` for deletes).
+    Raises BatchInvalid with the errors of every invalid operation.
+    """
+    if not isinstance(operations, list) or not operations:
+        raise ValidationError({'operations': 'Must be a non-empty list.'})
+    max_operations = settings.TRANSACTION_BATCH_MAX_OPERATIONS
+    if len(operations) > max_operations:
+        raise ValidationError({'operations': f'At most {max_operations} operations are allowed per batch.'})
+
+    errors = {}
+    creates, updates, deletes = [], [], []
+    seen_ids = set()
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            errors[index] = {'op': [f"Must be one of: {', '.join(OPERATIONS)}."]}
+            continue
+        op = operation['op']
+
+        pk = None
+        if op != CREATE:
+            pk = operation.get('id')
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                errors[index] = {'id': ['A transaction id is required.']}
+                continue
+            if pk in seen_ids:
+                errors[index] = {'id': ['Transaction appears more than once in the batch.']}
+                continue
+            seen_ids.add(pk)
+
+        if op == DELETE:
+            deletes.append((index, pk, None))
+            continue
+        data = operation.get('data')
+        if not isinstance(data, dict):
+            errors[index] = {'data': ['Must be an object.']}
+            continue
+        (creates if op == CREATE else updates).append((index, pk, data))
+
+    # One list serializer per kind validates all its items in a single pass
+    validated = {}
+    for items, partial in ((creates, False), (updates, True)):
+        if not items:
+            continue
+        serializer = TransactionCreateUpdateSerializer(
+            data=[data for _, _, data in items], many=True, partial=partial
+        )
+        if serializer.is_valid():
+            validated.update(zip((index for index, _, _ in items), serializer.validated_data))
+        else:
+            for (index, _, _), item_errors in zip(items, serializer.errors):
+                if item_errors:
+                    errors[index] = item_errors
+
+    if errors:
+        raise BatchInvalid(errors)
+    return (
+        [(index, pk, validated[index]) for index, pk, _ in creates],
+        [(index, pk, validated[index]) for index, pk, _ in updates],
+        deletes,
+    )
+
+
+def apply_operations(user, creates, updates, deletes):
+    """Apply validated operations for ``user``; return the per-item results.
+
+    Must run inside a database transaction. Raises BatchInvalid when an
+    updated or deleted transaction does not exist or belongs to someone else.
+    """
+    existing = Transaction.objects.select_for_update().filter(user=user).in_bulk(
+        [pk for _, pk, _ in updates + deletes]
+    )
+    missing = {
+        index: {'id': ['Not found.']}
+        for index, pk, _ in updates + deletes
+        if pk not in existing
+    }
+    if missing:
+        raise BatchInvalid(missing)
+
+    results = []
+    with collect_row_changes() as (removed, added):
+        created = [
+            Transaction(user=user, **{'currency': user.reporting_currency, **data}) for _, _, data in creates
+        ]
+        Transaction.objects.bulk_create(created, batch_size=BULK_BATCH_SIZE)
+        for (index, _, _), instance in zip(creates, created):
+            added.append(TransactionRow.from_instance(instance))
+            results.append({'index': index, 'op': CREATE, 'id': instance.pk, 'status': status.HTTP_201_CREATED})
+
+        if updates:
+            # bulk_update() does not apply auto_now
+            now = timezone.now()
+            updated = []
+            for index, pk, data in updates:
+                instance = existing[pk]
+                removed.append(TransactionRow.from_instance(instance))
+                for field, value in data.items():
+                    setattr(instance, field, value)
+                instance.updated_at = now
+                added.append(TransactionRow.from_instance(instance))
+                updated.append(instance)
+                results.append({'index': index, 'op': UPDATE, 'id': pk, 'status': status.HTTP_200_OK})
+            Transaction.objects.bulk_update(
+                updated,
+                fields=[*TransactionCreateUpdateSerializer.Meta.fields, 'updated_at'],
+                batch_size=BULK_BATCH_SIZE
+            )
+
+        if deletes:
+            for index, pk, _ in deletes:
+                results.append({'index': index, 'op': DELETE, 'id': pk, 'status': status.HTTP_204_NO_CONTENT})
+            # One DELETE ... IN; the post_delete signals add the removed rows
+            Transaction.objects.filter(pk__in=[pk for _, pk, _ in deletes]).delete()
+
+    results.sort(key=lambda result: result['index'])
+    return results
+
+
+def run_batch(user, operations, idempotency_key=None):
+    """Validate and apply a batch for ``user``; return the response body.
+
+    With an ``idempotency_key``, a batch already applied under that key is
+    not applied again: its stored response is returned instead. Keys are
+    kept for TRANSACTION_BATCH_IDEMPOTENCY_TTL seconds.
+    """
+    fingerprint = request_fingerprint(operations)
+    if idempotency_key:
+        expired = timezone.now() - timedelta(seconds=settings.TRANSACTION_BATCH_IDEMPOTENCY_TTL)
+        BatchRequest.objects.filter(user=user, created_at__lt=expired).delete()
+        stored = BatchRequest.objects.filter(user=user, idempotency_key=idempotency_key).first()
+        if stored is not None:
+            return _replay(stored, fingerprint)
+
+    creates, updates, deletes = validate_operations(operations)
+
+    with db_transaction.atomic():
+        record = None
+        if idempotency_key:
+            # Claimed before writing, so a concurrent retry waits on the
+            # unique key and then replays this batch's response.
+            try:
+                with db_transaction.atomic():
+                    record = BatchRequest.objects.create(
+                        user=user,
+                        idempotency_key=idempotency_key,
+                        fingerprint=fingerprint,
+                        response_data='{}'
+                    )
+            except IntegrityError:
+                return _replay(
+                    BatchRequest.objects.get(user=user, idempotency_key=idempotency_key),
+                    fingerprint
+                )
+
+        response = {'results': apply_operations(user, creates, updates, deletes)}
+        if record is not None:
+            record.response = response
+            record.save(update_fields=['response_data'])
+    return response
+
+
+def _replay(stored, fingerprint):
+    if stored.fingerprint != fingerprint:
+        raise IdempotencyConflict('This Idempotency-Key was already used with a different batch.')
+    return stored.response
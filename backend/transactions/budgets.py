@@ -0,0 +1,98 @@
+"""
+Bulk budget usage calculation.
+
+Spending for every category is read with one grouped rollup query, after
+which the usage of any number of budgets is computed in Python. Serializers
+and views share a BudgetUsageCalculator instead of calling
+Budget.get_usage_percentage() once per budget.
+
+Spending is converted into the user's reporting currency in the query;
+budgets in another currency are compared with it at the current month's
+rates and report their spending in their own currency.
+"""
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.db.models import Q, Sum
+from django.utils.functional import cached_property
+
+from .models import Budget, MonthlyRollup, Transaction
+from . import currencies
+
+
+class BudgetUsage(NamedTuple):
+    """Spending against one budget for its current period."""
+    spent: Decimal
+    remaining: Decimal
+    percentage: int
+
+
+def usage_percentage(spent, amount):
+    """Return the whole percentage of ``amount`` used by ``spent``, capped at 100."""
+    if not spent or not amount:
+        return 0
+    return min(100, int((abs(spent) / amount) * 100))
+
+
+class BudgetUsageCalculator:
+    """Compute usage for all of a user's budgets from a single query.
+
+    The query only runs the first time usage is requested, so the
+    calculator can be put in serializer context unconditionally. Callers
+    that already aggregated spending can pass it as ``spent`` (in the
+    format of the ``spent`` property) to skip the query.
+    """
+
+    def __init__(self, user, year=None, month=None, spent=None):
+        today = date.today()
+        self.user = user
+        self.currency = user.reporting_currency
+        self.year = year or today.year
+        self.month = month or today.month
+        if spent is not None:
+            self.__dict__['spent'] = spent
+
+    @cached_property
+    def spent(self):
+        """Expenses per category as ``{category: {period: total}}``, in the reporting currency."""
+        total = currencies.converted('total', self.currency)
+        rows = MonthlyRollup.objects.filter(
+            user=self.user,
+            transaction_type=Transaction.TransactionType.EXPENSE,
+            year=self.year
+        ).values('category').annotate(
+            monthly=Sum(total, filter=Q(month=self.month)),
+            yearly=Sum(total)
+        ).order_by()
+        return {
+            row['category']: {
+                Budget.Period.MONTHLY: row['monthly'] or Decimal('0'),
+                Budget.Period.YEARLY: row['yearly'] or Decimal('0'),
+            }
+            for row in rows
+        }
+
+    @property
+    def total_monthly_expenses(self):
+        """Return all expenses of the selected month."""
+        return sum(
+            (periods[Budget.Period.MONTHLY] for periods in self.spent.values()),
+            Decimal('0')
+        )
+
+    def amount(self, budget):
+        """Return the amount of ``budget`` in the reporting currency."""
+        return currencies.convert(Decimal(budget.amount), budget.currency, self.currency, self.year, self.month)
+
+    def usage(self, budget):
+        """Return the BudgetUsage of ``budget`` for its current period, in the budget's currency."""
+        spent = abs(self.spent.get(budget.category, {}).get(budget.period, Decimal('0')))
+        percentage = usage_percentage(spent, self.amount(budget))
+        spent = currencies.convert(spent, self.currency, budget.currency, self.year, self.month)
+        amount = Decimal(budget.amount)
+        return BudgetUsage(
+            spent=spent,
+            remaining=max(Decimal('0'), amount - spent),
+            percentage=percentage,
+        )
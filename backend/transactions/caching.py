@@ -0,0 +1,135 @@
+"""
+Per-user versioned response cache for summary and analytics endpoints.
+
+Entries are stored in Django's cache under a key built from the user, the
+endpoint, the query parameters, today's date and the user's data version
+(UserDataVersion). Every Transaction or Budget write bumps the version in
+the same database transaction, so stale entries are never read again and
+simply expire; nothing is ever deleted by pattern.
+"""
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import UserDataVersion
+
+KEY_PREFIX = 'response'
+STATS_PREFIX = 'response-stats'
+
+# Endpoints that have been decorated, for the hit/miss report
+CACHED_ENDPOINTS = []
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def get_data_version(user):
+    """Return the current data version of ``user``, creating it if needed."""
+    version = UserDataVersion.objects.filter(user=user).values_list('version', flat=True).first()
+    if version is None:
+        # Created on first read so that later deletions always have a row to bump
+        version = UserDataVersion.objects.get_or_create(user=user)[0].version
+    return version
+
+
+def request_data_version(request):
+    """Return the data version of the requesting user, read once per request."""
+    if not hasattr(request, '_data_version'):
+        request._data_version = get_data_version(request.user)
+    return request._data_version
+
+
+def bump_data_versions(user_ids, create=True):
+    """Increment the data version of each user in ``user_ids``.
+
+    With ``create=False`` missing rows are left alone; deletions use this so
+    that cascading a user's deletion never recreates their version row.
+    ``changed_at`` pins the users' reads to the primary database for a
+    while (see replicas.py).
+    """
+    now = timezone.now()
+    for user_id in set(user_ids):
+        versions = UserDataVersion.objects.filter(user_id=user_id)
+        if versions.update(version=F('version') + 1, changed_at=now) or not create:
+            continue
+        try:
+            with db_transaction.atomic():
+                UserDataVersion.objects.create(user_id=user_id, version=1, changed_at=now)
+        except IntegrityError:
+            # Created concurrently by another writer
+            versions.update(version=F('version') + 1, changed_at=now)
+
+
+def response_cache_key(user, endpoint, query_params, version):
+    """Build the cache key of one response."""
+    params = '&'.join(
+        f'{name}={value}'
+        for name in sorted(query_params)
+        for value in query_params.getlist(name)
+    )
+    params_hash = hashlib.md5(params.encode()).hexdigest()
+    # Summaries are relative to today, so entries never outlive the day
+    today = timezone.now().date().isoformat()
+    return f'{KEY_PREFIX}:{user.pk}:{version}:{endpoint}:{today}:{params_hash}'
+
+
+def _count(endpoint, outcome):
+    cache = get_cache()
+    key = f'{STATS_PREFIX}:{endpoint}:{outcome}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, timeout=None)
+
+
+def cache_stats():
+    """Return hit and miss counters per cached endpoint."""
+    cache = get_cache()
+    stats = {}
+    for endpoint in CACHED_ENDPOINTS:
+        hits = cache.get(f'{STATS_PREFIX}:{endpoint}:hits', 0)
+        misses = cache.get(f'{STATS_PREFIX}:{endpoint}:misses', 0)
+        total = hits + misses
+        stats[endpoint] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+    return stats
+
+
+def cached_response(endpoint):
+    """Cache successful responses of a view method per user and data version.
+
+    The wrapped method must return a Response whose data can be pickled.
+    """
+    CACHED_ENDPOINTS.append(endpoint)
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            cache = get_cache()
+            version = request_data_version(request)
+            key = response_cache_key(request.user, endpoint, request.query_params, version)
+
+            data = cache.get(key)
+            if data is not None:
+                _count(endpoint, 'hits')
+                return Response(data)
+
+            _count(endpoint, 'misses')
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.data, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+            return response
+        return wrapper
+    return decorator
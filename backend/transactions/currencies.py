@@ -0,0 +1,204 @@
+"""
+Currency conversion with monthly exchange rates.
+
+Transactions and budgets keep the currency they were entered in; totals
+are reported in each user's reporting currency. An amount is converted at
+the ExchangeRate of its month, or of the latest earlier month with a rate
+(the earliest rate before any). Rates are quoted per unit of the base
+currency, so converting from ``a`` to ``b`` multiplies by ``rate(b) /
+rate(a)``.
+
+Aggregations convert in SQL: ``converted()`` is an expression that looks
+the rates up in the ExchangeRate table, by unique index, for each row
+being summed, and leaves amounts already in the target currency alone.
+Python code converting a handful of totals uses ``convert()``, which
+reads rates from an in-process table. Each process compares the row count
+and latest ``updated_at`` of ExchangeRate with those of its table at most
+every EXCHANGE_RATES_CHECK_INTERVAL seconds, and reloads the table when
+they differ: rates loaded by another process, such as the
+``load_exchange_rates`` command, are picked up without a shared cache.
+"""
+import csv
+import time
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Case, Count, DecimalField, F, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from .caching import bump_data_versions
+from .models import Budget, ExchangeRate, MonthlyRollup
+
+CENT = Decimal('0.01')
+AMOUNT = DecimalField(max_digits=16, decimal_places=2)
+RATE = DecimalField(max_digits=20, decimal_places=10)
+
+
+class RateError(Exception):
+    """Raised when a rate file can't be read."""
+
+
+# In-process rate table: {'version': (rows, last update), 'checked_at': ...,
+# 'rates': {currency: ([(year, month), ...], [rate, ...])}}
+_table = {'version': None, 'checked_at': None, 'rates': {}}
+
+
+def base_currency():
+    return settings.EXCHANGE_RATE_BASE_CURRENCY
+
+
+def _rates():
+    """Return the in-process rate table, reloading it after load_rates() ran anywhere."""
+    now = time.monotonic()
+    checked_at = _table['checked_at']
+    if checked_at is not None and now - checked_at < settings.EXCHANGE_RATES_CHECK_INTERVAL:
+        return _table['rates']
+    version = tuple(ExchangeRate.objects.aggregate(rows=Count('pk'), updated=Max('updated_at')).values())
+    _table['checked_at'] = now
+    if _table['version'] != version:
+        rates = defaultdict(lambda: ([], []))
+        for currency, year, month, rate in ExchangeRate.objects.order_by('currency', 'year', 'month').values_list(
+            'currency', 'year', 'month', 'rate'
+        ):
+            rates[currency][0].append((year, month))
+            rates[currency][1].append(rate)
+        _table['rates'] = dict(rates)
+        _table['version'] = version
+    return _table['rates']
+
+
+def is_supported(currency):
+    """Return whether amounts in ``currency`` can be converted."""
+    return currency == base_currency() or currency in _rates()
+
+
+def supported_currencies():
+    """Return the codes of the currencies that can be converted, sorted."""
+    return sorted({base_currency(), *_rates()})
+
+
+def rate(currency, year, month):
+    """Return the rate of ``currency`` for a month, as used by ``converted()``."""
+    table = _rates()
+    if currency not in table:
+        # As in SQL: the base currency has no rows
+        return Decimal('1')
+    months, rates = table[currency]
+    index = bisect_right(months, (year, month))
+    return rates[index - 1] if index else rates[0]
+
+
+def convert(amount, from_currency, to_currency, year, month):
+    """Convert ``amount`` at the rates of a month, rounded to cents."""
+    if from_currency == to_currency:
+        return amount
+    return (Decimal(amount) * rate(to_currency, year, month) / rate(from_currency, year, month)).quantize(CENT)
+
+
+def convert_totals(totals, to_currency, day):
+    """Return the sum of ``{currency: amount}`` converted at the rates of ``day``'s month."""
+    return sum(
+        (convert(amount, currency, to_currency, day.year, day.month) for currency, amount in totals.items()),
+        Decimal('0')
+    )
+
+
+def _rate_expression(currency):
+    """SQL expression of the rate of ``currency`` for the outer row's ``year`` and ``month``."""
+    rates = ExchangeRate.objects.filter(currency=currency)
+    latest = rates.filter(
+        Q(year__lt=OuterRef('year')) | Q(year=OuterRef('year'), month__lte=OuterRef('month'))
+    ).order_by('-year', '-month').values('rate')[:1]
+    earliest = rates.order_by('year', 'month').values('rate')[:1]
+    # The base currency has no rows
+    return Coalesce(Subquery(latest), Subquery(earliest), Value(Decimal('1')), output_field=RATE)
+
+
+def converted(field, to_currency, currency_field='currency'):
+    """Return an expression of ``field`` converted into ``to_currency``.
+
+    The queryset must have ``year`` and ``month`` fields or annotations
+    (e.g. ExtractYear/ExtractMonth of the transaction date).
+    """
+    return Case(
+        When(**{currency_field: to_currency}, then=F(field)),
+        default=F(field) * _rate_expression(to_currency) / _rate_expression(OuterRef(currency_field)),
+        output_field=AMOUNT
+    )
+
+
+def read_rate_file(path):
+    """Read a CSV file of ``date,currency,rate`` rows (with a header).
+
+    Returns ``{(currency, year, month): average rate}``; rows of the base
+    currency are ignored.
+    """
+    sums = defaultdict(lambda: [Decimal('0'), 0])
+    try:
+        with open(path, newline='', encoding='utf-8') as rate_file:
+            for line, row in enumerate(csv.DictReader(rate_file), start=2):
+                try:
+                    day = date.fromisoformat(row['date'].strip())
+                    currency = row['currency'].strip().upper()
+                    value = Decimal(row['rate'].strip())
+                except (KeyError, AttributeError, ValueError, InvalidOperation):
+                    raise RateError(f'Line {line}: expected an ISO date, a currency code and a rate.')
+                if len(currency) != 3 or value <= 0:
+                    raise RateError(f'Line {line}: expected an ISO date, a currency code and a rate.')
+                if currency == base_currency():
+                    continue
+                entry = sums[currency, day.year, day.month]
+                entry[0] += value
+                entry[1] += 1
+    except OSError as exc:
+        raise RateError(f'Cannot read {path}: {exc}')
+    return {
+        key: (total / count).quantize(Decimal('1e-10'))
+        for key, (total, count) in sums.items()
+    }
+
+
+def load_rates(path=None):
+    """Load a rate file into ExchangeRate, replacing the months it covers.
+
+    Invalidates the cached responses of the users whose converted totals
+    depend on a currency whose rates changed, and only those. Returns
+    ``(rates written, currencies changed, users invalidated)``.
+    """
+    rates = read_rate_file(path or settings.EXCHANGE_RATES_FILE)
+    existing = {
+        (currency, year, month): rate
+        for currency, year, month, rate in ExchangeRate.objects.values_list('currency', 'year', 'month', 'rate')
+    }
+    changed = {key for key, value in rates.items() if existing.get(key) != value}
+    currencies = {currency for currency, _, _ in changed}
+
+    with db_transaction.atomic():
+        for currency, year, month in changed:
+            ExchangeRate.objects.update_or_create(
+                currency=currency, year=year, month=month, defaults={'rate': rates[currency, year, month]}
+            )
+        users = affected_users(currencies)
+        bump_data_versions(users, create=False)
+        db_transaction.on_commit(forget_rates)
+    return len(changed), sorted(currencies), len(users)
+
+
+def forget_rates():
+    """Check the ExchangeRate table again on the next conversion in this process."""
+    _table['checked_at'] = None
+
+
+def affected_users(currencies):
+    """Return the ids of users with converted amounts involving one of ``currencies``."""
+    if not currencies:
+        return set()
+    foreign = ~Q(currency=F('user__reporting_currency'))
+    involved = Q(currency__in=currencies) | Q(user__reporting_currency__in=currencies)
+    users = set(MonthlyRollup.objects.filter(foreign, involved).values_list('user_id', flat=True).distinct())
+    users |= set(Budget.objects.filter(foreign, involved).values_list('user_id', flat=True).distinct())
+    return users
@@ -0,0 +1,148 @@
+"""
+Composite payload of the dashboard page.
+
+The page shows the summary, the monthly chart, the category chart and the
+category lists, which used to be five requests each re-reading overlapping
+months. ``build_dashboard()`` computes all of them from one read of the
+user's monthly rollups, plus one query on Transaction for the partial
+months at either end of the category chart's range: at most two queries,
+whatever the data and the time ranges. Amounts are converted into the
+user's reporting currency as the separate endpoints convert them.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from .models import MonthlyRollup, Transaction
+from . import currencies, periods, rollups, timeseries
+
+INCOME = Transaction.TransactionType.INCOME
+EXPENSE = Transaction.TransactionType.EXPENSE
+
+TIME_RANGES = ('3months', '6months', '1year', 'all')
+# Months shown by the monthly chart before the current one
+MONTHS_BACK = {'3months': 2, '6months': 5, '1year': 12}
+# Days covered by the category chart
+CATEGORY_DAYS = {'3months': 90, '6months': 180, '1year': 365}
+
+INCOME_CATEGORIES = ('SALARY', 'FREELANCE', 'INVESTMENT', 'GIFT', 'OTHER_INC')
+
+
+def categories_by_type():
+    """Return the transaction categories divided into income and expense."""
+    categories = {'income': [], 'expense': []}
+    for value, label in Transaction.Category.choices:
+        kind = 'income' if value in INCOME_CATEGORIES else 'expense'
+        categories[kind].append({'value': value, 'label': label})
+    return categories
+
+
+def _summary(months, balances, currency, today):
+    """Current month totals and expenses per category, plus the all-time balance.
+
+    ``balances`` holds the all-time net per currency; it is converted at
+    this month's rates, as balances.current_balance() does.
+    """
+    month_income = month_expenses = None
+    month_categories = defaultdict(Decimal)
+    for (year, month, transaction_type, category), total in months.items():
+        is_current = (year, month) == (today.year, today.month)
+        if transaction_type == INCOME:
+            if is_current:
+                month_income = (month_income or 0) + total
+        elif transaction_type == EXPENSE:
+            if is_current:
+                month_expenses = (month_expenses or 0) + total
+                month_categories[category] += total
+    return {
+        'total_income': month_income or 0,
+        'total_expenses': abs(month_expenses or 0),
+        'balance': currencies.convert_totals(balances, currency, today),
+        'category_expenses': [
+            {'category': category, 'total': total}
+            for category, total in sorted(month_categories.items(), key=lambda item: item[1], reverse=True)
+        ]
+    }
+
+
+def _monthly_summary(months, time_range, today):
+    """Monthly income/expense series, as the monthly_summary endpoint returns it."""
+    if time_range in MONTHS_BACK:
+        start = periods.months_back(today, MONTHS_BACK[time_range])
+    elif months:
+        start = date(*min(key[:2] for key in months), 1)
+    else:
+        start = today.replace(month=1, day=1)
+    first, stop = timeseries.bucket_bounds(start, today, timeseries.MONTH)
+    in_range = periods.DateRange(first, stop)
+
+    totals = timeseries.fold_months(
+        (
+            (year, month, total if transaction_type == INCOME else 0, total if transaction_type == EXPENSE else 0)
+            for (year, month, transaction_type, category), total in months.items()
+            if date(year, month, 1) in in_range
+        ),
+        timeseries.MONTH
+    )
+    return timeseries.fill_series(totals, first, stop, timeseries.MONTH)
+
+
+def _category_summary(user, months, time_range, today):
+    """Expense totals per category label, as the category_summary endpoint returns them."""
+    totals = defaultdict(Decimal)
+    whole_months = None
+    if time_range in CATEGORY_DAYS:
+        head, whole_months, tail = periods.split_by_month(periods.last_n_days(CATEGORY_DAYS[time_range], today))
+        partial = Q()
+        for part in (head, tail):
+            if part is not None:
+                partial |= Q(**part.as_filter())
+        if partial:
+            # Both partial months in one query
+            partial_totals = rollups.with_month(Transaction.objects.filter(
+                partial,
+                user=user,
+                transaction_type=EXPENSE
+            )).values_list('category').annotate(
+                total=Sum(currencies.converted('amount', user.reporting_currency))
+            ).order_by()
+            for category, total in partial_totals:
+                totals[category] += total
+
+    for (year, month, transaction_type, category), total in months.items():
+        if transaction_type != EXPENSE:
+            continue
+        if time_range not in CATEGORY_DAYS or (whole_months is not None and date(year, month, 1) in whole_months):
+            totals[category] += total
+
+    labels = dict(Transaction.Category.choices)
+    return [
+        {'category': labels.get(category, category), 'total': abs(total)}
+        for category, total in sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    ]
+
+
+def build_dashboard(user, monthly_time_range='6months', category_time_range='6months', today=None):
+    """Return the summary, monthly_summary, category_summary and categories payloads.
+
+    Each payload is the same as the response of the endpoint of that name
+    for the given time ranges.
+    """
+    today = today or timezone.now().date()
+    months = defaultdict(Decimal)
+    balances = defaultdict(Decimal)
+    rows = MonthlyRollup.objects.filter(user=user).annotate(
+        converted=currencies.converted('total', user.reporting_currency)
+    ).values_list('year', 'month', 'transaction_type', 'category', 'currency', 'total', 'converted')
+    for year, month, transaction_type, category, currency, total, converted in rows:
+        months[year, month, transaction_type, category] += converted
+        balances[currency] += total if transaction_type == INCOME else -total
+    return {
+        'summary': _summary(months, balances, user.reporting_currency, today),
+        'monthly_summary': _monthly_summary(months, monthly_time_range, today),
+        'category_summary': _category_summary(user, months, category_time_range, today),
+        'categories': categories_by_type(),
+    }
@@ -0,0 +1,119 @@
+"""
+Streaming export of transactions.
+
+Rows are read with ``values_list().iterator()`` and encoded a chunk at a
+time, so memory use does not depend on the number of exported rows. The
+columns are those of TransactionSerializer, encoded the same way by
+rows.py, so an NDJSON export line matches the list endpoint's item for the
+same transaction.
+
+The columnar export is one JSON document holding the dictionaries and one
+columnar block per chunk; the MessagePack export is a stream of one map per
+row, like NDJSON.
+"""
+import csv
+import io
+import json
+
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .renderers import DICTIONARY_TABLES, columnar_block, msgpack, msgpack_default
+from .rows import COLUMNS, DB_FIELDS, transaction_rows
+
+# Rows fetched per database round trip and encoded per yielded chunk
+CHUNK_SIZE = 2000
+
+CSV = 'csv'
+NDJSON = 'ndjson'
+COLUMNAR = 'columnar'
+MSGPACK = 'msgpack'
+CONTENT_TYPES = {
+    CSV: 'text/csv; charset=utf-8',
+    NDJSON: 'application/x-ndjson; charset=utf-8',
+    COLUMNAR: 'application/vnd.myfintrack.columnar+json',
+    MSGPACK: 'application/msgpack',
+}
+EXTENSIONS = {
+    COLUMNAR: 'json',
+}
+
+
+def export_rows(queryset):
+    """Yield the COLUMNS of every transaction in ``queryset`` as a tuple."""
+    return transaction_rows(queryset.values_list(*DB_FIELDS).iterator(chunk_size=CHUNK_SIZE))
+
+
+def _chunks(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def stream_csv(rows):
+    """Yield CSV text, starting with a header row."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for chunk in _chunks(rows):
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, when there are no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_ndjson(rows):
+    """Yield one JSON object per line."""
+    for chunk in _chunks(rows):
+        yield ''.join(
+            json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + '\n' for row in chunk
+        )
+
+
+def stream_columnar(rows):
+    """Yield a JSON document of columnar blocks sharing one set of dictionaries."""
+    yield '{"dictionaries": %s, "chunks": [' % json.dumps(
+        {field: DICTIONARY_TABLES[field] for field in COLUMNS if field in DICTIONARY_TABLES}
+    )
+    separator = ''
+    for chunk in _chunks(rows):
+        block = columnar_block(COLUMNS, chunk)
+        del block['dictionaries']
+        yield separator + json.dumps(block, ensure_ascii=False)
+        separator = ', '
+    yield ']}'
+
+
+def stream_msgpack(rows):
+    """Yield one MessagePack map per row."""
+    packer = msgpack.Packer(default=msgpack_default)
+    for chunk in _chunks(rows):
+        yield b''.join(packer.pack(dict(zip(COLUMNS, row))) for row in chunk)
+
+
+STREAMERS = {
+    CSV: stream_csv,
+    NDJSON: stream_ndjson,
+    COLUMNAR: stream_columnar,
+    MSGPACK: stream_msgpack,
+}
+
+
+def export_response(queryset, export_format):
+    """Return a StreamingHttpResponse exporting ``queryset`` in one of STREAMERS' formats."""
+    response = StreamingHttpResponse(
+        STREAMERS[export_format](export_rows(queryset)),
+        content_type=CONTENT_TYPES[export_format]
+    )
+    extension = EXTENSIONS.get(export_format, export_format)
+    filename = f'transactions-{timezone.now().date().isoformat()}.{extension}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,235 @@
+"""
+Cash-flow forecast from a user's recent daily series.
+
+The forecast is fitted from one grouped query returning a daily total per
+(transaction type, category) over the last HISTORY_MONTHS whole months and
+the current month so far. For each series it keeps what was booked this
+month and what is still expected:
+
+- recurring income (RECURRING_INCOME, e.g. salary) is expected once a
+  month, at the median of the past monthly totals;
+- categories paid in lumps (at most LUMP_DAYS days with a transaction per
+  month on average, e.g. rent) are expected up to their monthly average;
+- every other category is spent at its average daily rate.
+
+A fitted Forecast is cached per user, day and data version, so the
+forecast endpoint and the budget projections share it and any
+Transaction write makes it unreachable (see caching.py). Projections N
+months ahead are plain arithmetic on it. Amounts are in the user's
+reporting currency.
+"""
+import statistics
+from collections import defaultdict
+from calendar import monthrange
+from datetime import date
+from decimal import Decimal
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from .caching import get_cache, get_data_version
+from .models import BalanceCheckpoint, Budget, Transaction
+from . import balances, currencies, periods, rollups
+
+KEY_PREFIX = 'forecast'
+CENT = Decimal('0.01')
+INCOME = Transaction.TransactionType.INCOME
+EXPENSE = Transaction.TransactionType.EXPENSE
+
+# Whole months the forecast is fitted on
+HISTORY_MONTHS = 6
+MAX_MONTHS_AHEAD = 12
+RECURRING_INCOME = ('SALARY',)
+# Average days with a transaction per month at or below which a category is paid in lumps
+LUMP_DAYS = 2
+
+
+class CategoryForecast(NamedTuple):
+    """Expected amounts of one transaction type and category."""
+    transaction_type: str
+    category: str
+    # Booked in the current month up to today
+    month_to_date: Decimal
+    # Still expected in the current month
+    remaining: Decimal
+    # Expected in each following month
+    monthly: Decimal
+
+    @property
+    def projected(self):
+        """Expected total of the current month."""
+        return self.month_to_date + self.remaining
+
+
+class Forecast(NamedTuple):
+    """A user's fitted forecast as of ``today``, in ``currency``."""
+    today: date
+    currency: str
+    balance: Decimal
+    categories: list
+
+    def of_type(self, transaction_type):
+        return [item for item in self.categories if item.transaction_type == transaction_type]
+
+    def category(self, category, transaction_type=EXPENSE):
+        """Return the CategoryForecast of a category, or None without history."""
+        for item in self.categories:
+            if item.transaction_type == transaction_type and item.category == category:
+                return item
+        return None
+
+
+def _cents(value):
+    return Decimal(value).quantize(CENT)
+
+
+def daily_series(user, start, end):
+    """Return ``{(transaction_type, category): {day: total}}`` for ``start <= day <= end``."""
+    series = defaultdict(dict)
+    transactions = rollups.with_month(Transaction.objects.filter(user=user, date__gte=start, date__lte=end))
+    rows = transactions.values_list('transaction_type', 'category', 'date').annotate(
+        total=Sum(currencies.converted('amount', user.reporting_currency))
+    ).order_by()
+    for transaction_type, category, day, total in rows:
+        # SQLite sums decimals as floats
+        series[transaction_type, category][day] = _cents(total)
+    return series
+
+
+def _fit(transaction_type, category, days, today, observed):
+    """Fit one daily series; ``observed`` lists the whole months it covers."""
+    month_start = today.replace(day=1)
+    days_in_month = monthrange(today.year, today.month)[1]
+    month_to_date = sum((total for day, total in days.items() if day >= month_start), Decimal('0'))
+
+    if not observed:
+        # No whole month yet: extrapolate the current month's pace
+        monthly = month_to_date * days_in_month / today.day
+        remaining = monthly - month_to_date
+        return CategoryForecast(transaction_type, category, month_to_date, _cents(remaining), _cents(monthly))
+
+    month_totals = defaultdict(Decimal)
+    active_days = 0
+    for day, total in days.items():
+        if day < month_start and day.replace(day=1) >= observed[0]:
+            month_totals[day.replace(day=1)] += total
+            active_days += 1
+
+    if category in RECURRING_INCOME:
+        monthly = statistics.median(month_totals.get(month, Decimal('0')) for month in observed)
+        remaining = max(monthly - month_to_date, Decimal('0'))
+    else:
+        monthly = sum(month_totals.values(), Decimal('0')) / len(observed)
+        if active_days / len(observed) <= LUMP_DAYS:
+            remaining = max(monthly - month_to_date, Decimal('0'))
+        else:
+            remaining = monthly * (days_in_month - today.day) / days_in_month
+    return CategoryForecast(transaction_type, category, month_to_date, _cents(remaining), _cents(monthly))
+
+
+def fit(user, today=None):
+    """Fit the Forecast of ``user`` from the database; four queries."""
+    today = today or timezone.now().date()
+    month_start = today.replace(day=1)
+    start = periods.months_back(today, HISTORY_MONTHS)
+    first_month = (
+        BalanceCheckpoint.objects.filter(user=user).order_by('month').values_list('month', flat=True).first()
+    )
+    # Whole months since the user's first transaction; months before it don't count as empty
+    observed = []
+    month = max(start, first_month or month_start)
+    while month < month_start:
+        observed.append(month)
+        month = periods.next_month(month)
+
+    categories = [
+        _fit(transaction_type, category, days, today, observed)
+        for (transaction_type, category), days in sorted(daily_series(user, start, today).items())
+    ]
+    return Forecast(today, user.reporting_currency, balances.balance_as_of(user, today), categories)
+
+
+def get_forecast(user, version=None, today=None):
+    """Return the Forecast of ``user``, cached per day and data version."""
+    today = today or timezone.now().date()
+    if version is None:
+        version = get_data_version(user)
+    cache = get_cache()
+    key = f'{KEY_PREFIX}:{user.pk}:{version}:{today.isoformat()}'
+    forecast = cache.get(key)
+    if forecast is None:
+        forecast = fit(user, today)
+        cache.set(key, forecast, timeout=settings.RESPONSE_CACHE_TIMEOUT)
+    return forecast
+
+
+def project(forecast, months_ahead=3):
+    """Return the payload of the forecast endpoint.
+
+    ``end_of_month`` is the balance expected at the end of the current
+    month; ``months`` holds the ``months_ahead`` following months.
+    """
+    today = forecast.today
+    incomes, expenses = forecast.of_type(INCOME), forecast.of_type(EXPENSE)
+    recurring = [item for item in incomes if item.category in RECURRING_INCOME]
+
+    def total(items, field):
+        return sum((getattr(item, field) for item in items), Decimal('0'))
+
+    balance = forecast.balance + total(incomes, 'remaining') - total(expenses, 'remaining')
+    end_of_month = {
+        'date': date(today.year, today.month, monthrange(today.year, today.month)[1]),
+        'income': total(incomes, 'projected'),
+        'recurring_income': total(recurring, 'projected'),
+        'expenses': total(expenses, 'projected'),
+        'balance': balance,
+    }
+
+    months = []
+    month = today.replace(day=1)
+    for _ in range(months_ahead):
+        month = periods.next_month(month)
+        balance += total(incomes, 'monthly') - total(expenses, 'monthly')
+        months.append({
+            'year': month.year,
+            'month': month.month,
+            'income': total(incomes, 'monthly'),
+            'recurring_income': total(recurring, 'monthly'),
+            'expenses': total(expenses, 'monthly'),
+            'balance': balance,
+        })
+
+    return {
+        'date': today,
+        'balance': forecast.balance,
+        'end_of_month': end_of_month,
+        'months': months,
+        'categories': [
+            {
+                'category': item.category,
+                'spent': item.month_to_date,
+                'projected': item.projected,
+                'monthly': item.monthly,
+            }
+            for item in sorted(expenses, key=lambda item: item.projected, reverse=True)
+        ],
+    }
+
+
+def projected_spend(forecast, budget, spent):
+    """Return the spending expected against ``budget`` by the end of its period.
+
+    ``spent`` is what the budget's current period has used so far (see
+    BudgetUsage), in the budget's currency; the forecast adds what is still
+    expected in that period.
+    """
+    item = forecast.category(budget.category)
+    if item is None:
+        return spent
+    expected = item.remaining
+    if budget.period == Budget.Period.YEARLY:
+        expected += item.monthly * (12 - forecast.today.month)
+    today = forecast.today
+    return spent + currencies.convert(expected, forecast.currency, budget.currency, today.year, today.month)
@@ -0,0 +1,355 @@
+"""
+Bank statement import pipeline.
+
+A statement is read line by line by the parsers in statements.py, mapped
+to Transaction fields and validated with the model fields' own validation,
+and inserted in chunks of CHUNK_SIZE rows: with COPY on PostgreSQL and
+``bulk_create`` elsewhere. Each chunk is committed together with its
+rollup changes, its row errors and the import's progress counters, so
+memory use stays flat and progress can be followed while a file imports.
+
+Uploads through the API are only stored and queued; the
+``process_statement_imports`` management command claims queued imports
+the way insight jobs are claimed (see jobs.py) and runs them. An import
+whose worker stopped is queued again and resumes after the rows it had
+already committed.
+"""
+import csv
+import io
+import itertools
+import logging
+import re
+import uuid
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import close_old_connections, connections, router, transaction as db_transaction
+from django.utils import timezone
+
+from .models import ImportRowError, StatementImport, Transaction
+from .signals import TransactionRow, transaction_rows_changed
+from .statements import DATE_FORMATS, PARSERS, StatementError
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+# Row errors stored per import; later failures are only counted
+MAX_STORED_ERRORS = 1000
+
+AMOUNT_FIELD = Transaction._meta.get_field('amount')
+
+TYPE_ALIASES = {
+    'in': Transaction.TransactionType.INCOME,
+    'income': Transaction.TransactionType.INCOME,
+    'credit': Transaction.TransactionType.INCOME,
+    'cr': Transaction.TransactionType.INCOME,
+    'deposit': Transaction.TransactionType.INCOME,
+    'ex': Transaction.TransactionType.EXPENSE,
+    'expense': Transaction.TransactionType.EXPENSE,
+    'debit': Transaction.TransactionType.EXPENSE,
+    'dr': Transaction.TransactionType.EXPENSE,
+    'withdrawal': Transaction.TransactionType.EXPENSE,
+    'payment': Transaction.TransactionType.EXPENSE,
+}
+
+# Categories are matched by code or display name; anything else falls back
+# to the "other" category of the transaction type
+CATEGORY_ALIASES = {
+    **{str(label).lower(): value for value, label in Transaction.Category.choices},
+    **{value.lower(): value for value in Transaction.Category.values},
+}
+DEFAULT_CATEGORIES = {
+    Transaction.TransactionType.INCOME: Transaction.Category.OTHER_INCOME,
+    Transaction.TransactionType.EXPENSE: Transaction.Category.OTHER_EXPENSE,
+}
+
+ISO_DATE = '%Y-%m-%d'
+NOT_A_NUMBER = re.compile(r'[^\d,.\-+]')
+
+
+def parse_amount(value, decimal_separator='.'):
+    """Parse a statement amount such as ``-1,234.50``, ``(12.00)`` or ``€ 3,50``."""
+    text = value.strip()
+    negative = text.startswith('(') and text.endswith(')')
+    text = NOT_A_NUMBER.sub('', text)
+    thousands_separator = ',' if decimal_separator == '.' else '.'
+    text = text.replace(thousands_separator, '').replace(decimal_separator, '.')
+    amount = Decimal(text)
+    if not amount.is_finite():
+        raise InvalidOperation(value)
+    return -amount if negative else amount
+
+
+def parse_date(value, formats):
+    """Parse a statement date with the first matching format."""
+    for date_format in formats:
+        try:
+            if date_format == ISO_DATE:
+                # Much faster than strptime for the most common format
+                return date.fromisoformat(value)
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    raise ValueError(value)
+
+
+def clean_record(record, file_format, options):
+    """Map a StatementRecord to Transaction field values.
+
+    Returns ``(data, errors)``; ``data`` is None when ``errors`` is not empty.
+    """
+    errors = {}
+
+    date_formats = [options['date_format']] if options.get('date_format') else DATE_FORMATS[file_format]
+    day = None
+    if not record.date:
+        errors['date'] = ['This field is required.']
+    else:
+        try:
+            day = parse_date(record.date, date_formats)
+        except ValueError:
+            errors['date'] = [f"'{record.date}' does not match {' or '.join(date_formats)}."]
+
+    amount = None
+    if not record.amount:
+        errors['amount'] = ['This field is required.']
+    else:
+        try:
+            amount = parse_amount(record.amount, options.get('decimal_separator', '.'))
+        except InvalidOperation:
+            errors['amount'] = [f"'{record.amount}' is not a number."]
+
+    transaction_type = None
+    if record.transaction_type:
+        transaction_type = TYPE_ALIASES.get(record.transaction_type.strip().lower())
+        if transaction_type is None:
+            errors['transaction_type'] = [f"Unknown transaction type '{record.transaction_type}'."]
+    elif amount is not None:
+        # Without a type column the sign tells income from expenses
+        transaction_type = (
+            Transaction.TransactionType.EXPENSE if amount < 0 else Transaction.TransactionType.INCOME
+        )
+
+    if errors:
+        return None, errors
+
+    category = CATEGORY_ALIASES.get((record.category or '').strip().lower())
+    data = {
+        'amount': abs(amount),
+        'transaction_type': transaction_type,
+        'category': category or DEFAULT_CATEGORIES[transaction_type],
+        'description': record.description,
+        'date': day,
+    }
+    # Type and category are valid choices by construction; the amount still
+    # needs the API's checks (max digits, minimum amount)
+    try:
+        data['amount'] = AMOUNT_FIELD.clean(data['amount'], None)
+    except DjangoValidationError as exc:
+        return None, {'amount': exc.messages}
+    return data, {}
+
+
+def create_import(user, file_name, file_format, options=None, upload=None):
+    """Register a pending import of a statement file for ``user``.
+
+    With ``upload``, a file object, the file is stored with the import for
+    a worker to run it.
+    """
+    statement_import = StatementImport(user=user, file_name=file_name, file_format=file_format)
+    statement_import.options = options or {}
+    if upload is not None:
+        statement_import.file.save(file_name, upload, save=False)
+    statement_import.save()
+    return statement_import
+
+
+def run_import(statement_import, binary_file):
+    """Import a statement from a binary file object, chunk by chunk.
+
+    Chunks are committed as they are imported: a failure stops the import
+    but keeps the rows of the chunks already committed. The rows counted
+    in ``rows_processed`` by an earlier, interrupted run are skipped.
+    """
+    options = statement_import.options
+    statement_import.status = StatementImport.Status.RUNNING
+    statement_import.started_at = timezone.now()
+    statement_import.save(update_fields=['status', 'started_at', 'updated_at'])
+
+    lines = io.TextIOWrapper(binary_file, encoding=options.get('encoding', 'utf-8-sig'), errors='replace', newline='')
+    try:
+        parser = PARSERS[statement_import.file_format]
+        records = parser(lines, delimiter=options.get('delimiter', ','), mapping=options.get('mapping'))
+        records = itertools.islice(records, statement_import.rows_processed, None)
+        chunk = []
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == CHUNK_SIZE:
+                _import_chunk(statement_import, chunk)
+                chunk = []
+        if chunk:
+            _import_chunk(statement_import, chunk)
+        statement_import.status = StatementImport.Status.SUCCEEDED
+    except (StatementError, UnicodeError, csv.Error) as exc:
+        statement_import.status = StatementImport.Status.FAILED
+        statement_import.error = str(exc)
+    except Exception as exc:
+        logger.exception('Statement import %s failed', statement_import.pk)
+        statement_import.status = StatementImport.Status.FAILED
+        statement_import.error = f'{type(exc).__name__}: {exc}'
+    finally:
+        # Leave the caller's file open
+        lines.detach()
+
+    statement_import.finished_at = timezone.now()
+    statement_import.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return statement_import
+
+
+def claim_imports(batch_size):
+    """Mark up to ``batch_size`` queued imports as running and return them."""
+    token = uuid.uuid4().hex
+    candidates = StatementImport.objects.filter(
+        status=StatementImport.Status.PENDING
+    ).exclude(file='').order_by('created_at').values_list('pk', flat=True)[:batch_size]
+    now = timezone.now()
+    claimed = StatementImport.objects.filter(
+        pk__in=list(candidates),
+        status=StatementImport.Status.PENDING
+    ).update(status=StatementImport.Status.RUNNING, worker=token, started_at=now, updated_at=now)
+    if not claimed:
+        return []
+    return list(StatementImport.objects.filter(worker=token).select_related('user').order_by('created_at'))
+
+
+def run_stored_import(statement_import):
+    """Run a claimed import from its stored file, deleting the file once the import is over."""
+    try:
+        with statement_import.file.open('rb') as stored:
+            run_import(statement_import, stored)
+    except OSError as exc:
+        statement_import.status = StatementImport.Status.FAILED
+        statement_import.error = f'Cannot read the uploaded file: {exc}'
+        statement_import.finished_at = timezone.now()
+        statement_import.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    statement_import.file.delete(save=False)
+    statement_import.save(update_fields=['file'])
+    return statement_import
+
+
+def process_imports(batch_size):
+    """Claim a batch of queued imports and run them; returns the number of imports run."""
+    close_old_connections()
+    statement_imports = claim_imports(batch_size)
+    for statement_import in statement_imports:
+        run_stored_import(statement_import)
+    return len(statement_imports)
+
+
+def requeue_stale_imports(timeout):
+    """Queue again the imports that made no progress for ``timeout`` (e.g. after their worker was killed).
+
+    Imports without a stored file were run outside the queue and can't be
+    resumed: they are failed instead. Returns the number of imports requeued.
+    """
+    stale = StatementImport.objects.filter(
+        status=StatementImport.Status.RUNNING,
+        updated_at__lt=timezone.now() - timeout
+    )
+    stale.filter(file='').update(
+        status=StatementImport.Status.FAILED,
+        error='The import stopped before finishing',
+        finished_at=timezone.now()
+    )
+    return stale.exclude(file='').update(status=StatementImport.Status.PENDING, worker='')
+
+
+def _import_chunk(statement_import, records):
+    file_format = statement_import.file_format
+    options = statement_import.options
+    transactions = []
+    row_errors = []
+    failed = 0
+    # Statements are in the user's reporting currency
+    currency = statement_import.user.reporting_currency
+    for record in records:
+        data, errors = clean_record(record, file_format, options)
+        if errors:
+            failed += 1
+            if statement_import.rows_failed + failed <= MAX_STORED_ERRORS:
+                row_error = ImportRowError(statement_import=statement_import, line=record.line, raw=record.raw)
+                row_error.errors = errors
+                row_errors.append(row_error)
+            continue
+        transactions.append(Transaction(user_id=statement_import.user_id, currency=currency, **data))
+
+    with db_transaction.atomic():
+        insert_transactions(transactions)
+        # Bulk inserts bypass the save signals
+        transaction_rows_changed.send(
+            sender=Transaction,
+            removed=[],
+            added=[TransactionRow.from_instance(transaction) for transaction in transactions]
+        )
+        ImportRowError.objects.bulk_create(row_errors)
+        statement_import.rows_processed += len(records)
+        statement_import.rows_imported += len(transactions)
+        statement_import.rows_failed += failed
+        statement_import.save(update_fields=['rows_processed', 'rows_imported', 'rows_failed', 'updated_at'])
+
+
+def insert_transactions(transactions):
+    """Insert unsaved transactions, setting their primary keys."""
+    if not transactions:
+        return
+    connection = connections[router.db_for_write(Transaction)]
+    if connection.vendor == 'postgresql':
+        _copy_transactions(connection, transactions)
+    else:
+        Transaction.objects.bulk_create(transactions, batch_size=1000)
+
+
+def _copy_value(value):
+    # COPY text format: \N is NULL; backslash, tab and newlines are escaped
+    if value is None:
+        return '\\N'
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\t', '\\t')
+        .replace('\n', '\\n')
+        .replace('\r', '\\r')
+    )
+
+
+def _copy_transactions(connection, transactions):
+    """Insert transactions with PostgreSQL's COPY FROM STDIN."""
+    meta = Transaction._meta
+    fields = meta.concrete_fields
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        # COPY can't return ids, so they are taken from the sequence first
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) FROM generate_series(1, %s)',
+            [meta.db_table, meta.pk.column, len(transactions)]
+        )
+        for transaction, (pk,) in zip(transactions, cursor.fetchall()):
+            transaction.pk = pk
+
+        buffer = io.StringIO()
+        for transaction in transactions:
+            # pre_save() fills auto_now(_add) timestamps
+            values = [
+                field.get_db_prep_save(field.pre_save(transaction, add=True), connection)
+                for field in fields
+            ]
+            buffer.write('\t'.join(_copy_value(value) for value in values))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        columns = ', '.join(quote(field.column) for field in fields)
+        cursor.copy_expert(f'COPY {quote(meta.db_table)} ({columns}) FROM STDIN', buffer)
+    for transaction in transactions:
+        transaction._state.adding = False
+        transaction._state.db = connection.alias
@@ -0,0 +1,278 @@
+"""
+Single-pass financial insight engine.
+
+All insights are computed from one grouped query over the user's
+transactions: rows in the widest registered window are grouped by
+(transaction_type, category) with a conditional SUM/COUNT per window.
+Each insight builder then reads the InsightStats it needs, so adding an
+insight type (or a window) adds columns to that query, not another scan.
+Amounts stay ``Decimal`` until they are written to the insight data points.
+
+Users with a large history are aggregated by the NumPy engine instead (see
+analytics.py), from arrays cached until their next write.
+"""
+import random
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from . import analytics, currencies, periods, rollups
+from .budgets import BudgetUsageCalculator
+from .models import Budget, FinancialInsight, Transaction
+
+# Windows available to insight builders, as functions of today's date
+WINDOWS = {
+    'last_3_months': lambda today: periods.last_n_days(90, today),
+    'last_month': lambda today: periods.last_n_days(30, today),
+    'current_month': lambda today: periods.month_range(today.year, today.month),
+    'current_year': lambda today: periods.year_range(today.year),
+}
+
+# Insight builders, called in registration order with (user, stats)
+INSIGHT_BUILDERS = []
+
+
+def insight_builder(func):
+    """Register a function returning a list of unsaved FinancialInsight objects."""
+    INSIGHT_BUILDERS.append(func)
+    return func
+
+
+class InsightStats:
+    """Totals and counts per window, transaction type and category."""
+
+    def __init__(self, today, rows=()):
+        self.today = today
+        self._cells = {}
+        for window, transaction_type, category, total, count in rows:
+            self._cells[window, transaction_type, category] = (total or Decimal('0'), count)
+
+    def by_category(self, window, transaction_type):
+        """Return ``{category: (total, count)}`` for categories with transactions."""
+        return {
+            category: cell
+            for (cell_window, cell_type, category), cell in self._cells.items()
+            if cell_window == window and cell_type == transaction_type and cell[1]
+        }
+
+    def total(self, window, transaction_type):
+        """Return the summed amount of one transaction type in a window."""
+        return sum(
+            (total for total, _ in self.by_category(window, transaction_type).values()),
+            Decimal('0')
+        )
+
+    def count(self, window, transaction_type=None):
+        """Return the number of transactions in a window, optionally of one type."""
+        types = [transaction_type] if transaction_type else Transaction.TransactionType.values
+        return sum(
+            count for kind in types for _, count in self.by_category(window, kind).values()
+        )
+
+
+def collect_stats(user, today=None):
+    """Aggregate every window in WINDOWS with a single grouped query."""
+    today = today or timezone.now().date()
+    ranges = {name: window(today) for name, window in WINDOWS.items()}
+    widest = periods.DateRange(
+        min(date_range.start for date_range in ranges.values()),
+        max(date_range.end for date_range in ranges.values())
+    )
+
+    if analytics.use_engine(user):
+        return InsightStats(today, analytics.window_stats(analytics.get_history(user), ranges))
+
+    amount = currencies.converted('amount', user.reporting_currency)
+    annotations = {}
+    for index, date_range in enumerate(ranges.values()):
+        in_window = Q(**date_range.as_filter())
+        annotations[f'w{index}_total'] = Sum(amount, filter=in_window)
+        annotations[f'w{index}_count'] = Count('id', filter=in_window)
+
+    groups = rollups.with_month(Transaction.objects.filter(
+        user=user,
+        **widest.as_filter()
+    )).values('transaction_type', 'category').annotate(**annotations).order_by()
+
+    rows = [
+        (name, group['transaction_type'], group['category'],
+         group[f'w{index}_total'], group[f'w{index}_count'])
+        for group in groups
+        for index, name in enumerate(ranges)
+    ]
+    return InsightStats(today, rows)
+
+
+def generate_insights(user, today=None):
+    """Run every registered insight builder over one shared aggregation."""
+    stats = collect_stats(user, today)
+    insights = []
+    for builder in INSIGHT_BUILDERS:
+        insights.extend(builder(user, stats))
+    return insights
+
+
+def category_display(category):
+    """Return the display name of a category code."""
+    # str() resolves the lazy translation so it can be stored as JSON
+    return str(dict(Transaction.Category.choices).get(category, category))
+
+
+@insight_builder
+def spending_patterns(user, stats):
+    """Analyze spending patterns to find categories with significant spending."""
+    category_totals = stats.by_category('last_3_months', Transaction.TransactionType.EXPENSE)
+    if not category_totals:
+        return []
+
+    # Find the top spending category
+    top_category, (top_total, _) = max(category_totals.items(), key=lambda item: item[1][0])
+    display = category_display(top_category)
+
+    # Calculate the percentage of total spending
+    total_spending = stats.total('last_3_months', Transaction.TransactionType.EXPENSE)
+    percentage = int((top_total / total_spending) * 100) if total_spending > 0 else 0
+
+    insight = FinancialInsight(
+        user=user,
+        insight_type=FinancialInsight.InsightType.SPENDING_PATTERN,
+        title=f"{percentage}% of your spending is on {display}",
+        content=f"Over the past 3 months, you've spent ${top_total:.2f} on {display}, "
+               f"which is {percentage}% of your total expenses. Consider if this aligns with your financial goals."
+    )
+    insight.data = {
+        'category': top_category,
+        'category_display': display,
+        'amount': float(top_total),
+        'percentage': percentage,
+        'time_period': '3 months'
+    }
+    return [insight]
+
+
+@insight_builder
+def budget_alerts(user, stats):
+    """Generate alerts for categories exceeding budget thresholds."""
+    # Budget periods are calendar months/years, served by the same aggregation
+    spent = defaultdict(dict)
+    for category, (total, _) in stats.by_category('current_month', Transaction.TransactionType.EXPENSE).items():
+        spent[category][Budget.Period.MONTHLY] = total
+    for category, (total, _) in stats.by_category('current_year', Transaction.TransactionType.EXPENSE).items():
+        spent[category][Budget.Period.YEARLY] = total
+    usage = BudgetUsageCalculator(user, stats.today.year, stats.today.month, spent=spent)
+
+    alerts = []
+    for budget in Budget.objects.filter(user=user):
+        usage_percentage = usage.usage(budget).percentage
+
+        # If usage is over 80%, create an alert
+        if usage_percentage < 80:
+            continue
+        display = category_display(budget.category)
+
+        # Create alert message based on percentage
+        if usage_percentage >= 100:
+            title = f"Budget exceeded for {display}"
+            content = (f"You've exceeded your ${budget.amount:.2f} budget for {display}. "
+                       f"Consider adjusting your spending or increasing your budget for this category.")
+        else:
+            title = f"Budget almost reached for {display}"
+            content = (f"You've used {usage_percentage}% of your ${budget.amount:.2f} budget for {display}. "
+                       f"Be mindful of your spending in this category for the rest of the period.")
+
+        alert = FinancialInsight(
+            user=user,
+            insight_type=FinancialInsight.InsightType.BUDGET_ALERT,
+            title=title,
+            content=content
+        )
+        alert.data = {
+            'category': budget.category,
+            'category_display': display,
+            'budget_amount': float(budget.amount),
+            'usage_percentage': usage_percentage,
+            'period': budget.period
+        }
+        alerts.append(alert)
+    return alerts
+
+
+@insight_builder
+def savings_opportunities(user, stats):
+    """Find potential savings opportunities based on transaction patterns."""
+    # Categories with frequent transactions (at least 5 in a month) could be
+    # consolidated or reduced
+    category_stats = stats.by_category('last_month', Transaction.TransactionType.EXPENSE)
+    frequent_categories = sorted(
+        category for category, (_, count) in category_stats.items() if count >= 5
+    )
+    if not frequent_categories:
+        return []
+
+    # Choose a random category from the frequent ones to avoid always showing the same insight
+    target_category = random.choice(frequent_categories)
+    total, count = category_stats[target_category]
+    display = category_display(target_category)
+
+    insight = FinancialInsight(
+        user=user,
+        insight_type=FinancialInsight.InsightType.SAVINGS_OPPORTUNITY,
+        title=f"Potential savings in {display}",
+        content=f"You made {count} {display} transactions last month, "
+               f"totaling ${total:.2f}. Consider consolidating these purchases "
+               f"or finding alternatives to reduce this expense."
+    )
+    insight.data = {
+        'category': target_category,
+        'category_display': display,
+        'transaction_count': count,
+        'total_amount': float(total),
+        'time_period': '1 month'
+    }
+    return [insight]
+
+
+@insight_builder
+def general_advice(user, stats):
+    """Generate general financial advice based on user's financial situation."""
+    if not stats.count('last_3_months'):
+        return []
+
+    # Calculate income vs expenses for the last 3 months
+    income = stats.total('last_3_months', Transaction.TransactionType.INCOME)
+    expenses = stats.total('last_3_months', Transaction.TransactionType.EXPENSE)
+
+    # Calculate savings rate (income - expenses) / income
+    savings = income - expenses
+    savings_rate = (savings / income) * 100 if income > 0 else Decimal('0')
+
+    # Generate appropriate advice based on savings rate
+    if savings_rate < 0:
+        title = "Spending exceeds income"
+        content = "Your expenses have exceeded your income over the last 3 months. Review your spending and consider creating a budget to help manage your finances."
+    elif savings_rate < 10:
+        title = "Low savings rate"
+        content = "Your savings rate is below 10%. Financial experts recommend saving at least 20% of your income. Consider identifying areas where you can reduce expenses."
+    elif savings_rate < 20:
+        title = "Good progress on savings"
+        content = "You're saving between 10-20% of your income, which is good progress. Try to increase this to 20% or more for long-term financial security."
+    else:
+        title = "Excellent savings rate"
+        content = "You're saving over 20% of your income, which is excellent! Consider investing these savings for long-term growth."
+
+    insight = FinancialInsight(
+        user=user,
+        insight_type=FinancialInsight.InsightType.GENERAL_ADVICE,
+        title=title,
+        content=content
+    )
+    insight.data = {
+        'income': float(income),
+        'expenses': float(expenses),
+        'savings': float(savings),
+        'savings_rate': float(savings_rate),
+        'time_period': '3 months'
+    }
+    return [insight]
@@ -0,0 +1,118 @@
+"""
+Database-backed queue for insight generation.
+
+``enqueue_insight_job`` is called from the API; the ``process_insight_jobs``
+management command claims pending jobs in batches and runs them on a thread
+pool. Claiming is a conditional UPDATE tagged with a per-batch token, so any
+number of workers can share the table without an external broker.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, close_old_connections, connections, transaction as db_transaction
+from django.utils import timezone
+
+from .insights import generate_insights
+from .models import InsightJob
+from .serializers import FinancialInsightSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_insight_job(user):
+    """Queue insight generation for ``user``.
+
+    Returns ``(job, created)``; while the user already has a pending job,
+    that job is returned instead of queueing another one.
+    """
+    pending = InsightJob.objects.filter(user=user, status=InsightJob.Status.PENDING)
+    job = pending.first()
+    if job is not None:
+        return job, False
+    try:
+        with db_transaction.atomic():
+            return InsightJob.objects.create(user=user), True
+    except IntegrityError:
+        # Another request queued a job for this user concurrently
+        return pending.get(), False
+
+
+def claim_jobs(batch_size):
+    """Mark up to ``batch_size`` pending jobs as running and return them."""
+    token = uuid.uuid4().hex
+    candidates = InsightJob.objects.filter(
+        status=InsightJob.Status.PENDING
+    ).order_by('created_at').values_list('pk', flat=True)[:batch_size]
+    claimed = InsightJob.objects.filter(
+        pk__in=list(candidates),
+        status=InsightJob.Status.PENDING
+    ).update(status=InsightJob.Status.RUNNING, worker=token, started_at=timezone.now())
+    if not claimed:
+        return []
+    return list(InsightJob.objects.filter(worker=token).select_related('user'))
+
+
+def run_job(job):
+    """Generate insights for a claimed job and store the outcome on it."""
+    try:
+        insights = generate_insights(job.user)
+        job.result = FinancialInsightSerializer(insights, many=True).data
+        job.status = InsightJob.Status.SUCCEEDED
+    except Exception as exc:
+        logger.exception('Insight job %s failed', job.pk)
+        job.error = f'{type(exc).__name__}: {exc}'
+        job.status = InsightJob.Status.FAILED
+    job.finished_at = timezone.now()
+    job.save(update_fields=['result_data', 'error', 'status', 'finished_at'])
+    return job
+
+
+def _run_job_in_thread(job):
+    try:
+        return run_job(job)
+    finally:
+        # Worker threads open their own connections; don't leak them
+        connections.close_all()
+
+
+def process_batch(batch_size, concurrency):
+    """Claim one batch of jobs and run it; returns the number of jobs run."""
+    close_old_connections()
+    jobs = claim_jobs(batch_size)
+    if not jobs:
+        return 0
+    if concurrency <= 1:
+        for job in jobs:
+            run_job(job)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(_run_job_in_thread, jobs))
+    return len(jobs)
+
+
+def requeue_stale_jobs(timeout):
+    """Return jobs left running longer than ``timeout`` (e.g. by a killed worker) to the queue.
+
+    A stale job is failed instead when its user has queued a new job since.
+    Returns the number of jobs requeued.
+    """
+    stale = InsightJob.objects.filter(
+        status=InsightJob.Status.RUNNING,
+        started_at__lt=timezone.now() - timeout
+    )
+    requeued = 0
+    for job in stale:
+        try:
+            with db_transaction.atomic():
+                requeued += InsightJob.objects.filter(
+                    pk=job.pk,
+                    status=InsightJob.Status.RUNNING
+                ).update(status=InsightJob.Status.PENDING, worker='', started_at=None)
+        except IntegrityError:
+            InsightJob.objects.filter(pk=job.pk).update(
+                status=InsightJob.Status.FAILED,
+                error='Worker stopped before finishing the job',
+                finished_at=timezone.now()
+            )
+    return requeued
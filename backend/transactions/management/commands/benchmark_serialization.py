@@ -0,0 +1,44 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import rows
+from transactions.models import Transaction
+from transactions.serializers import TransactionSerializer
+
+
+class Command(BaseCommand):
+    """Django command to compare the serializer and values read paths of the transaction list"""
+
+    help = 'Report rows per second of TransactionSerializer and the values-based read path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Benchmark the transactions of the user with this email address.')
+        parser.add_argument('--rows', type=int, default=500, help='Rows per page (default: 500).')
+        parser.add_argument('--repeat', type=int, default=20, help='Pages read per path (default: 20).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist")
+
+        queryset = Transaction.objects.filter(user=user).order_by('-date', '-created_at', '-id')[:options['rows']]
+        paths = {
+            'serializer': lambda: TransactionSerializer(list(queryset.all()), many=True).data,
+            'values': lambda: rows.transaction_dicts(list(rows.values_queryset(queryset.all()))),
+        }
+        for name, read_page in paths.items():
+            count = len(read_page())
+            if not count:
+                raise CommandError('The user has no transactions.')
+            started = time.perf_counter()
+            for _ in range(options['repeat']):
+                read_page()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'{name:>10}: {count * options["repeat"] / elapsed:,.0f} rows/s '
+                f'({elapsed / options["repeat"] * 1000:.2f} ms per {count}-row page, query included)'
+            )
@@ -0,0 +1,71 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+class Command(BaseCommand):
+    """Django command to measure the request throughput of a running server"""
+
+    help = (
+        'Send authenticated GET requests to a running server from concurrent clients and '
+        'report requests per second and latency percentiles.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Authenticate as the user with this email address.')
+        parser.add_argument(
+            '--url', action='append', dest='urls',
+            help='URL to request, repeatable (default: the dashboard and transaction list on localhost:8000).'
+        )
+        parser.add_argument('--requests', type=int, default=1000, help='Requests to send (default: 1000).')
+        parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients (default: 16).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist")
+
+        urls = options['urls'] or [
+            'http://localhost:8000/api/v1/dashboard/',
+            'http://localhost:8000/api/v1/transactions/',
+        ]
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+
+        def fetch(index):
+            request = Request(urls[index % len(urls)], headers=headers)
+            started = time.perf_counter()
+            try:
+                with urlopen(request, timeout=30) as response:
+                    response.read()
+                    ok = response.status == 200
+            except (HTTPError, URLError, OSError):
+                ok = False
+            return ok, time.perf_counter() - started
+
+        # Warm up every worker's imports, connections and caches
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            if not all(ok for ok, _ in pool.map(fetch, range(options['concurrency'] * 2))):
+                raise CommandError(f"Warm-up requests failed; is the server running at {urls[0]}?")
+
+            started = time.perf_counter()
+            results = list(pool.map(fetch, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency * 1000 for _, latency in results)
+        errors = sum(1 for ok, _ in results if not ok)
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f'{len(results) / elapsed:,.1f} requests/s over {len(results)} requests '
+            f"({options['concurrency']} clients, {errors} error(s))"
+        )
+        self.stdout.write(
+            f'latency: p50 {percentiles[49]:.1f} ms, p95 {percentiles[94]:.1f} ms, p99 {percentiles[98]:.1f} ms'
+        )
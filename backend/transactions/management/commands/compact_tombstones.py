@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from transactions import sync
+
+
+class Command(BaseCommand):
+    """Django command to delete expired transaction tombstones"""
+
+    help = 'Delete delta sync tombstones older than TRANSACTION_SYNC_TOMBSTONE_TTL.'
+
+    def handle(self, *args, **options):
+        deleted = sync.compact()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstone(s).'))
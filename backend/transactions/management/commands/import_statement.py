@@ -0,0 +1,76 @@
+import codecs
+import json
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import imports
+from transactions.models import StatementImport
+from transactions.statements import CSV_FIELDS
+
+
+class Command(BaseCommand):
+    """Django command to import a bank statement file for a user"""
+
+    help = 'Import a CSV, OFX or QIF bank statement into the transactions of a user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email address of the user to import for.')
+        parser.add_argument('path', help='Path of the statement file.')
+        parser.add_argument(
+            '--format',
+            choices=StatementImport.FileFormat.values,
+            help='File format; detected from the file extension when omitted.',
+        )
+        parser.add_argument('--mapping', help='CSV column mapping as JSON, e.g. \'{"date": "Booked"}\'.')
+        parser.add_argument('--date-format', help='strptime format of the dates, e.g. %%d/%%m/%%Y.')
+        parser.add_argument('--delimiter', help='CSV delimiter (default ",").')
+        parser.add_argument('--decimal-separator', choices=['.', ','], help='Decimal separator (default ".").')
+        parser.add_argument('--encoding', help='Text encoding of the file (default utf-8).')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(email=options['email'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['email']} does not exist")
+
+        path = options['path']
+        if not os.path.isfile(path):
+            raise CommandError(f'{path} is not a file')
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').upper()
+        if file_format not in StatementImport.FileFormat.values:
+            raise CommandError('Could not detect the file format; pass --format')
+
+        import_options = {}
+        if options['mapping']:
+            try:
+                mapping = json.loads(options['mapping'])
+            except json.JSONDecodeError as exc:
+                raise CommandError(f'Invalid --mapping: {exc}')
+            if not isinstance(mapping, dict) or set(mapping) - set(CSV_FIELDS):
+                raise CommandError(f"--mapping must map some of {', '.join(CSV_FIELDS)} to column names")
+            import_options['mapping'] = mapping
+        if options['encoding']:
+            try:
+                codecs.lookup(options['encoding'])
+            except LookupError:
+                raise CommandError(f"Unknown encoding {options['encoding']}")
+        for name in ('date_format', 'delimiter', 'decimal_separator', 'encoding'):
+            if options[name]:
+                import_options[name] = options[name]
+
+        statement_import = imports.create_import(user, os.path.basename(path), file_format, import_options)
+        with open(path, 'rb') as statement:
+            imports.run_import(statement_import, statement)
+
+        for row_error in statement_import.row_errors.all()[:20]:
+            self.stdout.write(f'Line {row_error.line}: {row_error.errors}')
+        summary = (
+            f'Import {statement_import.pk}: {statement_import.rows_imported} imported, '
+            f'{statement_import.rows_failed} failed, {statement_import.rows_processed} processed.'
+        )
+        if statement_import.status == StatementImport.Status.FAILED:
+            raise CommandError(f'{summary} {statement_import.error}')
+        self.stdout.write(self.style.SUCCESS(summary))
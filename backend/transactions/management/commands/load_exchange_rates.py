@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import currencies
+
+
+class Command(BaseCommand):
+    """Django command to load monthly exchange rates from a CSV file"""
+
+    help = (
+        'Load exchange rates from a CSV file of date,currency,rate rows, averaged per month. '
+        'Rates are units of the currency per unit of EXCHANGE_RATE_BASE_CURRENCY.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Rate file (default: EXCHANGE_RATES_FILE).')
+
+    def handle(self, *args, **options):
+        try:
+            written, changed, users = currencies.load_rates(options['path'])
+        except currencies.RateError as exc:
+            raise CommandError(str(exc))
+
+        if not written:
+            self.stdout.write(self.style.SUCCESS('Exchange rates are up to date.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {written} monthly rate(s) for {', '.join(changed)}; "
+            f'invalidated cached data of {users} user(s).'
+        ))
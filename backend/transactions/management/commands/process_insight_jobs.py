@@ -0,0 +1,55 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transactions import jobs
+
+
+class Command(BaseCommand):
+    """Django command to process queued insight generation jobs"""
+
+    help = 'Run queued insight generation jobs, polling the database for new ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.INSIGHT_JOB_BATCH_SIZE,
+            help='Maximum number of jobs claimed at once.',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.INSIGHT_JOB_CONCURRENCY,
+            help='Number of jobs run concurrently.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.INSIGHT_JOB_POLL_INTERVAL,
+            help='Seconds to wait when the queue is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling.',
+        )
+
+    def handle(self, *args, **options):
+        stale_timeout = timedelta(seconds=settings.INSIGHT_JOB_STALE_TIMEOUT)
+        self.stdout.write('Processing insight jobs...')
+        while True:
+            requeued = jobs.requeue_stale_jobs(stale_timeout)
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale job(s).')
+
+            processed = jobs.process_batch(options['batch_size'], options['concurrency'])
+            if processed:
+                self.stdout.write(f'Processed {processed} job(s).')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Insight job queue is empty.'))
@@ -0,0 +1,49 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from transactions import imports
+
+
+class Command(BaseCommand):
+    """Django command to process queued statement imports"""
+
+    help = 'Run queued statement imports, polling the database for new ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.STATEMENT_IMPORT_BATCH_SIZE,
+            help='Maximum number of imports claimed at once.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.STATEMENT_IMPORT_POLL_INTERVAL,
+            help='Seconds to wait when the queue is empty.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the queue is empty instead of polling.',
+        )
+
+    def handle(self, *args, **options):
+        stale_timeout = timedelta(seconds=settings.STATEMENT_IMPORT_STALE_TIMEOUT)
+        self.stdout.write('Processing statement imports...')
+        while True:
+            requeued = imports.requeue_stale_imports(stale_timeout)
+            if requeued:
+                self.stdout.write(f'Requeued {requeued} stale import(s).')
+
+            processed = imports.process_imports(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Processed {processed} import(s).')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS('Statement import queue is empty.'))
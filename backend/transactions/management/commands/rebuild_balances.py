@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import balances
+
+
+class Command(BaseCommand):
+    """Django command to recompute (or verify) the balance checkpoints"""
+
+    help = 'Recompute monthly balance checkpoints from the Transaction table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only process the user with this email address.')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report checkpoints that differ from the transactions; exit with an error if any do.',
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            User = get_user_model()
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        if options['check']:
+            mismatches = balances.check_consistency(user)
+            for user_id, currency, month, expected, actual in mismatches:
+                self.stdout.write(
+                    f'user {user_id}, {currency} {month:%Y-%m}: expected {expected}, found {actual}'
+                )
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} balance checkpoint(s) are inconsistent')
+            self.stdout.write(self.style.SUCCESS('Balance checkpoints are consistent.'))
+            return
+
+        written = balances.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} balance checkpoint(s).'))
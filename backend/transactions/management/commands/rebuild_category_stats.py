@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import anomalies
+
+
+class Command(BaseCommand):
+    """Django command to recompute the per-category transaction statistics"""
+
+    help = 'Recompute per-category transaction statistics from the Transaction table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only process the user with this email address.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            User = get_user_model()
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        written = anomalies.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} category statistics row(s).'))
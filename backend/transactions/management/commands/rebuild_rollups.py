@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import rollups
+
+
+class Command(BaseCommand):
+    """Django command to recompute (or verify) the monthly rollup table"""
+
+    help = 'Recompute monthly transaction rollups from the Transaction table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only process the user with this email address.')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only report rollups that differ from the transactions; exit with an error if any do.',
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            User = get_user_model()
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        if options['check']:
+            mismatches = rollups.check_consistency(user)
+            for key, expected, actual in mismatches:
+                self.stdout.write(f'{key}: expected {expected}, found {actual}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} rollup row(s) are inconsistent')
+            self.stdout.write(self.style.SUCCESS('Rollups are consistent.'))
+            return
+
+        written = rollups.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} rollup row(s).'))
@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from transactions import suggestions
+
+
+class Command(BaseCommand):
+    """Django command to recompute the description autocomplete vocabulary"""
+
+    help = 'Recompute description suggestions from the Transaction table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only process the user with this email address.')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            User = get_user_model()
+            try:
+                user = User.objects.get(email=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} does not exist")
+
+        written = suggestions.rebuild(user)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} suggestion row(s).'))
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:21
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def build_rollups(apps, schema_editor):
+    # Populate rollups for transactions that already exist
+    Transaction = apps.get_model('transactions', 'Transaction')
+    MonthlyRollup = apps.get_model('transactions', 'MonthlyRollup')
+
+    rows = (
+        Transaction.objects
+        .annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+        .values('user_id', 'year', 'month', 'transaction_type', 'category')
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+    MonthlyRollup.objects.bulk_create(
+        [MonthlyRollup(**row) for row in rows.iterator()],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0003_financialinsight_budget'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='year')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='month')),
+                ('transaction_type', models.CharField(choices=[('IN', 'Income'), ('EX', 'Expense')], max_length=2, verbose_name='transaction type')),
+                ('category', models.CharField(choices=[('SALARY', 'Salary'), ('FREELANCE', 'Freelance'), ('INVESTMENT', 'Investment'), ('GIFT', 'Gift'), ('OTHER_INC', 'Other Income'), ('HOUSING', 'Housing'), ('FOOD', 'Food'), ('TRANSPORT', 'Transportation'), ('HEALTH', 'Health'), ('ENTERTAIN', 'Entertainment'), ('EDUCATION', 'Education'), ('SHOPPING', 'Shopping'), ('UTILITIES', 'Utilities'), ('TRAVEL', 'Travel'), ('OTHER_EXP', 'Other Expense')], max_length=10, verbose_name='category')),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='total')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'monthly rollup',
+                'verbose_name_plural': 'monthly rollups',
+                'ordering': ['year', 'month'],
+                'unique_together': {('user', 'year', 'month', 'transaction_type', 'category')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0005_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InsightJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed')], default='PENDING', max_length=10, verbose_name='status')),
+                ('worker', models.CharField(blank=True, max_length=64, verbose_name='worker')),
+                ('result_data', models.TextField(blank=True, help_text='JSON serialized generated insights', null=True, verbose_name='result data')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='insight_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'insight job',
+                'verbose_name_plural': 'insight jobs',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='insightjob_status_created_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='insightjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'PENDING')), fields=('user',), name='insightjob_one_pending_per_user'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_create_demo_user'),
+        ('transactions', '0006_insightjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserDataVersion',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='data_version', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='version')),
+            ],
+            options={
+                'verbose_name': 'user data version',
+                'verbose_name_plural': 'user data versions',
+            },
+        ),
+    ]
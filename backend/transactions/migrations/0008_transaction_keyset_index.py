@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0007_userdataversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date', 'created_at', 'id'], name='transaction_keyset_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='transaction',
+            name='transaction_user_date_idx',
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0008_transaction_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BatchRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('idempotency_key', models.CharField(max_length=255, verbose_name='idempotency key')),
+                ('fingerprint', models.CharField(help_text='SHA-256 of the request body', max_length=64, verbose_name='fingerprint')),
+                ('response_data', models.TextField(help_text='JSON serialized response', verbose_name='response data')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='batch_requests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'batch request',
+                'verbose_name_plural': 'batch requests',
+                'ordering': ['-created_at'],
+                'unique_together': {('user', 'idempotency_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0009_batchrequest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatementImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_name', models.CharField(max_length=255, verbose_name='file name')),
+                ('file_format', models.CharField(choices=[('CSV', 'CSV'), ('OFX', 'OFX'), ('QIF', 'QIF')], max_length=3, verbose_name='file format')),
+                ('options_data', models.TextField(blank=True, help_text='JSON serialized parsing options', verbose_name='options')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('SUCCEEDED', 'Succeeded'), ('FAILED', 'Failed')], default='PENDING', max_length=10, verbose_name='status')),
+                ('rows_processed', models.PositiveIntegerField(default=0, verbose_name='rows processed')),
+                ('rows_imported', models.PositiveIntegerField(default=0, verbose_name='rows imported')),
+                ('rows_failed', models.PositiveIntegerField(default=0, verbose_name='rows failed')),
+                ('error', models.TextField(blank=True, verbose_name='error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='started at')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='finished at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statement_imports', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'statement import',
+                'verbose_name_plural': 'statement imports',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ImportRowError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line', models.PositiveIntegerField(verbose_name='line')),
+                ('errors_data', models.TextField(help_text='JSON serialized errors per field', verbose_name='errors')),
+                ('raw', models.TextField(blank=True, verbose_name='raw row')),
+                ('statement_import', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='row_errors', to='transactions.statementimport')),
+            ],
+            options={
+                'verbose_name': 'import row error',
+                'verbose_name_plural': 'import row errors',
+                'ordering': ['statement_import', 'line'],
+            },
+        ),
+    ]
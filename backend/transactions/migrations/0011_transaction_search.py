@@ -0,0 +1,99 @@
+from django.db import migrations
+
+# The SQL is frozen here: transactions/search.py may change after this migration
+
+POSTGRESQL_INSTALL = [
+    """
+    ALTER TABLE transactions_transaction ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple'::regconfig, coalesce(description, '')), 'A')
+        || setweight(to_tsvector('simple'::regconfig, category), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS transaction_search_idx ON transactions_transaction USING GIN (search_vector)',
+]
+POSTGRESQL_UNINSTALL = [
+    'DROP INDEX IF EXISTS transaction_search_idx',
+    'ALTER TABLE transactions_transaction DROP COLUMN IF EXISTS search_vector',
+]
+
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS transactions_transaction_fts USING fts5(
+        description, category, owner, content='', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO transactions_transaction_fts (rowid, description, category, owner)
+    SELECT id, description, category, 'u' || user_id FROM transactions_transaction
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_insert AFTER INSERT ON transactions_transaction BEGIN
+        INSERT INTO transactions_transaction_fts (rowid, description, category, owner)
+        VALUES (new.id, new.description, new.category, 'u' || new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_delete AFTER DELETE ON transactions_transaction BEGIN
+        INSERT INTO transactions_transaction_fts (transactions_transaction_fts, rowid, description, category, owner)
+        VALUES ('delete', old.id, old.description, old.category, 'u' || old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_update
+    AFTER UPDATE OF description, category, user_id ON transactions_transaction BEGIN
+        INSERT INTO transactions_transaction_fts (transactions_transaction_fts, rowid, description, category, owner)
+        VALUES ('delete', old.id, old.description, old.category, 'u' || old.user_id);
+        INSERT INTO transactions_transaction_fts (rowid, description, category, owner)
+        VALUES (new.id, new.description, new.category, 'u' || new.user_id);
+    END
+    """,
+]
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS transaction_fts_insert',
+    'DROP TRIGGER IF EXISTS transaction_fts_delete',
+    'DROP TRIGGER IF EXISTS transaction_fts_update',
+    'DROP TABLE IF EXISTS transactions_transaction_fts',
+]
+
+
+def _sqlite_has_fts5(cursor):
+    cursor.execute("SELECT 1 FROM pragma_compile_options WHERE compile_options = 'ENABLE_FTS5'")
+    return cursor.fetchone() is not None
+
+
+def install_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            statements = POSTGRESQL_INSTALL
+        elif connection.vendor == 'sqlite' and _sqlite_has_fts5(cursor):
+            statements = SQLITE_INSTALL
+        else:
+            # No text index: searches fall back to icontains
+            statements = []
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def uninstall_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    statements = {
+        'postgresql': POSTGRESQL_UNINSTALL,
+        'sqlite': SQLITE_UNINSTALL,
+    }.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    """Add the full-text index of transactions (see transactions/search.py)."""
+
+    dependencies = [
+        ('transactions', '0010_statementimport'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
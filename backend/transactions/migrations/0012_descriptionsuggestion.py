@@ -0,0 +1,63 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:52
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_suggestions(apps, schema_editor):
+    # Populate the vocabulary from the transactions that already exist
+    Transaction = apps.get_model('transactions', 'Transaction')
+    DescriptionSuggestion = apps.get_model('transactions', 'DescriptionSuggestion')
+
+    vocabulary = {}
+    rows = Transaction.objects.exclude(description='').order_by('date', 'id').values_list(
+        'user_id', 'description', 'transaction_type', 'category', 'date', 'amount'
+    )
+    for user_id, description, transaction_type, category, day, amount in rows.iterator():
+        key = ' '.join(description.lower().split())[:255]
+        if not key:
+            continue
+        entry = vocabulary.setdefault(
+            (user_id, key, transaction_type, category),
+            DescriptionSuggestion(
+                user_id=user_id, key=key, transaction_type=transaction_type, category=category, count=0
+            )
+        )
+        entry.count += 1
+        entry.last_used = day
+        entry.last_amount = amount
+        entry.description = description.strip()[:255]
+    DescriptionSuggestion.objects.bulk_create(vocabulary.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0011_transaction_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DescriptionSuggestion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, verbose_name='key')),
+                ('description', models.CharField(max_length=255, verbose_name='description')),
+                ('transaction_type', models.CharField(choices=[('IN', 'Income'), ('EX', 'Expense')], max_length=2, verbose_name='transaction type')),
+                ('category', models.CharField(choices=[('SALARY', 'Salary'), ('FREELANCE', 'Freelance'), ('INVESTMENT', 'Investment'), ('GIFT', 'Gift'), ('OTHER_INC', 'Other Income'), ('HOUSING', 'Housing'), ('FOOD', 'Food'), ('TRANSPORT', 'Transportation'), ('HEALTH', 'Health'), ('ENTERTAIN', 'Entertainment'), ('EDUCATION', 'Education'), ('SHOPPING', 'Shopping'), ('UTILITIES', 'Utilities'), ('TRAVEL', 'Travel'), ('OTHER_EXP', 'Other Expense')], max_length=10, verbose_name='category')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('last_used', models.DateField(verbose_name='last used')),
+                ('last_amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='last amount')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='description_suggestions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'description suggestion',
+                'verbose_name_plural': 'description suggestions',
+                'indexes': [models.Index(fields=['user', '-count', '-last_used'], name='suggestion_popular_idx')],
+                'unique_together': {('user', 'key', 'transaction_type', 'category')},
+            },
+        ),
+        migrations.RunPython(build_suggestions, migrations.RunPython.noop),
+    ]
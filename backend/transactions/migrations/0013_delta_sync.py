@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F, OuterRef, Subquery
+
+
+def number_existing_transactions(apps, schema_editor):
+    # Give existing transactions a change sequence above 0, so that they are
+    # part of the first snapshot: every owner gets a version bump and their
+    # rows are numbered with the new version
+    Transaction = apps.get_model('transactions', 'Transaction')
+    UserDataVersion = apps.get_model('transactions', 'UserDataVersion')
+
+    owners = Transaction.objects.values_list('user_id', flat=True).distinct().order_by()
+    existing = set(UserDataVersion.objects.values_list('user_id', flat=True))
+    UserDataVersion.objects.bulk_create(
+        [UserDataVersion(user_id=user_id) for user_id in owners if user_id not in existing],
+        batch_size=1000
+    )
+    UserDataVersion.objects.filter(user_id__in=owners).update(version=F('version') + 1)
+    Transaction.objects.update(change_seq=Subquery(
+        UserDataVersion.objects.filter(user_id=OuterRef('user_id')).values('version')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0012_descriptionsuggestion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.BigIntegerField(verbose_name='transaction id')),
+                ('seq', models.PositiveBigIntegerField(verbose_name='change sequence')),
+                ('deleted_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='deleted at')),
+            ],
+            options={
+                'verbose_name': 'transaction tombstone',
+                'verbose_name_plural': 'transaction tombstones',
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='change_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='change sequence'),
+        ),
+        migrations.AddField(
+            model_name='userdataversion',
+            name='compacted_through',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='compacted through'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'change_seq', 'id'], name='transaction_change_seq_idx'),
+        ),
+        migrations.AddField(
+            model_name='transactiontombstone',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_tombstones', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transactiontombstone',
+            index=models.Index(fields=['user', 'seq', 'transaction_id'], name='tombstone_seq_idx'),
+        ),
+        migrations.RunPython(number_existing_transactions, migrations.RunPython.noop),
+    ]
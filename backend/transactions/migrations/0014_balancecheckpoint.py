@@ -0,0 +1,57 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+import django.db.models.deletion
+
+
+def build_checkpoints(apps, schema_editor):
+    # Closing balance of every month with transactions, per user
+    Transaction = apps.get_model('transactions', 'Transaction')
+    BalanceCheckpoint = apps.get_model('transactions', 'BalanceCheckpoint')
+
+    months = (
+        Transaction.objects.annotate(month=TruncMonth('date'))
+        .values_list('user_id', 'month', 'transaction_type')
+        .annotate(total=Sum('amount'))
+        .order_by('user_id', 'month')
+    )
+    checkpoints = {}
+    balances = {}
+    for user_id, month, transaction_type, total in months.iterator():
+        net = -total if transaction_type == 'EX' else total
+        balances[user_id] = balances.get(user_id, 0) + net
+        checkpoints[user_id, month] = balances[user_id]
+    BalanceCheckpoint.objects.bulk_create([
+        BalanceCheckpoint(user_id=user_id, month=month, balance=balance)
+        for (user_id, month), balance in checkpoints.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0013_delta_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='month')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='closing balance')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'balance checkpoint',
+                'verbose_name_plural': 'balance checkpoints',
+                'ordering': ['month'],
+                'unique_together': {('user', 'month')},
+            },
+        ),
+        migrations.RunPython(build_checkpoints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:13
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_stats(apps, schema_editor):
+    # Welford's running statistics per category, replayed oldest first
+    Transaction = apps.get_model('transactions', 'Transaction')
+    CategoryStats = apps.get_model('transactions', 'CategoryStats')
+
+    weight = 2 / 21
+    stats = {}
+    rows = Transaction.objects.order_by('date', 'id').values_list('user_id', 'transaction_type', 'category', 'amount')
+    for user_id, transaction_type, category, amount in rows.iterator():
+        value = float(amount)
+        entry = stats.get((user_id, transaction_type, category))
+        if entry is None:
+            stats[user_id, transaction_type, category] = CategoryStats(
+                user_id=user_id, transaction_type=transaction_type, category=category,
+                count=1, mean=value, m2=0, recent_mean=value, recent_variance=0
+            )
+            continue
+        entry.count += 1
+        delta = value - entry.mean
+        entry.mean += delta / entry.count
+        entry.m2 += delta * (value - entry.mean)
+        recent_delta = value - entry.recent_mean
+        entry.recent_mean += weight * recent_delta
+        entry.recent_variance = (1 - weight) * (entry.recent_variance + recent_delta * weight * recent_delta)
+    CategoryStats.objects.bulk_create(stats.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0014_balancecheckpoint'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='financialinsight',
+            name='insight_type',
+            field=models.CharField(choices=[('SPENDING', 'Spending Pattern'), ('SAVINGS', 'Savings Opportunity'), ('BUDGET', 'Budget Alert'), ('GENERAL', 'General Advice'), ('ANOMALY', 'Unusual Transaction')], max_length=10, verbose_name='insight type'),
+        ),
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_type', models.CharField(choices=[('IN', 'Income'), ('EX', 'Expense')], max_length=2, verbose_name='transaction type')),
+                ('category', models.CharField(choices=[('SALARY', 'Salary'), ('FREELANCE', 'Freelance'), ('INVESTMENT', 'Investment'), ('GIFT', 'Gift'), ('OTHER_INC', 'Other Income'), ('HOUSING', 'Housing'), ('FOOD', 'Food'), ('TRANSPORT', 'Transportation'), ('HEALTH', 'Health'), ('ENTERTAIN', 'Entertainment'), ('EDUCATION', 'Education'), ('SHOPPING', 'Shopping'), ('UTILITIES', 'Utilities'), ('TRAVEL', 'Travel'), ('OTHER_EXP', 'Other Expense')], max_length=10, verbose_name='category')),
+                ('count', models.IntegerField(default=0, verbose_name='count')),
+                ('mean', models.FloatField(default=0, verbose_name='mean')),
+                ('m2', models.FloatField(default=0, verbose_name='sum of squared deviations')),
+                ('recent_mean', models.FloatField(default=0, verbose_name='recent mean')),
+                ('recent_variance', models.FloatField(default=0, verbose_name='recent variance')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='category_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'category statistics',
+                'verbose_name_plural': 'category statistics',
+                'unique_together': {('user', 'transaction_type', 'category')},
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:22
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transactions', '0015_categorystats'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='balancecheckpoint',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='categorystats',
+            unique_together=set(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyrollup',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='balancecheckpoint',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3, verbose_name='currency'),
+        ),
+        migrations.AddField(
+            model_name='budget',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3, validators=[django.core.validators.RegexValidator('^[A-Z]{3}$', 'Enter a three-letter currency code, such as USD.')], verbose_name='currency'),
+        ),
+        migrations.AddField(
+            model_name='categorystats',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3, verbose_name='currency'),
+        ),
+        migrations.AddField(
+            model_name='monthlyrollup',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3, verbose_name='currency'),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='currency',
+            field=models.CharField(default='USD', max_length=3, validators=[django.core.validators.RegexValidator('^[A-Z]{3}$', 'Enter a three-letter currency code, such as USD.')], verbose_name='currency'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='balancecheckpoint',
+            unique_together={('user', 'currency', 'month')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='categorystats',
+            unique_together={('user', 'transaction_type', 'category', 'currency')},
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyrollup',
+            unique_together={('user', 'year', 'month', 'transaction_type', 'category', 'currency')},
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(max_length=3, validators=[django.core.validators.RegexValidator('^[A-Z]{3}$', 'Enter a three-letter currency code, such as USD.')], verbose_name='currency')),
+                ('year', models.PositiveSmallIntegerField(verbose_name='year')),
+                ('month', models.PositiveSmallIntegerField(verbose_name='month')),
+                ('rate', models.DecimalField(decimal_places=10, max_digits=20, verbose_name='rate')),
+            ],
+            options={
+                'verbose_name': 'exchange rate',
+                'verbose_name_plural': 'exchange rates',
+                'ordering': ['currency', 'year', 'month'],
+                'unique_together': {('currency', 'year', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 14:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0017_exchangerate_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdataversion',
+            name='changed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='changed at'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0018_userdataversion_changed_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='statementimport',
+            name='file',
+            field=models.FileField(blank=True, upload_to='statements/%Y/%m/', verbose_name='file'),
+        ),
+        migrations.AddField(
+            model_name='statementimport',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='updated at'),
+        ),
+        migrations.AddField(
+            model_name='statementimport',
+            name='worker',
+            field=models.CharField(blank=True, max_length=64, verbose_name='worker'),
+        ),
+        migrations.AddIndex(
+            model_name='statementimport',
+            index=models.Index(fields=['status', 'created_at'], name='import_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+import hashlib
+
+from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from . import replicas
+from .caching import request_data_version
+
+
+class NotModified(APIException):
+    """Raised when the client's cached representation is still current."""
+    status_code = status.HTTP_304_NOT_MODIFIED
+    default_detail = 'Not modified.'
+
+
+class ETagMixin:
+    """Add ETags to safe requests and answer 304 Not Modified when they match.
+
+    The ETag is derived from the user's data version (bumped on every
+    Transaction/Budget write), the request path and query string, the Accept
+    header and today's date, so it is computed without touching the data
+    and checked before any query or serialization work for the response.
+    """
+    etag_actions = ()
+
+    def get_etag(self, request):
+        """Return the quoted ETag of the current request."""
+        source = '|'.join([
+            str(request.user.pk),
+            str(request_data_version(request)),
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            timezone.now().date().isoformat(),
+        ])
+        return '"%s"' % hashlib.sha1(source.encode()).hexdigest()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.etag = None
+        if request.method not in ('GET', 'HEAD') or self.action not in self.etag_actions:
+            return
+
+        self.etag = self.get_etag(request)
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            # Weak comparison, as for If-None-Match (RFC 9110 13.1.2)
+            client_etags = {etag.removeprefix('W/') for etag in parse_etags(if_none_match)}
+            if '*' in client_etags or self.etag in client_etags:
+                raise NotModified()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'etag', None) and response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = self.etag
+            # Responses are per user: let clients store them, but revalidate
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+
+
+class ReplicaReadMixin:
+    """Serve the reads of safe requests from a read replica (see replicas.py).
+
+    Must come before ETagMixin, so that the data version behind the ETag is
+    read from the same database as the response.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with replicas.request_scope():
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            # Authenticates on the primary: the choice depends on the user
+            replicas.read_from(replicas.choose_database(request.user))
+        super().initial(request, *args, **kwargs)
@@ -1,10 +1,14 @@
-from django.db import models
+from django.db import models, transaction as db_transaction
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
-from django.core.validators import MinValueValidator
+from django.core.validators import MinValueValidator, RegexValidator
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import date
 import json
 
+# ISO 4217 codes, e.g. USD
+currency_validator = RegexValidator(r'^[A-Z]{3}$', _('Enter a three-letter currency code, such as USD.'))
+
 
 class Transaction(models.Model):
     """Model representing a financial transaction (income or expense)."""
@@ -44,6 +48,12 @@ class Transaction(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(0.01)]
     )
+    currency = models.CharField(
+        _('currency'),
+        max_length=3,
+        default=settings.DEFAULT_CURRENCY,
+        validators=[currency_validator]
+    )
     transaction_type = models.CharField(
         _('transaction type'),
         max_length=2,
@@ -58,14 +68,31 @@ class Transaction(models.Model):
     date = models.DateField(_('date'))
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    # The owner's data version of the last write, for delta sync (see sync.py)
+    change_seq = models.PositiveBigIntegerField(_('change sequence'), default=0, editable=False)
     
     class Meta:
         ordering = ['-date', '-created_at']
         verbose_name = _('transaction')
         verbose_name_plural = _('transactions')
+        # Period filters are half-open ranges on date (see periods.py)
+        indexes = [
+            # Also serves the keyset pagination of the list (see pagination.py)
+            models.Index(fields=['user', 'date', 'created_at', 'id'], name='transaction_keyset_idx'),
+            models.Index(fields=['user', 'transaction_type', 'date'], name='transaction_user_type_date_idx'),
+            models.Index(fields=['user', 'category', 'date'], name='transaction_user_cat_date_idx'),
+            models.Index(fields=['user', 'change_seq', 'id'], name='transaction_change_seq_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.get_transaction_type_display()}: {self.amount} - {self.get_category_display()} ({self.date})"
+        return f"{self.get_transaction_type_display()}: {self.amount} {self.currency} - {self.get_category_display()} ({self.date})"
+    
+    def save(self, *args, **kwargs):
+        """Save the transaction and its derived data in one database transaction."""
+        # Rollups and other derived tables are updated by the save signals
+        # (see signals.py), so they must run inside the same atomic block.
+        with db_transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
     
     @property
     def is_income(self):
@@ -78,6 +105,242 @@ class Transaction(models.Model):
         return self.transaction_type == self.TransactionType.EXPENSE
 
 
+class MonthlyRollup(models.Model):
+    """Pre-aggregated transaction totals per user, month, type and category.
+
+    Rows are maintained incrementally on every Transaction write and can be
+    recomputed from scratch with the ``rebuild_rollups`` management command.
+    """
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='monthly_rollups'
+    )
+    year = models.PositiveSmallIntegerField(_('year'))
+    month = models.PositiveSmallIntegerField(_('month'))
+    transaction_type = models.CharField(
+        _('transaction type'),
+        max_length=2,
+        choices=Transaction.TransactionType.choices
+    )
+    category = models.CharField(
+        _('category'),
+        max_length=10,
+        choices=Transaction.Category.choices
+    )
+    currency = models.CharField(_('currency'), max_length=3, default=settings.DEFAULT_CURRENCY)
+    # In the transactions' currency
+    total = models.DecimalField(_('total'), max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(_('count'), default=0)
+    
+    class Meta:
+        ordering = ['year', 'month']
+        verbose_name = _('monthly rollup')
+        verbose_name_plural = _('monthly rollups')
+        unique_together = ['user', 'year', 'month', 'transaction_type', 'category', 'currency']
+    
+    def __str__(self):
+        return f"{self.year}-{self.month:02d} {self.transaction_type}/{self.category}: {self.total} {self.currency} ({self.count})"
+
+
+class BalanceCheckpoint(models.Model):
+    """Closing balance (income minus expenses) of a user at the end of a month, per currency.
+    
+    There is a row for each month and currency with transactions (rows of months whose
+    transactions were all removed are kept). Rows are maintained on
+    every Transaction write, including every later month when an earlier
+    month changes, and can be recomputed with the ``rebuild_balances``
+    management command.
+    """
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='balance_checkpoints'
+    )
+    currency = models.CharField(_('currency'), max_length=3, default=settings.DEFAULT_CURRENCY)
+    # First day of the month
+    month = models.DateField(_('month'))
+    balance = models.DecimalField(_('closing balance'), max_digits=16, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['month']
+        verbose_name = _('balance checkpoint')
+        verbose_name_plural = _('balance checkpoints')
+        unique_together = ['user', 'currency', 'month']
+    
+    def __str__(self):
+        return f"{self.month:%Y-%m} closing balance: {self.balance} {self.currency}"
+
+
+class CategoryStats(models.Model):
+    """Running statistics of a user's transaction amounts in one category and currency.
+    
+    ``count``, ``mean`` and ``m2`` (the sum of squared deviations from the
+    mean) are Welford's online statistics of every transaction; the
+    ``recent_*`` fields are exponentially weighted over the latest ones.
+    Rows are updated in place on every Transaction write and can be
+    recomputed with the ``rebuild_category_stats`` management command.
+    """
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='category_stats'
+    )
+    transaction_type = models.CharField(
+        _('transaction type'),
+        max_length=2,
+        choices=Transaction.TransactionType.choices
+    )
+    category = models.CharField(
+        _('category'),
+        max_length=10,
+        choices=Transaction.Category.choices
+    )
+    currency = models.CharField(_('currency'), max_length=3, default=settings.DEFAULT_CURRENCY)
+    count = models.IntegerField(_('count'), default=0)
+    mean = models.FloatField(_('mean'), default=0)
+    m2 = models.FloatField(_('sum of squared deviations'), default=0)
+    recent_mean = models.FloatField(_('recent mean'), default=0)
+    recent_variance = models.FloatField(_('recent variance'), default=0)
+    
+    class Meta:
+        verbose_name = _('category statistics')
+        verbose_name_plural = _('category statistics')
+        unique_together = ['user', 'transaction_type', 'category', 'currency']
+    
+    def __str__(self):
+        return f"{self.transaction_type}/{self.category}: mean {self.mean:.2f} ({self.count})"
+    
+    @property
+    def variance(self):
+        """Sample variance of all the amounts, or 0 with fewer than two."""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class DescriptionSuggestion(models.Model):
+    """Per-user vocabulary of past transaction descriptions for autocomplete.
+    
+    One row per normalized description, type and category, maintained
+    incrementally on every Transaction write like MonthlyRollup.
+    """
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='description_suggestions'
+    )
+    key = models.CharField(_('key'), max_length=255)
+    description = models.CharField(_('description'), max_length=255)
+    transaction_type = models.CharField(
+        _('transaction type'),
+        max_length=2,
+        choices=Transaction.TransactionType.choices
+    )
+    category = models.CharField(
+        _('category'),
+        max_length=10,
+        choices=Transaction.Category.choices
+    )
+    count = models.IntegerField(_('count'), default=0)
+    last_used = models.DateField(_('last used'))
+    last_amount = models.DecimalField(_('last amount'), max_digits=12, decimal_places=2)
+    
+    class Meta:
+        verbose_name = _('description suggestion')
+        verbose_name_plural = _('description suggestions')
+        # Also serves prefix lookups on (user, key)
+        unique_together = ['user', 'key', 'transaction_type', 'category']
+        indexes = [
+            # Most used descriptions first, for typo-tolerant lookups
+            models.Index(fields=['user', '-count', '-last_used'], name='suggestion_popular_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.description} ({self.category}, {self.count})"
+
+
+class UserDataVersion(models.Model):
+    """Per-user counter bumped on every Transaction or Budget write.
+    
+    Cached responses are keyed by this version, so a write makes every
+    earlier entry unreachable without having to delete it.
+    """
+    
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='data_version'
+    )
+    version = models.PositiveBigIntegerField(_('version'), default=0)
+    # Time of the last bump; reads stay on the primary for a while after it (see replicas.py)
+    changed_at = models.DateTimeField(_('changed at'), null=True, blank=True)
+    # Tombstones up to this version have been compacted away (see sync.py)
+    compacted_through = models.PositiveBigIntegerField(_('compacted through'), default=0)
+    
+    class Meta:
+        verbose_name = _('user data version')
+        verbose_name_plural = _('user data versions')
+    
+    def __str__(self):
+        return f"Data version {self.version} for user {self.user_id}"
+
+
+class TransactionTombstone(models.Model):
+    """Record of a deleted transaction, for delta sync clients.
+    
+    Tombstones older than TRANSACTION_SYNC_TOMBSTONE_TTL are removed by the
+    ``compact_tombstones`` management command.
+    """
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='transaction_tombstones'
+    )
+    transaction_id = models.BigIntegerField(_('transaction id'))
+    seq = models.PositiveBigIntegerField(_('change sequence'))
+    deleted_at = models.DateTimeField(_('deleted at'), auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = _('transaction tombstone')
+        verbose_name_plural = _('transaction tombstones')
+        indexes = [
+            models.Index(fields=['user', 'seq', 'transaction_id'], name='tombstone_seq_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Transaction {self.transaction_id} deleted at version {self.seq}"
+
+
+class ExchangeRate(models.Model):
+    """Average exchange rate of a currency over one month.
+    
+    ``rate`` is the number of units of ``currency`` worth one unit of the
+    base currency (EXCHANGE_RATE_BASE_CURRENCY), which has no rows. Rows are
+    loaded from a dated rate file with the ``load_exchange_rates``
+    management command.
+    """
+    
+    currency = models.CharField(_('currency'), max_length=3, validators=[currency_validator])
+    year = models.PositiveSmallIntegerField(_('year'))
+    month = models.PositiveSmallIntegerField(_('month'))
+    rate = models.DecimalField(_('rate'), max_digits=20, decimal_places=10)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        ordering = ['currency', 'year', 'month']
+        verbose_name = _('exchange rate')
+        verbose_name_plural = _('exchange rates')
+        unique_together = ['currency', 'year', 'month']
+    
+    def __str__(self):
+        return f"{self.year}-{self.month:02d} {self.currency}: {self.rate}"
+
+
 class Budget(models.Model):
     """Model representing a monthly budget for expense categories."""
     
@@ -101,6 +364,12 @@ class Budget(models.Model):
         decimal_places=2,
         validators=[MinValueValidator(0.01)]
     )
+    currency = models.CharField(
+        _('currency'),
+        max_length=3,
+        default=settings.DEFAULT_CURRENCY,
+        validators=[currency_validator]
+    )
     period = models.CharField(
         _('period'),
         max_length=10,
@@ -121,37 +390,43 @@ class Budget(models.Model):
         return f"Budget: {self.get_category_display()} - ${self.amount} ({self.get_period_display()})"
     
     def get_usage_percentage(self, year=None, month=None):
-        """Calculate what percentage of the budget has been used."""
+        """Calculate what percentage of the budget has been used.
+        
+        This runs one query per budget; use budgets.BudgetUsageCalculator
+        when usage is needed for several budgets.
+        """
         # Default to current year and month
         today = date.today()
         year = year or today.year
         month = month or today.month
         
-        # Calculate the amount spent in this category for the period
+        # Calculate the amount spent in this category for the period, in
+        # the user's reporting currency
         from django.db.models import Sum
+        from .currencies import convert, converted
+        currency = self.user.reporting_currency
+        total = converted('total', currency)
         if self.period == self.Period.MONTHLY:
             # For monthly budget, get sum of expenses in the specific month
-            spent = Transaction.objects.filter(
-                user=self.user,
+            spent = MonthlyRollup.objects.filter(
+                user_id=self.user_id,
                 transaction_type=Transaction.TransactionType.EXPENSE,
                 category=self.category,
-                date__year=year,
-                date__month=month
-            ).aggregate(total=Sum('amount'))
+                year=year,
+                month=month
+            ).aggregate(total=Sum(total))
         else:  # YEARLY
             # For yearly budget, get sum of expenses in the entire year
-            spent = Transaction.objects.filter(
-                user=self.user,
+            spent = MonthlyRollup.objects.filter(
+                user_id=self.user_id,
                 transaction_type=Transaction.TransactionType.EXPENSE,
                 category=self.category,
-                date__year=year
-            ).aggregate(total=Sum('amount'))
+                year=year
+            ).aggregate(total=Sum(total))
         
         # Calculate percentage of budget used
-        if not spent['total']:
-            return 0
-        
-        return min(100, int((abs(spent['total']) / self.amount) * 100))
+        from .budgets import usage_percentage
+        return usage_percentage(spent['total'], convert(self.amount, self.currency, currency, year, month))
 
 
 class FinancialInsight(models.Model):
@@ -162,6 +437,7 @@ class FinancialInsight(models.Model):
         SAVINGS_OPPORTUNITY = 'SAVINGS', _('Savings Opportunity')
         BUDGET_ALERT = 'BUDGET', _('Budget Alert')
         GENERAL_ADVICE = 'GENERAL', _('General Advice')
+        ANOMALY = 'ANOMALY', _('Unusual Transaction')
     
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -201,3 +477,215 @@ class FinancialInsight(models.Model):
     def data(self, value):
         """Store the data points as a JSON string."""
         self.data_points = json.dumps(value)
+
+
+class InsightJob(models.Model):
+    """Queued request to generate financial insights for a user.
+    
+    Jobs are processed by the ``process_insight_jobs`` management command.
+    A user can have at most one pending job at a time.
+    """
+    
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        RUNNING = 'RUNNING', _('Running')
+        SUCCEEDED = 'SUCCEEDED', _('Succeeded')
+        FAILED = 'FAILED', _('Failed')
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='insight_jobs'
+    )
+    status = models.CharField(
+        _('status'),
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    worker = models.CharField(_('worker'), max_length=64, blank=True)
+    result_data = models.TextField(_('result data'), blank=True, null=True, help_text=_('JSON serialized generated insights'))
+    error = models.TextField(_('error'), blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    started_at = models.DateTimeField(_('started at'), blank=True, null=True)
+    finished_at = models.DateTimeField(_('finished at'), blank=True, null=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = _('insight job')
+        verbose_name_plural = _('insight jobs')
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='insightjob_status_created_idx'),
+        ]
+        constraints = [
+            # Deduplicates repeat requests while a job is waiting
+            models.UniqueConstraint(
+                fields=['user'],
+                condition=models.Q(status='PENDING'),
+                name='insightjob_one_pending_per_user'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"Insight job {self.pk} ({self.get_status_display()})"
+    
+    @property
+    def result(self):
+        """Return the generated insights as a Python object."""
+        if not self.result_data:
+            return None
+        try:
+            return json.loads(self.result_data)
+        except json.JSONDecodeError:
+            return None
+    
+    @result.setter
+    def result(self, value):
+        """Store the generated insights as a JSON string."""
+        self.result_data = json.dumps(value, cls=DjangoJSONEncoder)
+
+
+class BatchRequest(models.Model):
+    """Stored outcome of a transaction batch sent with an idempotency key.
+    
+    A retry carrying the same key gets the stored response back instead of
+    applying the batch again.
+    """
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='batch_requests'
+    )
+    idempotency_key = models.CharField(_('idempotency key'), max_length=255)
+    fingerprint = models.CharField(_('fingerprint'), max_length=64, help_text=_('SHA-256 of the request body'))
+    response_data = models.TextField(_('response data'), help_text=_('JSON serialized response'))
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = _('batch request')
+        verbose_name_plural = _('batch requests')
+        unique_together = ['user', 'idempotency_key']
+    
+    def __str__(self):
+        return f"Batch {self.idempotency_key} for user {self.user_id}"
+    
+    @property
+    def response(self):
+        """Return the stored response body as a Python object."""
+        return json.loads(self.response_data)
+    
+    @response.setter
+    def response(self, value):
+        """Store the response body as a JSON string."""
+        self.response_data = json.dumps(value, cls=DjangoJSONEncoder)
+
+
+class StatementImport(models.Model):
+    """Import of a bank statement file into a user's transactions.
+    
+    Uploaded files are stored in ``file`` until a worker has imported them
+    (see the ``process_statement_imports`` command). Progress counters are
+    updated after every chunk of rows, so they can be polled while the
+    import runs. Rows that fail validation are recorded as ImportRowError
+    objects and skipped.
+    """
+    
+    class FileFormat(models.TextChoices):
+        CSV = 'CSV', _('CSV')
+        OFX = 'OFX', _('OFX')
+        QIF = 'QIF', _('QIF')
+    
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        RUNNING = 'RUNNING', _('Running')
+        SUCCEEDED = 'SUCCEEDED', _('Succeeded')
+        FAILED = 'FAILED', _('Failed')
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='statement_imports'
+    )
+    file_name = models.CharField(_('file name'), max_length=255)
+    file_format = models.CharField(
+        _('file format'),
+        max_length=3,
+        choices=FileFormat.choices
+    )
+    options_data = models.TextField(_('options'), blank=True, help_text=_('JSON serialized parsing options'))
+    file = models.FileField(_('file'), upload_to='statements/%Y/%m/', blank=True)
+    status = models.CharField(
+        _('status'),
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING
+    )
+    worker = models.CharField(_('worker'), max_length=64, blank=True)
+    rows_processed = models.PositiveIntegerField(_('rows processed'), default=0)
+    rows_imported = models.PositiveIntegerField(_('rows imported'), default=0)
+    rows_failed = models.PositiveIntegerField(_('rows failed'), default=0)
+    error = models.TextField(_('error'), blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    started_at = models.DateTimeField(_('started at'), blank=True, null=True)
+    finished_at = models.DateTimeField(_('finished at'), blank=True, null=True)
+    # Saved with every chunk: a running import that stops moving was abandoned
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = _('statement import')
+        verbose_name_plural = _('statement imports')
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='import_status_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Import of {self.file_name} ({self.get_status_display()})"
+    
+    @property
+    def options(self):
+        """Return the parsing options as a dictionary."""
+        if not self.options_data:
+            return {}
+        try:
+            return json.loads(self.options_data)
+        except json.JSONDecodeError:
+            return {}
+    
+    @options.setter
+    def options(self, value):
+        """Store the parsing options as a JSON string."""
+        self.options_data = json.dumps(value)
+
+
+class ImportRowError(models.Model):
+    """A statement row that could not be imported."""
+    
+    statement_import = models.ForeignKey(
+        StatementImport,
+        on_delete=models.CASCADE,
+        related_name='row_errors'
+    )
+    line = models.PositiveIntegerField(_('line'))
+    errors_data = models.TextField(_('errors'), help_text=_('JSON serialized errors per field'))
+    raw = models.TextField(_('raw row'), blank=True)
+    
+    class Meta:
+        ordering = ['statement_import', 'line']
+        verbose_name = _('import row error')
+        verbose_name_plural = _('import row errors')
+    
+    def __str__(self):
+        return f"Line {self.line} of import {self.statement_import_id}"
+    
+    @property
+    def errors(self):
+        """Return the errors as a dictionary."""
+        return json.loads(self.errors_data)
+    
+    @errors.setter
+    def errors(self, value):
+        """Store the errors as a JSON string."""
+        self.errors_data = json.dumps(value)
@@ -0,0 +1,145 @@
+"""
+Pagination for the transaction list.
+
+The default is keyset ("cursor") pagination over ``-date, -created_at, -id``:
+a page is the next ``page_size`` rows after the position stored in the
+cursor, read as a range scan on the matching (user, date, created_at, id)
+index. Unlike page-number pagination there is no COUNT(*) and no OFFSET, so
+deep pages cost the same as the first one.
+
+Page-number pagination is kept for existing clients: requests passing
+``page`` (or a custom ``ordering``, which the keyset cannot follow) are
+paginated by TransactionPageNumberPagination instead.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class Position(NamedTuple):
+    """Sort key of one transaction, in ordering order."""
+    date: object
+    created_at: object
+    id: int
+
+
+class TransactionCursorPagination(CursorPagination):
+    """Keyset pagination over ``-date, -created_at, -id``."""
+    ordering = ('-date', '-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.TRANSACTION_MAX_PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        position, reverse = self.decode_cursor(request)
+
+        if reverse:
+            # Walk backwards from the first row of the later page
+            queryset = queryset.order_by('date', 'created_at', 'id')
+            if position is not None:
+                queryset = queryset.filter(self._after(position))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+            if position is not None:
+                queryset = queryset.filter(self._before(position))
+
+        # One extra row tells whether there is another page in that direction
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page = rows
+        return rows
+
+    @staticmethod
+    def _before(position):
+        """Rows after ``position`` in display (descending) order."""
+        return Q(date__lte=position.date) & (
+            Q(date__lt=position.date)
+            | Q(date=position.date, created_at__lt=position.created_at)
+            | Q(date=position.date, created_at=position.created_at, id__lt=position.id)
+        )
+
+    @staticmethod
+    def _after(position):
+        """Rows before ``position`` in display (descending) order."""
+        return Q(date__gte=position.date) & (
+            Q(date__gt=position.date)
+            | Q(date=position.date, created_at__gt=position.created_at)
+            | Q(date=position.date, created_at=position.created_at, id__gt=position.id)
+        )
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    @staticmethod
+    def _position(transaction):
+        # Model instances or named values_list() rows
+        return Position(transaction.date, transaction.created_at, transaction.id)
+
+    def decode_cursor(self, request):
+        """Return ``(position, reverse)`` from the cursor query parameter."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            raw_date, raw_created_at, pk, reverse = json.loads(urlsafe_b64decode(encoded.encode()))
+            position = Position(parse_date(raw_date), parse_datetime(raw_created_at), int(pk))
+        except (TypeError, ValueError, BinasciiError):
+            raise NotFound(self.invalid_cursor_message)
+        if position.date is None or position.created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+        return position, bool(reverse)
+
+    def encode_cursor(self, position, reverse=False):
+        """Return the URL of the page next to ``position`` in one direction."""
+        raw = json.dumps([
+            position.date.isoformat(), position.created_at.isoformat(), position.id, int(reverse)
+        ])
+        encoded = urlsafe_b64encode(raw.encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
+
+
+class TransactionPageNumberPagination(PageNumberPagination):
+    """The original page-number pagination, with a client page size."""
+    page_size_query_param = 'page_size'
+    max_page_size = settings.TRANSACTION_MAX_PAGE_SIZE
+
+
+def uses_page_numbers(request):
+    """Return whether ``request`` asks for page-number pagination."""
+    return 'page' in request.query_params or 'ordering' in request.query_params
@@ -0,0 +1,76 @@
+"""
+Half-open date ranges for period filters.
+
+Filtering with ``date__year``/``date__month`` compiles to EXTRACT()
+expressions that cannot use an index on ``date``. Every period filter on
+Transaction is built from a DateRange instead, which compiles to
+``date >= start AND date < end`` and can use the composite
+(user, ..., date) indexes.
+"""
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
+
+
+class DateRange(NamedTuple):
+    """Dates ``d`` with ``start <= d < end``; ``end=None`` means unbounded."""
+    start: date
+    end: Optional[date] = None
+
+    def as_filter(self, field='date'):
+        """Return queryset filter kwargs selecting this range on ``field``."""
+        lookups = {f'{field}__gte': self.start}
+        if self.end is not None:
+            lookups[f'{field}__lt'] = self.end
+        return lookups
+
+    def __contains__(self, day):
+        return self.start <= day and (self.end is None or day < self.end)
+
+
+def next_month(day):
+    """Return the first day of the month following ``day``."""
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def months_back(day, months):
+    """Return the first day of the month ``months`` months before ``day``'s month."""
+    month_index = day.year * 12 + day.month - 1 - months
+    return date(month_index // 12, month_index % 12 + 1, 1)
+
+
+def month_range(year, month):
+    """Return the range covering one calendar month."""
+    start = date(year, month, 1)
+    return DateRange(start, next_month(start))
+
+
+def year_range(year):
+    """Return the range covering one calendar year."""
+    return DateRange(date(year, 1, 1), date(year + 1, 1, 1))
+
+
+def last_n_days(days, today=None):
+    """Return the range of the last ``days`` days up to and including today."""
+    today = today or date.today()
+    return DateRange(today - timedelta(days=days), today + timedelta(days=1))
+
+
+def split_by_month(date_range):
+    """Split a range into a partial head, whole months and a partial tail.
+
+    Returns ``(head, months, tail)``: ``head`` and ``tail`` are DateRanges
+    (or None) covering the days outside whole calendar months, and
+    ``months`` is a DateRange of whole months (or None). An unbounded range
+    never has a tail.
+    """
+    start, end = date_range
+    first_full = start if start.day == 1 else next_month(start)
+    last_full_end = end if end is None or end.day == 1 else end.replace(day=1)
+
+    if last_full_end is not None and first_full >= last_full_end:
+        # No whole month inside the range
+        return date_range, None, None
+
+    head = DateRange(start, first_full) if start < first_full else None
+    tail = DateRange(last_full_end, end) if end is not None and last_full_end < end else None
+    return head, DateRange(first_full, last_full_end), tail
@@ -0,0 +1,170 @@
+"""
+Renderers for the non-JSON formats of the transactions API.
+
+The export action streams its body itself (see export.py); these renderers
+make ``?format=csv`` / ``?format=ndjson`` and the matching Accept headers
+negotiate, and render error responses in the requested format.
+
+Two compact formats are available on the list, export and summary series
+endpoints:
+
+- columnar JSON (``?format=columnar``): one array per field instead of one
+  object per row, with transaction types and categories replaced by their
+  index in a ``dictionaries`` table that also carries the display names;
+- MessagePack (``?format=msgpack``), when the optional ``msgpack`` package
+  is installed.
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from uuid import UUID
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.functional import Promise
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+from .models import Transaction
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _cell(value):
+    # Validation errors are lists of messages
+    if isinstance(value, (list, tuple)):
+        return '; '.join(str(item) for item in value)
+    return value
+
+
+class CSVRenderer(BaseRenderer):
+    """Render a dict or a list of dicts as CSV with a header row."""
+    media_type = 'text/csv'
+    format = 'csv'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        header = list(rows[0]) if rows else []
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow([_cell(row.get(column, '')) for column in header])
+        return buffer.getvalue().encode(self.charset)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """Render a dict or a list of dicts as newline-delimited JSON."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        rows = data if isinstance(data, list) else [data]
+        return ''.join(
+            json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in rows
+        ).encode(self.charset)
+
+
+# Fields sent as indexes into a fixed table of codes and display names. The
+# tables list every choice, so indexes mean the same on every page.
+DICTIONARIES = {
+    'transaction_type': Transaction.TransactionType.choices,
+    'category': Transaction.Category.choices,
+}
+DICTIONARY_TABLES = {
+    field: {'values': [value for value, _ in choices], 'labels': [str(label) for _, label in choices]}
+    for field, choices in DICTIONARIES.items()
+}
+DICTIONARY_INDEXES = {
+    field: {value: index for index, (value, _) in enumerate(choices)}
+    for field, choices in DICTIONARIES.items()
+}
+DISPLAY_SUFFIX = '_display'
+
+
+def columnar_block(columns, rows):
+    """Return the columnar layout of ``rows`` (tuples in ``columns`` order).
+
+    Display columns of dictionary-encoded fields are dropped: their values
+    are the ``labels`` of the dictionary.
+    """
+    encoded = [field for field in columns if field in DICTIONARIES]
+    output = {}
+    for position, field in enumerate(columns):
+        if field.endswith(DISPLAY_SUFFIX) and field[:-len(DISPLAY_SUFFIX)] in encoded:
+            continue
+        values = [row[position] for row in rows]
+        if field in DICTIONARIES:
+            indexes = DICTIONARY_INDEXES[field]
+            values = [indexes.get(value, value) for value in values]
+        output[field] = values
+    return {
+        'length': len(rows),
+        'columns': output,
+        'dictionaries': {field: DICTIONARY_TABLES[field] for field in encoded},
+    }
+
+
+def to_columnar(data):
+    """Convert a list of dicts, or a page whose ``results`` is one, to columns.
+
+    Anything else (a single object, an error) is returned unchanged.
+    """
+    if isinstance(data, dict) and isinstance(data.get('results'), list):
+        return {**data, 'results': to_columnar(data['results'])}
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        return data
+    columns = list(data[0]) if data else []
+    return columnar_block(columns, [tuple(row.get(field) for field in columns) for row in data])
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """JSON renderer for the columnar layout of list responses."""
+    media_type = 'application/vnd.myfintrack.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_columnar(data), accepted_media_type, renderer_context)
+
+
+def msgpack_default(value):
+    """Encode the types msgpack has no native form for, as the JSON output does."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if isinstance(value, (Promise, UUID)):
+        return str(value)
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Render any response as MessagePack."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=msgpack_default)
+
+
+# Renderers of the list and summary endpoints: the defaults plus the compact
+# formats that are available
+COMPACT_RENDERERS = [ColumnarJSONRenderer] + ([MessagePackRenderer] if msgpack is not None else [])
+LIST_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, *COMPACT_RENDERERS]
@@ -0,0 +1,125 @@
+"""
+Read replicas for the transaction and budget read endpoints.
+
+ReplicaRouter sends reads to the database chosen for the current request:
+``None`` (the default database) unless a view picked a replica with
+``read_from()``. ReplicaReadMixin does that for safe requests of the
+transaction and budget viewsets, which serve the list, summary and
+dashboard traffic. Writes, and reads outside those views, always use the
+default database.
+
+A replica is used only while it passes a health check (it answers a query
+and, on PostgreSQL, replays within REPLICA_MAX_LAG_SECONDS of the
+primary), re-run every REPLICA_HEALTH_CHECK_INTERVAL seconds per process.
+Without a healthy replica, reads fall back to the primary.
+
+Every write bumps the data versions of its users (see caching.py) and
+records when it did in UserDataVersion.changed_at: for REPLICA_PIN_SECONDS
+afterwards their reads are pinned to the primary, so users read their own
+writes. The pin is read from the primary database, which every worker
+shares, by the same kind of primary key lookup as the data version.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.utils import timezone
+from django.utils.connection import ConnectionDoesNotExist
+
+from .models import UserDataVersion
+
+# Database the reads of the current request go to; None for the default one
+_database = ContextVar('replica_database', default=None)
+# Health check results of this process: {alias: (checked at, healthy)}
+_health = {}
+
+
+def replicas():
+    """Return the aliases of the configured replicas."""
+    return tuple(settings.DATABASE_REPLICAS)
+
+
+def is_pinned(user):
+    """Return whether ``user``'s data changed within the last REPLICA_PIN_SECONDS."""
+    since = timezone.now() - timedelta(seconds=settings.REPLICA_PIN_SECONDS)
+    return UserDataVersion.objects.using(DEFAULT_DB_ALIAS).filter(user=user, changed_at__gt=since).exists()
+
+
+def check_replica(alias):
+    """Return whether a replica answers queries and is not lagging too far behind."""
+    try:
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            if connection.vendor != 'postgresql':
+                cursor.execute('SELECT 1')
+                return True
+            # NULL on a server that is not a standby
+            cursor.execute(
+                'SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+                'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+            )
+            lag = cursor.fetchone()[0]
+            return lag is None or lag <= settings.REPLICA_MAX_LAG_SECONDS
+    except (ConnectionDoesNotExist, DatabaseError):
+        return False
+
+
+def healthy_replicas():
+    """Return the replicas that passed their last health check, re-running stale checks."""
+    now = time.monotonic()
+    healthy = []
+    for alias in replicas():
+        checked_at, ok = _health.get(alias, (None, False))
+        if checked_at is None or now - checked_at >= settings.REPLICA_HEALTH_CHECK_INTERVAL:
+            ok = check_replica(alias)
+            _health[alias] = (now, ok)
+        if ok:
+            healthy.append(alias)
+    return healthy
+
+
+def choose_database(user):
+    """Return the replica to serve the reads of ``user`` from, or None for the primary."""
+    if not replicas() or is_pinned(user):
+        return None
+    healthy = healthy_replicas()
+    return random.choice(healthy) if healthy else None
+
+
+def read_from(alias):
+    """Send the reads of the current request to ``alias`` (None for the primary)."""
+    _database.set(alias)
+
+
+@contextmanager
+def request_scope():
+    """Scope read_from() calls to a request: reads go to the primary again afterwards."""
+    token = _database.set(None)
+    try:
+        yield
+    finally:
+        _database.reset(token)
+
+
+class ReplicaRouter:
+    """Route the reads of replica-enabled requests; everything else uses the default database."""
+
+    def db_for_read(self, model, **hints):
+        return _database.get()
+
+    def db_for_write(self, model, **hints):
+        # Not the instance's database: objects read from a replica are saved on the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,197 @@
+"""
+Maintenance and queries for the MonthlyRollup table.
+
+Rollups hold SUM(amount) and COUNT(*) of transactions per
+(user, year, month, transaction_type, category, currency). They are kept up to date by
+the signal handlers in signals.py and can always be recomputed from the
+Transaction table with ``rebuild()``.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import MonthlyRollup, Transaction
+from . import currencies, periods
+
+CENT = Decimal('0.01')
+KEY_FIELDS = ('user_id', 'year', 'month', 'transaction_type', 'category', 'currency')
+
+
+def _key(row):
+    return (row.user_id, row.date.year, row.date.month, row.transaction_type, row.category, row.currency)
+
+
+def apply_changes(removed=(), added=()):
+    """Apply removed/added transaction snapshots to the rollup table.
+
+    Changes to the same rollup key are netted first, so an edit that does not
+    move a row between months or categories costs a single UPDATE.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for row in removed:
+        delta = deltas[_key(row)]
+        delta[0] -= row.amount
+        delta[1] -= 1
+    for row in added:
+        delta = deltas[_key(row)]
+        delta[0] += row.amount
+        delta[1] += 1
+
+    with db_transaction.atomic():
+        for key, (amount, count) in deltas.items():
+            if not amount and not count:
+                continue
+            _apply_delta(dict(zip(KEY_FIELDS, key)), amount, count)
+
+
+def _apply_delta(lookup, amount, count):
+    rollup = MonthlyRollup.objects.filter(**lookup)
+    updated = rollup.update(total=F('total') + amount, count=F('count') + count)
+    if not updated:
+        # Removals never create rows: a missing row means the rollup is
+        # already gone (e.g. the user is being deleted).
+        if count <= 0:
+            return
+        try:
+            with db_transaction.atomic():
+                MonthlyRollup.objects.create(total=amount, count=count, **lookup)
+            return
+        except IntegrityError:
+            # Created concurrently by another writer
+            rollup.update(total=F('total') + amount, count=F('count') + count)
+    if count < 0:
+        rollup.filter(count__lte=0).delete()
+
+
+def month_q(year, month, lookup='gte'):
+    """Return a Q comparing the rollup (year, month) pair against a month."""
+    if lookup == 'gte':
+        return Q(year__gt=year) | Q(year=year, month__gte=month)
+    if lookup == 'lte':
+        return Q(year__lt=year) | Q(year=year, month__lte=month)
+    raise ValueError(f"Unsupported lookup: {lookup}")
+
+
+def months_q(date_range):
+    """Return a Q selecting the rollup months inside a month-aligned DateRange."""
+    start, end = date_range
+    q = month_q(start.year, start.month)
+    if end is not None:
+        last = end - timedelta(days=1)
+        q &= month_q(last.year, last.month, 'lte')
+    return q
+
+
+def expense_totals_by_category(user, date_range=None):
+    """Return expense totals per category for transactions in ``date_range``.
+
+    Whole months come from the rollup table; only the partial months at
+    either end of the range are read from Transaction. Totals are in the
+    user's reporting currency. Results are ordered by descending total, like
+    the raw aggregation.
+    """
+    totals = defaultdict(Decimal)
+    expenses = with_month(Transaction.objects.filter(
+        user=user,
+        transaction_type=Transaction.TransactionType.EXPENSE
+    ))
+    rollup_qs = MonthlyRollup.objects.filter(
+        user=user,
+        transaction_type=Transaction.TransactionType.EXPENSE
+    )
+
+    if date_range is not None:
+        head, months, tail = periods.split_by_month(date_range)
+        for partial in (head, tail):
+            if partial is None:
+                continue
+            for item in expenses.filter(**partial.as_filter()).values('category').annotate(
+                total=Sum(currencies.converted('amount', user.reporting_currency))
+            ).order_by():
+                totals[item['category']] += item['total']
+        rollup_qs = rollup_qs.filter(months_q(months)) if months else rollup_qs.none()
+
+    for item in rollup_qs.values('category').annotate(
+        total=Sum(currencies.converted('total', user.reporting_currency))
+    ).order_by():
+        totals[item['category']] += item['total']
+
+    return [
+        {'category': category, 'total': total}
+        for category, total in sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    ]
+
+
+def with_month(transactions):
+    """Annotate transactions with the ``year`` and ``month`` of their date, as rollups have."""
+    return transactions.annotate(year=ExtractYear('date'), month=ExtractMonth('date'))
+
+
+def _aggregate_transactions(transactions):
+    return (
+        with_month(transactions)
+        .values(*KEY_FIELDS)
+        .annotate(total=Sum('amount'), count=Count('id'))
+        .order_by()
+    )
+
+
+def rebuild(user=None, batch_size=1000):
+    """Recompute rollups from the Transaction table, for one user or everyone.
+
+    Returns the number of rollup rows written.
+    """
+    transactions = Transaction.objects.all()
+    rollup_qs = MonthlyRollup.objects.all()
+    if user is not None:
+        transactions = transactions.filter(user=user)
+        rollup_qs = rollup_qs.filter(user=user)
+
+    written = 0
+    with db_transaction.atomic():
+        rollup_qs.delete()
+        batch = []
+        for row in _aggregate_transactions(transactions).iterator():
+            batch.append(MonthlyRollup(**row))
+            if len(batch) >= batch_size:
+                MonthlyRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        MonthlyRollup.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+def check_consistency(user=None):
+    """Compare rollups against a fresh aggregation of Transaction.
+
+    Returns a list of ``(key, expected, actual)`` tuples, where ``key`` is a
+    dict of the rollup key fields and ``expected``/``actual`` are
+    ``(total, count)`` pairs (``None`` when the row is missing). An empty list
+    means the rollups are consistent.
+    """
+    transactions = Transaction.objects.all()
+    rollup_qs = MonthlyRollup.objects.all()
+    if user is not None:
+        transactions = transactions.filter(user=user)
+        rollup_qs = rollup_qs.filter(user=user)
+
+    expected = {
+        # SQLite sums decimals as floats; compare at the column's precision
+        tuple(row[field] for field in KEY_FIELDS): (row['total'].quantize(CENT), row['count'])
+        for row in _aggregate_transactions(transactions).iterator()
+    }
+    actual = {
+        tuple(row[:len(KEY_FIELDS)]): tuple(row[len(KEY_FIELDS):])
+        for row in rollup_qs.values_list(*KEY_FIELDS, 'total', 'count').iterator()
+    }
+
+    mismatches = []
+    for key in sorted(expected.keys() | actual.keys()):
+        if expected.get(key) != actual.get(key):
+            mismatches.append((dict(zip(KEY_FIELDS, key)), expected.get(key), actual.get(key)))
+    return mismatches
@@ -0,0 +1,192 @@
+"""
+Full-text search over transaction descriptions and categories.
+
+The text index depends on the database:
+
+- PostgreSQL: a stored generated ``search_vector`` tsvector column with a
+  GIN index (description weighted above category), ranked with
+  ``ts_rank_cd``.
+- SQLite: a contentless FTS5 table kept in sync by triggers, ranked with
+  ``bm25``. Each row also indexes an owner token, so the user filter is
+  resolved inside the text index.
+
+Other databases fall back to ``icontains`` on every term, unranked.
+
+Queries are plain words, ``"quoted phrases"`` and ``prefix*`` terms; all
+terms must match.
+"""
+import re
+from typing import NamedTuple, Tuple
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import SearchFilter
+
+from .models import Transaction
+
+TABLE = Transaction._meta.db_table
+FTS_TABLE = f'{TABLE}_fts'
+SEARCH_CONFIG = 'simple'
+
+TOKEN = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+WORD = re.compile(r'\w+')
+
+
+class SearchTerm(NamedTuple):
+    """Words that must appear next to each other; the last one may be a prefix."""
+    words: Tuple[str, ...]
+    prefix: bool = False
+
+
+def parse_query(text, prefix_words=False):
+    """Split a search query into SearchTerms.
+
+    With ``prefix_words`` unquoted words match as prefixes even without ``*``.
+    """
+    terms = []
+    for match in TOKEN.finditer(text or ''):
+        phrase, phrase_prefix, bare = match.groups()
+        source = phrase if phrase is not None else bare
+        prefix = bool(phrase_prefix) if phrase is not None else (prefix_words or bare.endswith('*'))
+        # Punctuation splits words, as the text indexes do: "e-mail" is a phrase
+        words = tuple(word.lower() for word in WORD.findall(source))
+        if words:
+            terms.append(SearchTerm(words, prefix))
+    return terms
+
+
+def _tsquery(terms):
+    # Words are \w+ only, so they can't contain tsquery operators
+    return ' & '.join(
+        ' <-> '.join(term.words) + (':*' if term.prefix else '')
+        for term in terms
+    )
+
+
+def _fts5_query(terms, user_id):
+    phrases = ' AND '.join(
+        '"{}"{}'.format(' '.join(term.words), ' *' if term.prefix else '')
+        for term in terms
+    )
+    return f'owner : u{user_id} AND {{description category}} : ({phrases})'
+
+
+# Database alias -> search backend, looked up once per process
+_backends = {}
+
+
+def search_backend(using='default'):
+    """Return 'postgresql', 'sqlite' or None (no text index) for a database."""
+    if using not in _backends:
+        connection = connections[using]
+        backend = None
+        if connection.vendor == 'postgresql':
+            backend = 'postgresql'
+        elif connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            backend = 'sqlite'
+        _backends[using] = backend
+    return _backends[using]
+
+
+def full_text_search(queryset, text, user, prefix_words=False):
+    """Filter a Transaction queryset of ``user`` to rows matching ``text``.
+
+    The rows are annotated with ``search_rank`` (higher is better, 0 when
+    the database has no text index) but not ordered by it.
+    """
+    terms = parse_query(text, prefix_words)
+    if not terms:
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    backend = search_backend(queryset.db)
+    if backend == 'postgresql':
+        query = _tsquery(terms)
+        return queryset.filter(
+            RawSQL(
+                f"{TABLE}.search_vector @@ to_tsquery('{SEARCH_CONFIG}', %s)",
+                [query],
+                output_field=BooleanField()
+            )
+        ).annotate(search_rank=RawSQL(
+            f"ts_rank_cd({TABLE}.search_vector, to_tsquery('{SEARCH_CONFIG}', %s))",
+            [query],
+            output_field=FloatField()
+        ))
+
+    if backend == 'sqlite':
+        query = _fts5_query(terms, user.pk)
+        return queryset.filter(
+            RawSQL(
+                f'{TABLE}.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+                [query],
+                output_field=BooleanField()
+            )
+        ).annotate(search_rank=RawSQL(
+            # bm25() is lower for better matches; the owner column doesn't count
+            f'(SELECT -bm25({FTS_TABLE}, 1.0, 0.5, 0.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {TABLE}.id)',
+            [query],
+            output_field=FloatField()
+        ))
+
+    condition = Q()
+    for term in terms:
+        phrase = ' '.join(term.words)
+        condition &= Q(description__icontains=phrase) | Q(category__icontains=phrase)
+    return queryset.filter(condition).annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+
+# The triggers created by migration 0011_transaction_search
+_FTS_VALUES = "{row}.id, {row}.description, {row}.category, 'u' || {row}.user_id"
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_insert AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, description, category, owner)
+        VALUES ({_FTS_VALUES.format(row='new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_delete AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, description, category, owner)
+        VALUES ('delete', {_FTS_VALUES.format(row='old')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS transaction_fts_update
+    AFTER UPDATE OF description, category, user_id ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, description, category, owner)
+        VALUES ('delete', {_FTS_VALUES.format(row='old')});
+        INSERT INTO {FTS_TABLE} (rowid, description, category, owner)
+        VALUES ({_FTS_VALUES.format(row='new')});
+    END
+    """,
+]
+
+
+def restore_triggers(sender, using='default', **kwargs):
+    """post_migrate handler recreating the SQLite triggers if they are missing.
+
+    SQLite migrations that rebuild the transaction table drop its triggers.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if FTS_TABLE not in connection.introspection.table_names(cursor):
+            return
+        for statement in SQLITE_TRIGGERS:
+            cursor.execute(statement)
+
+
+class FullTextSearchFilter(SearchFilter):
+    """SearchFilter (``?search=``) backed by the full-text index instead of ILIKE.
+
+    Words match as prefixes, the closest the index gets to ILIKE's substrings.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        if not text.strip():
+            return queryset
+        return full_text_search(queryset, text, request.user, prefix_words=True)
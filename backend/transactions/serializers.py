@@ -1,6 +1,15 @@
+import codecs
+import os
+
 from rest_framework import serializers
-from .models import Transaction, Budget, FinancialInsight
-from datetime import date
+from .models import Transaction, Budget, FinancialInsight, InsightJob, StatementImport, ImportRowError
+from .statements import CSV_FIELDS
+from .budgets import BudgetUsageCalculator
+from .currencies import is_supported
+from .forecast import get_forecast, projected_spend
+
+# Formats computed amounts like the models' DecimalFields
+AMOUNT_FIELD = serializers.DecimalField(max_digits=14, decimal_places=2)
 
 class TransactionSerializer(serializers.ModelSerializer):
     """Serializer for the Transaction model."""
@@ -18,6 +27,7 @@ class TransactionSerializer(serializers.ModelSerializer):
         fields = [
             'id',
             'amount',
+            'currency',
             'transaction_type',
             'transaction_type_display',
             'category',
@@ -35,12 +45,19 @@ class TransactionCreateUpdateSerializer(serializers.ModelSerializer):
         model = Transaction
         fields = [
             'amount',
+            'currency',
             'transaction_type',
             'category',
             'description',
             'date',
         ]
     
+    def validate_currency(self, value):
+        """Only allow currencies that amounts can be converted from."""
+        if not is_supported(value):
+            raise serializers.ValidationError(f'No exchange rates are loaded for {value}.')
+        return value
+    
     def validate(self, attrs):
         """Validate the transaction data."""
         # You can add custom validation here if needed
@@ -57,8 +74,15 @@ class BudgetSerializer(serializers.ModelSerializer):
         source='get_period_display',
         read_only=True
     )
-    # Calculate usage percentage for current month
+    # Usage for the current period, computed in bulk through the
+    # 'budget_usage' context entry (a BudgetUsageCalculator)
+    spent_amount = serializers.SerializerMethodField()
+    remaining_amount = serializers.SerializerMethodField()
     usage_percentage = serializers.SerializerMethodField()
+    # Spending expected by the end of the period, from the cached forecast
+    # in the 'budget_forecast' context entry (see forecast.py)
+    projected_amount = serializers.SerializerMethodField()
+    projected_to_exceed = serializers.SerializerMethodField()
     
     class Meta:
         model = Budget
@@ -67,18 +91,63 @@ class BudgetSerializer(serializers.ModelSerializer):
             'category',
             'category_display',
             'amount',
+            'currency',
             'period',
             'period_display',
+            'spent_amount',
+            'remaining_amount',
             'usage_percentage',
+            'projected_amount',
+            'projected_to_exceed',
             'created_at',
             'updated_at',
         ]
-        read_only_fields = ('created_at', 'updated_at', 'usage_percentage')
+        read_only_fields = (
+            'created_at', 'updated_at', 'spent_amount', 'remaining_amount', 'usage_percentage',
+            'projected_amount', 'projected_to_exceed',
+        )
+    
+    def validate_currency(self, value):
+        """Only allow currencies that amounts can be converted into."""
+        if not is_supported(value):
+            raise serializers.ValidationError(f'No exchange rates are loaded for {value}.')
+        return value
+    
+    def _get_usage(self, obj):
+        """Get the BudgetUsage of a budget, sharing one calculator per request."""
+        calculator = self.context.get('budget_usage')
+        if calculator is None:
+            calculator = self.context['budget_usage'] = BudgetUsageCalculator(obj.user)
+        return calculator.usage(obj)
+    
+    def get_spent_amount(self, obj):
+        """Get the amount spent against the budget in the current period."""
+        return AMOUNT_FIELD.to_representation(self._get_usage(obj).spent)
+    
+    def get_remaining_amount(self, obj):
+        """Get the amount left in the budget for the current period."""
+        return AMOUNT_FIELD.to_representation(self._get_usage(obj).remaining)
     
     def get_usage_percentage(self, obj):
         """Get the current usage percentage of the budget."""
-        today = date.today()
-        return obj.get_usage_percentage(today.year, today.month)
+        return self._get_usage(obj).percentage
+    
+    def _get_projection(self, obj):
+        """Get the spending expected against a budget, sharing one forecast per request."""
+        forecast = self.context.get('budget_forecast')
+        if forecast is None:
+            request = self.context.get('request')
+            user = request.user if request is not None else obj.user
+            forecast = self.context['budget_forecast'] = get_forecast(user)
+        return projected_spend(forecast, obj, self._get_usage(obj).spent)
+    
+    def get_projected_amount(self, obj):
+        """Get the amount expected to be spent against the budget by the end of the period."""
+        return AMOUNT_FIELD.to_representation(self._get_projection(obj))
+    
+    def get_projected_to_exceed(self, obj):
+        """Get whether the budget is expected to be exceeded by the end of the period."""
+        return self._get_projection(obj) > obj.amount
 
 
 class FinancialInsightSerializer(serializers.ModelSerializer):
@@ -103,3 +172,140 @@ class FinancialInsightSerializer(serializers.ModelSerializer):
             'created_at',
         ]
         read_only_fields = ('created_at',)
+
+
+class InsightJobSerializer(serializers.ModelSerializer):
+    """Serializer for the InsightJob model."""
+    status_display = serializers.CharField(
+        source='get_status_display',
+        read_only=True
+    )
+    # Include the generated insights once the job has finished
+    result = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = InsightJob
+        fields = [
+            'id',
+            'status',
+            'status_display',
+            'result',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class StatementImportSerializer(serializers.ModelSerializer):
+    """Serializer for the StatementImport model."""
+    file_format_display = serializers.CharField(
+        source='get_file_format_display',
+        read_only=True
+    )
+    status_display = serializers.CharField(
+        source='get_status_display',
+        read_only=True
+    )
+    options = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = StatementImport
+        fields = [
+            'id',
+            'file_name',
+            'file_format',
+            'file_format_display',
+            'options',
+            'status',
+            'status_display',
+            'rows_processed',
+            'rows_imported',
+            'rows_failed',
+            'error',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class StatementUploadSerializer(serializers.Serializer):
+    """Validate a statement upload and its parsing options."""
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(
+        choices=StatementImport.FileFormat.choices,
+        required=False,
+        help_text='Detected from the file extension when omitted.'
+    )
+    mapping = serializers.JSONField(
+        binary=True,
+        required=False,
+        help_text='CSV only: {"date": "<column>", "amount": "<column>", ...}'
+    )
+    date_format = serializers.CharField(required=False, help_text='strptime format, e.g. %d/%m/%Y')
+    delimiter = serializers.CharField(required=False, min_length=1, max_length=1)
+    decimal_separator = serializers.ChoiceField(choices=['.', ','], required=False)
+    encoding = serializers.CharField(required=False)
+    
+    OPTION_FIELDS = ('mapping', 'date_format', 'delimiter', 'decimal_separator', 'encoding')
+    
+    def validate_mapping(self, value):
+        """Check that the mapping maps known fields to column names."""
+        if not isinstance(value, dict) or not all(isinstance(column, str) for column in value.values()):
+            raise serializers.ValidationError('Must be an object of field names to column names.')
+        unknown = set(value) - set(CSV_FIELDS)
+        if unknown:
+            raise serializers.ValidationError(f"Unknown fields: {', '.join(sorted(unknown))}.")
+        return value
+    
+    def validate_encoding(self, value):
+        """Check that the encoding exists."""
+        try:
+            codecs.lookup(value)
+        except LookupError:
+            raise serializers.ValidationError(f"Unknown encoding '{value}'.")
+        return value
+    
+    def validate(self, attrs):
+        """Detect the file format from the file name if needed."""
+        if 'file_format' not in attrs:
+            extension = os.path.splitext(attrs['file'].name)[1].lstrip('.').upper()
+            if extension not in StatementImport.FileFormat.values:
+                raise serializers.ValidationError({'file_format': 'Could not detect the format from the file name.'})
+            attrs['file_format'] = extension
+        return attrs
+    
+    @property
+    def options(self):
+        """Return the parsing options that were given."""
+        return {name: self.validated_data[name] for name in self.OPTION_FIELDS if name in self.validated_data}
+
+
+class ImportRowErrorSerializer(serializers.ModelSerializer):
+    """Serializer for the ImportRowError model."""
+    errors = serializers.ReadOnlyField()
+    
+    class Meta:
+        model = ImportRowError
+        fields = ['line', 'errors', 'raw']
+        read_only_fields = fields
+
+
+class DescriptionSuggestionSerializer(serializers.Serializer):
+    """Serializer for the suggestions returned by the autocomplete endpoint."""
+    description = serializers.CharField()
+    transaction_type = serializers.ChoiceField(choices=Transaction.TransactionType.choices)
+    transaction_type_display = serializers.SerializerMethodField()
+    category = serializers.ChoiceField(choices=Transaction.Category.choices)
+    category_display = serializers.SerializerMethodField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    count = serializers.IntegerField()
+    last_used = serializers.DateField()
+    
+    def get_transaction_type_display(self, obj):
+        return Transaction.TransactionType(obj['transaction_type']).label
+    
+    def get_category_display(self, obj):
+        return Transaction.Category(obj['category']).label
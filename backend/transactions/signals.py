@@ -0,0 +1,180 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import Signal, receiver
+
+from .models import Transaction, Budget
+from . import anomalies, balances, caching, rollups, suggestions, sync
+
+
+class TransactionRow(NamedTuple):
+    """Snapshot of the Transaction fields that derived data depends on."""
+    id: int
+    user_id: int
+    date: date
+    transaction_type: str
+    category: str
+    amount: Decimal
+    currency: str
+    description: str
+
+    @classmethod
+    def from_instance(cls, instance):
+        """Build a snapshot from a (possibly unsaved) Transaction instance."""
+        return cls(
+            id=instance.pk,
+            user_id=instance.user_id,
+            # Dates assigned as strings are only converted on reload
+            date=Transaction._meta.get_field('date').to_python(instance.date),
+            transaction_type=instance.transaction_type,
+            category=instance.category,
+            amount=Transaction._meta.get_field('amount').to_python(instance.amount),
+            currency=instance.currency,
+            description=instance.description or '',
+        )
+
+
+# Sent whenever Transaction rows are added, changed or removed, from inside
+# the database transaction doing the write. ``removed`` and ``added`` are
+# lists of TransactionRow snapshots; an update is reported as one of each.
+# Bulk code paths that bypass Model.save() must send it themselves.
+transaction_rows_changed = Signal()
+
+# (removed, added) lists of the collect_row_changes() block being run, if any
+_collected = ContextVar('collected_row_changes', default=None)
+
+
+@contextmanager
+def collect_row_changes():
+    """Report the rows changed inside the block with a single transaction_rows_changed.
+
+    Yields the ``(removed, added)`` lists the model signals append to, for
+    bulk code to add the rows it writes itself. Nothing is reported when the
+    block raises.
+    """
+    changes = ([], [])
+    token = _collected.set(changes)
+    try:
+        yield changes
+    finally:
+        _collected.reset(token)
+    removed, added = changes
+    if removed or added:
+        transaction_rows_changed.send(sender=Transaction, removed=removed, added=added)
+
+
+def _report(removed, added):
+    changes = _collected.get()
+    if changes is None:
+        transaction_rows_changed.send(sender=Transaction, removed=removed, added=added)
+    else:
+        changes[0].extend(removed)
+        changes[1].extend(added)
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_row(sender, instance, **kwargs):
+    """Keep the stored version of an updated transaction for post_save."""
+    if instance._state.adding or instance.pk is None:
+        return
+    previous = (
+        Transaction.objects.select_for_update()
+        .filter(pk=instance.pk)
+        .values_list(*TransactionRow._fields)
+        .first()
+    )
+    if previous is not None:
+        instance._previous_row = TransactionRow(*previous)
+
+
+@receiver(post_save, sender=Transaction)
+def transaction_saved(sender, instance, **kwargs):
+    """Report a created or updated transaction."""
+    previous = instance.__dict__.pop('_previous_row', None)
+    _report([previous] if previous else [], [TransactionRow.from_instance(instance)])
+
+
+@receiver(post_delete, sender=Transaction)
+def transaction_deleted(sender, instance, **kwargs):
+    """Report a deleted transaction."""
+    _report([TransactionRow.from_instance(instance)], [])
+
+
+@receiver(transaction_rows_changed)
+def update_rollups(sender, removed, added, **kwargs):
+    """Apply the change to the monthly rollup table."""
+    rollups.apply_changes(removed, added)
+
+
+@receiver(transaction_rows_changed)
+def update_suggestions(sender, removed, added, **kwargs):
+    """Apply the change to the description autocomplete vocabulary."""
+    suggestions.apply_changes(removed, added)
+
+
+@receiver(transaction_rows_changed)
+def bump_versions_for_transactions(sender, removed, added, **kwargs):
+    """Invalidate cached responses of the users whose transactions changed."""
+    added_users = {row.user_id for row in added}
+    caching.bump_data_versions(added_users)
+    caching.bump_data_versions({row.user_id for row in removed} - added_users, create=False)
+
+
+@receiver(transaction_rows_changed)
+def update_balances(sender, removed, added, **kwargs):
+    """Apply the change to the balance checkpoints; must run after the version bump.
+
+    The bump locks the owner's version row, so checkpoint updates of one
+    user are serialized.
+    """
+    balances.apply_changes(removed, added)
+
+
+@receiver(transaction_rows_changed)
+def update_category_stats(sender, removed, added, **kwargs):
+    """Apply the change to the category statistics, flagging unusual expenses.
+
+    Must run after the version bump, which serializes the writes of a user.
+    """
+    anomalies.apply_changes(removed, added)
+
+
+@receiver(transaction_rows_changed)
+def record_sync_changes(sender, removed, added, **kwargs):
+    """Number the changed rows for delta sync; must run after the version bump."""
+    sync.record_changes(removed, added)
+
+
+@receiver(post_save, sender=Budget)
+def budget_saved(sender, instance, **kwargs):
+    """Invalidate cached responses after a budget is created or updated."""
+    caching.bump_data_versions([instance.user_id])
+
+
+@receiver(post_delete, sender=Budget)
+def budget_deleted(sender, instance, **kwargs):
+    """Invalidate cached responses after a budget is deleted."""
+    caching.bump_data_versions([instance.user_id], create=False)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_reporting_currency(sender, instance, update_fields=None, **kwargs):
+    """Keep the stored reporting currency of an updated user for post_save."""
+    if instance.pk is None or (update_fields is not None and 'reporting_currency' not in update_fields):
+        return
+    instance._previous_currency = (
+        sender.objects.filter(pk=instance.pk).values_list('reporting_currency', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def user_saved(sender, instance, **kwargs):
+    """Invalidate cached responses after the reporting currency changed."""
+    previous = instance.__dict__.pop('_previous_currency', None)
+    if previous is not None and previous != instance.reporting_currency:
+        caching.bump_data_versions([instance.pk])
@@ -0,0 +1,208 @@
+"""
+Incremental parsers for bank statement files.
+
+Each parser reads an iterable of text lines and yields StatementRecord
+objects one at a time, so a statement is never held in memory as a whole.
+Records carry the raw strings of the statement; converting them to
+Transaction fields is done by imports.py.
+"""
+import csv
+import re
+from typing import NamedTuple, Optional
+
+
+class StatementError(Exception):
+    """Raised when a statement file cannot be parsed at all."""
+
+
+class StatementRecord(NamedTuple):
+    """One transaction as found in a statement file."""
+    line: int
+    date: Optional[str]
+    amount: Optional[str]
+    description: str = ''
+    category: Optional[str] = None
+    transaction_type: Optional[str] = None
+    raw: str = ''
+
+
+# Header names recognised (case-insensitively) when no column mapping is given
+CSV_COLUMN_ALIASES = {
+    'date': ('date', 'booking date', 'transaction date', 'posted date', 'posting date', 'value date'),
+    'amount': ('amount', 'transaction amount', 'value'),
+    'debit': ('debit', 'withdrawal', 'withdrawals', 'money out', 'paid out'),
+    'credit': ('credit', 'deposit', 'deposits', 'money in', 'paid in'),
+    'description': ('description', 'details', 'memo', 'narrative', 'payee', 'name', 'reference'),
+    'category': ('category',),
+    'transaction_type': ('type', 'transaction type', 'transaction_type'),
+}
+CSV_FIELDS = tuple(CSV_COLUMN_ALIASES)
+
+
+def resolve_csv_columns(header, mapping=None):
+    """Return ``{field: column}`` for a CSV header.
+
+    ``mapping`` maps fields to column names explicitly; fields it leaves out
+    are looked up in CSV_COLUMN_ALIASES.
+    """
+    mapping = mapping or {}
+    columns = {}
+    by_name = {name.strip().lower(): name for name in header}
+    for field in CSV_FIELDS:
+        if field in mapping:
+            if mapping[field] not in header:
+                raise StatementError(f"Column '{mapping[field]}' mapped to {field} is not in the file.")
+            columns[field] = mapping[field]
+            continue
+        for alias in CSV_COLUMN_ALIASES[field]:
+            if alias in by_name:
+                columns[field] = by_name[alias]
+                break
+
+    if 'date' not in columns:
+        raise StatementError('No date column found; pass a column mapping.')
+    if 'amount' not in columns and not ('debit' in columns or 'credit' in columns):
+        raise StatementError('No amount (or debit/credit) column found; pass a column mapping.')
+    return columns
+
+
+def parse_csv(lines, delimiter=',', mapping=None, **options):
+    """Yield the records of a CSV statement with a header row."""
+    reader = csv.reader(lines, delimiter=delimiter)
+    header = next(reader, None)
+    if not header:
+        raise StatementError('The file is empty.')
+    columns = resolve_csv_columns(header, mapping)
+    positions = {field: header.index(column) for field, column in columns.items()}
+
+    for values in reader:
+        if not any(value.strip() for value in values):
+            continue
+
+        def get(field):
+            position = positions.get(field)
+            if position is None or position >= len(values):
+                return None
+            return values[position].strip()
+
+        amount = get('amount')
+        if not amount:
+            # Separate money in/out columns: credit - debit
+            credit, debit = get('credit'), get('debit')
+            if credit:
+                amount = credit
+            elif debit:
+                amount = debit if debit.startswith('-') else f'-{debit}'
+        yield StatementRecord(
+            line=reader.line_num,
+            date=get('date'),
+            amount=amount,
+            description=get('description') or '',
+            category=get('category'),
+            transaction_type=get('transaction_type'),
+            raw=delimiter.join(values),
+        )
+
+
+OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+def _ofx_tokens(lines):
+    """Yield ``(line, closing, tag, text)`` for every tag of an OFX file.
+
+    Works for both SGML (OFX 1.x, unclosed elements) and XML (OFX 2.x)
+    files, including ones written on a single line.
+    """
+    pending = ''
+    line_number = 0
+    for line in lines:
+        line_number += 1
+        pending += line
+        # Text after the last '<' may belong to a tag continued on the next line
+        cut = pending.rfind('<')
+        if cut <= 0:
+            continue
+        for match in OFX_TAG.finditer(pending, 0, cut):
+            yield line_number, match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+        pending = pending[cut:]
+    for match in OFX_TAG.finditer(pending):
+        yield line_number, match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+
+
+def parse_ofx(lines, **options):
+    """Yield the records of the STMTTRN elements of an OFX statement."""
+    fields = None
+    for line, closing, tag, text in _ofx_tokens(lines):
+        if tag == 'STMTTRN':
+            if closing and fields is not None:
+                yield _ofx_record(line, fields)
+                fields = None
+            elif not closing:
+                fields = {}
+        elif fields is not None and not closing:
+            fields[tag] = text
+
+
+def _ofx_record(line, fields):
+    description = ' - '.join(value for value in (fields.get('NAME'), fields.get('MEMO')) if value)
+    posted = fields.get('DTPOSTED', '')
+    return StatementRecord(
+        line=line,
+        # DTPOSTED is YYYYMMDD, optionally followed by a time and time zone
+        date=posted[:8] or None,
+        amount=fields.get('TRNAMT'),
+        description=description,
+        raw=' '.join(f'<{tag}>{value}' for tag, value in fields.items()),
+    )
+
+
+def parse_qif(lines, **options):
+    """Yield the records of a QIF statement."""
+    fields = {}
+    raw = []
+    line_number = 0
+    for line_number, line in enumerate(lines, start=1):
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('!'):
+            continue
+        code, value = line[0], line[1:].strip()
+        if code == '^':
+            if fields:
+                yield _qif_record(line_number, fields, raw)
+            fields, raw = {}, []
+            continue
+        if code == 'D':
+            # Quicken pads dates with spaces: "1/ 5'24"
+            value = value.replace(' ', '0')
+        # Split lines (S/E/$) describe parts of the same transaction
+        fields.setdefault(code, value)
+        raw.append(line)
+    # Some exporters omit the final "^"
+    if fields:
+        yield _qif_record(line_number, fields, raw)
+
+
+def _qif_record(line, fields, raw):
+    return StatementRecord(
+        line=line,
+        date=fields.get('D'),
+        amount=fields.get('T') or fields.get('U'),
+        description=' - '.join(fields[key] for key in ('P', 'M') if fields.get(key)),
+        # Only the top-level category of "Food:Groceries"
+        category=fields['L'].split(':')[0] if fields.get('L') else None,
+        raw=' | '.join(raw),
+    )
+
+
+PARSERS = {
+    'CSV': parse_csv,
+    'OFX': parse_ofx,
+    'QIF': parse_qif,
+}
+
+# Date formats tried, in order, when the import options don't give one
+DATE_FORMATS = {
+    'CSV': ('%Y-%m-%d',),
+    'OFX': ('%Y%m%d',),
+    'QIF': ('%m/%d/%Y', "%m/%d'%y", '%m/%d/%y', '%Y-%m-%d'),
+}
@@ -0,0 +1,239 @@
+"""
+Description autocomplete from a per-user vocabulary of past descriptions.
+
+DescriptionSuggestion holds one row per (user, normalized description,
+transaction type, category) with a use count and the date and amount of
+the most recent use. It is kept up to date by the signal handlers in
+signals.py, so a lookup never touches the Transaction table:
+
+- descriptions starting with the typed text are found with a range scan of
+  the (user, key) unique index;
+- when that gives fewer than ``limit`` suggestions, the user's most used
+  descriptions are compared with the text by trigram similarity, which
+  tolerates typos such as "grocey" for "grocery".
+
+Suggestions are ranked by use count, decayed by the age of the last use.
+Removing a transaction lowers the count but can't restore the previous
+last use; ``rebuild()`` recomputes the vocabulary exactly.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction as db_transaction
+from django.db.models import Case, CharField, DateField, F, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import DescriptionSuggestion, Transaction
+
+KEY_FIELDS = ('user_id', 'key', 'transaction_type', 'category')
+KEY_LENGTH = DescriptionSuggestion._meta.get_field('key').max_length
+FIELDS = ('key', 'description', 'transaction_type', 'category', 'count', 'last_used', 'last_amount')
+
+MAX_LIMIT = 20
+# Vocabulary rows read per lookup
+PREFIX_CANDIDATES = 200
+FUZZY_CANDIDATES = 500
+# Typo tolerance only kicks in once the text is long enough to compare
+FUZZY_MIN_LENGTH = 3
+FUZZY_THRESHOLD = 0.5
+# A use loses half its weight every HALF_LIFE_DAYS days
+HALF_LIFE_DAYS = 90
+
+
+def normalize(text):
+    """Return the vocabulary key of a description: lowercase, single spaces."""
+    return ' '.join((text or '').lower().split())[:KEY_LENGTH]
+
+
+def _key(row):
+    return (row.user_id, normalize(row.description), row.transaction_type, row.category)
+
+
+def apply_changes(removed=(), added=()):
+    """Apply removed/added transaction snapshots to the vocabulary.
+
+    Changes to the same key are netted first, like rollups.apply_changes().
+    """
+    deltas = defaultdict(lambda: [0, None])
+    for row in removed:
+        if normalize(row.description):
+            deltas[_key(row)][0] -= 1
+    for row in added:
+        if not normalize(row.description):
+            continue
+        delta = deltas[_key(row)]
+        delta[0] += 1
+        if delta[1] is None or row.date >= delta[1][0]:
+            delta[1] = (row.date, row.amount, row.description.strip()[:KEY_LENGTH])
+
+    with db_transaction.atomic():
+        for key, (count, latest) in deltas.items():
+            if not count and latest is None:
+                continue
+            _apply_delta(dict(zip(KEY_FIELDS, key)), count, latest)
+
+
+def _apply_delta(lookup, count, latest):
+    suggestions = DescriptionSuggestion.objects.filter(**lookup)
+    updates = {'count': F('count') + count}
+    if latest is not None:
+        day, amount, description = latest
+        # Every SET expression sees the old last_used
+        is_latest = {'last_used__lte': day}
+        updates.update(
+            last_used=Greatest('last_used', Value(day, output_field=DateField())),
+            last_amount=Case(
+                When(**is_latest, then=Value(amount)),
+                default=F('last_amount'),
+                output_field=DescriptionSuggestion._meta.get_field('last_amount')
+            ),
+            description=Case(
+                When(**is_latest, then=Value(description)),
+                default=F('description'),
+                output_field=CharField()
+            ),
+        )
+    updated = suggestions.update(**updates)
+    if not updated:
+        # Removals never create rows, as for rollups
+        if count <= 0 or latest is None:
+            return
+        day, amount, description = latest
+        try:
+            with db_transaction.atomic():
+                DescriptionSuggestion.objects.create(
+                    count=count, last_used=day, last_amount=amount, description=description, **lookup
+                )
+            return
+        except IntegrityError:
+            # Created concurrently by another writer
+            suggestions.update(**updates)
+    if count < 0:
+        suggestions.filter(count__lte=0).delete()
+
+
+def rebuild(user=None, batch_size=1000):
+    """Recompute the vocabulary from the Transaction table.
+
+    Returns the number of vocabulary rows written.
+    """
+    transactions = Transaction.objects.exclude(description='')
+    suggestions = DescriptionSuggestion.objects.all()
+    if user is not None:
+        transactions = transactions.filter(user=user)
+        suggestions = suggestions.filter(user=user)
+
+    vocabulary = {}
+    rows = transactions.order_by('date', 'id').values_list(
+        'user_id', 'description', 'transaction_type', 'category', 'date', 'amount'
+    )
+    for user_id, description, transaction_type, category, day, amount in rows.iterator(chunk_size=batch_size):
+        key = normalize(description)
+        if not key:
+            continue
+        lookup = (user_id, key, transaction_type, category)
+        entry = vocabulary.get(lookup)
+        if entry is None:
+            entry = vocabulary[lookup] = DescriptionSuggestion(
+                **dict(zip(KEY_FIELDS, lookup)), count=0
+            )
+        # Rows come oldest first, so the last one seen is the latest use
+        entry.count += 1
+        entry.last_used = day
+        entry.last_amount = amount
+        entry.description = description.strip()[:KEY_LENGTH]
+
+    with db_transaction.atomic():
+        suggestions.delete()
+        DescriptionSuggestion.objects.bulk_create(vocabulary.values(), batch_size=batch_size)
+    return len(vocabulary)
+
+
+def trigrams(text):
+    """Return the set of trigrams of ``text``, padded at the start."""
+    padded = f'  {text}'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(text_trigrams, key, length):
+    """Trigram (Jaccard) similarity between typed text and the start of a key."""
+    key_trigrams = trigrams(key[:length])
+    union = len(text_trigrams | key_trigrams)
+    return len(text_trigrams & key_trigrams) / union if union else 0.0
+
+
+def _group(rows):
+    """Merge vocabulary rows into one suggestion per key."""
+    grouped = {}
+    for row in rows:
+        row = dict(zip(FIELDS, row))
+        suggestion = grouped.get(row['key'])
+        if suggestion is None:
+            grouped[row['key']] = {'best': row, 'latest': row, 'count': row['count']}
+            continue
+        suggestion['count'] += row['count']
+        if (row['count'], row['last_used']) > (suggestion['best']['count'], suggestion['best']['last_used']):
+            suggestion['best'] = row
+        if row['last_used'] > suggestion['latest']['last_used']:
+            suggestion['latest'] = row
+    return grouped
+
+
+def _score(count, last_used, today):
+    age = max((today - last_used).days, 0)
+    return count * 0.5 ** (age / HALF_LIFE_DAYS)
+
+
+def _ranked(grouped, today):
+    return sorted(
+        grouped.values(),
+        key=lambda suggestion: _score(suggestion['count'], suggestion['latest']['last_used'], today),
+        reverse=True
+    )
+
+
+def _prefix_rows(vocabulary, prefix):
+    # The range bounds use the index; startswith keeps the result exact
+    # whatever the database collation
+    return (
+        vocabulary
+        .filter(key__gte=prefix, key__lt=prefix + '\U0010ffff', key__startswith=prefix)
+        .order_by('-count', '-last_used')
+        .values_list(*FIELDS)[:PREFIX_CANDIDATES]
+    )
+
+
+def suggest(user, text, limit=5):
+    """Return up to ``limit`` past descriptions of ``user`` matching ``text``.
+
+    Each suggestion carries the category, type and last amount most often
+    used with that description.
+    """
+    prefix = normalize(text)
+    if not prefix:
+        return []
+    today = timezone.now().date()
+    vocabulary = DescriptionSuggestion.objects.filter(user=user)
+    ranked = _ranked(_group(_prefix_rows(vocabulary, prefix)), today)
+
+    if len(ranked) < limit and len(prefix) >= FUZZY_MIN_LENGTH:
+        found = {suggestion['best']['key'] for suggestion in ranked}
+        text_trigrams = trigrams(prefix)
+        close = [
+            row for row in vocabulary.order_by('-count', '-last_used').values_list(*FIELDS)[:FUZZY_CANDIDATES]
+            if row[0] not in found and similarity(text_trigrams, row[0], len(prefix)) >= FUZZY_THRESHOLD
+        ]
+        # Typo matches rank below every exact prefix match
+        ranked += _ranked(_group(close), today)
+
+    return [
+        {
+            'description': suggestion['latest']['description'],
+            'transaction_type': suggestion['best']['transaction_type'],
+            'category': suggestion['best']['category'],
+            'amount': suggestion['best']['last_amount'],
+            'count': suggestion['count'],
+            'last_used': suggestion['latest']['last_used'],
+        }
+        for suggestion in ranked[:limit]
+    ]
@@ -0,0 +1,193 @@
+"""
+Delta sync of a user's transactions.
+
+Every Transaction write bumps the owner's UserDataVersion in the same
+database transaction (see caching.py); the new version is stored on the
+written rows as ``change_seq`` and, for deletions, in a TransactionTombstone.
+The version row stays locked until the write commits, so once a reader sees
+version V every change numbered V or lower is visible too.
+
+Clients page through changes in (sequence, id) order with an opaque token:
+
+- without a token they get every live transaction (a snapshot);
+- with the token of their last response they get the rows created, updated
+  or deleted since.
+
+Tombstones are compacted after TRANSACTION_SYNC_TOMBSTONE_TTL seconds. A
+token older than the compacted tombstones can no longer tell which rows
+were deleted and is rejected with TokenExpired; the client starts over with
+a snapshot.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from collections import defaultdict
+from datetime import timedelta
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import Max, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .caching import get_data_version
+from .models import Transaction, TransactionTombstone, UserDataVersion
+
+# Rows per UPDATE ... WHERE id IN (...)
+UPDATE_BATCH_SIZE = 500
+
+
+class InvalidToken(Exception):
+    """Raised when a sync token cannot be decoded."""
+
+
+class TokenExpired(Exception):
+    """Raised when tombstones a sync token still needs have been compacted."""
+
+
+class SyncToken(NamedTuple):
+    """Position of a client in the change log.
+
+    Changes up to ``(seq, id)`` have been delivered; ``id`` None means every
+    change numbered ``seq`` or lower. ``floor`` is the version a snapshot
+    started at (0 outside snapshots): deletions at or below it concern rows
+    the client never received.
+    """
+    seq: int
+    id: Optional[int] = None
+    floor: int = 0
+
+    def encode(self):
+        raw = json.dumps([self.seq, self.id, self.floor])
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    @classmethod
+    def decode(cls, encoded):
+        try:
+            seq, pk, floor = json.loads(urlsafe_b64decode(encoded.encode()))
+            token = cls(int(seq), None if pk is None else int(pk), int(floor))
+        except (TypeError, ValueError, BinasciiError):
+            raise InvalidToken(encoded)
+        if token.seq < 0 or token.floor < 0:
+            raise InvalidToken(encoded)
+        return token
+
+
+class ChangeSet(NamedTuple):
+    """One page of changes."""
+    changed: list
+    deleted: list
+    token: SyncToken
+    has_more: bool
+
+
+def record_changes(removed=(), added=()):
+    """Number changed rows and write tombstones for deleted ones.
+
+    Runs after the owners' data versions were bumped for the same change.
+    """
+    added_ids = defaultdict(list)
+    for row in added:
+        added_ids[row.user_id].append(row.id)
+    # An update is reported as removed and added: only the latter counts
+    kept = {row.id for row in added}
+    deleted = defaultdict(list)
+    for row in removed:
+        if row.id not in kept:
+            deleted[row.user_id].append(row.id)
+
+    versions = dict(
+        UserDataVersion.objects.filter(user_id__in=added_ids.keys() | deleted.keys())
+        .values_list('user_id', 'version')
+    )
+    for user_id, ids in added_ids.items():
+        for start in range(0, len(ids), UPDATE_BATCH_SIZE):
+            Transaction.objects.filter(pk__in=ids[start:start + UPDATE_BATCH_SIZE]).update(
+                change_seq=versions[user_id]
+            )
+    TransactionTombstone.objects.bulk_create([
+        TransactionTombstone(user_id=user_id, transaction_id=pk, seq=versions[user_id])
+        for user_id, ids in deleted.items()
+        # A user being deleted has already lost their version row: their
+        # tombstones would be deleted with them anyway
+        if user_id in versions
+        for pk in ids
+    ], batch_size=UPDATE_BATCH_SIZE)
+
+
+def _after(token, seq_field, id_field):
+    """Q selecting the changes after a token's position."""
+    if token.id is None:
+        return Q(**{f'{seq_field}__gt': token.seq})
+    return Q(**{f'{seq_field}__gt': token.seq}) | Q(**{seq_field: token.seq, f'{id_field}__gt': token.id})
+
+
+def changes(user, token=None, limit=100, version=None):
+    """Return the next page of changes of ``user`` after ``token``.
+
+    Without a token the changes start from an empty replica. Raises
+    TokenExpired when the token is too old to be continued. ``version`` is
+    the user's data version if the caller already read it.
+    """
+    # Read first: changes numbered up to this version are all committed
+    if version is None:
+        version = get_data_version(user)
+    if token is None:
+        token = SyncToken(seq=0, floor=version)
+    else:
+        compacted_through = (
+            UserDataVersion.objects.filter(user=user).values_list('compacted_through', flat=True).first() or 0
+        )
+        if compacted_through > max(token.seq, token.floor):
+            raise TokenExpired()
+
+    rows = list(
+        Transaction.objects.filter(_after(token, 'change_seq', 'id'), user=user, change_seq__lte=version)
+        .order_by('change_seq', 'id')[:limit + 1]
+    )
+    tombstones = list(
+        TransactionTombstone.objects.filter(
+            _after(token, 'seq', 'transaction_id'), user=user, seq__gt=token.floor, seq__lte=version
+        )
+        .order_by('seq', 'transaction_id')
+        .values_list('seq', 'transaction_id')[:limit + 1]
+    )
+
+    # Merge both logs in (sequence, id) order
+    merged = sorted(
+        [(row.change_seq, row.pk, row) for row in rows]
+        + [(seq, pk, None) for seq, pk in tombstones],
+        key=lambda change: change[:2]
+    )
+    has_more = len(merged) > limit
+    page = merged[:limit]
+    if has_more:
+        last_seq, last_id, _ = page[-1]
+        next_token = SyncToken(last_seq, last_id, token.floor)
+    else:
+        next_token = SyncToken(version)
+    return ChangeSet(
+        changed=[row for _, _, row in page if row is not None],
+        deleted=[pk for _, pk, row in page if row is None],
+        token=next_token,
+        has_more=has_more,
+    )
+
+
+def compact(now=None):
+    """Delete tombstones older than TRANSACTION_SYNC_TOMBSTONE_TTL.
+
+    Returns the number of tombstones deleted.
+    """
+    now = now or timezone.now()
+    expired = TransactionTombstone.objects.filter(
+        deleted_at__lt=now - timedelta(seconds=settings.TRANSACTION_SYNC_TOMBSTONE_TTL)
+    )
+    with db_transaction.atomic():
+        for item in expired.values('user_id').annotate(seq=Max('seq')).order_by():
+            UserDataVersion.objects.filter(user_id=item['user_id']).update(
+                compacted_through=Greatest('compacted_through', Value(item['seq']))
+            )
+        deleted, _ = expired.delete()
+    return deleted
@@ -1,3 +1,1678 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import random
+import re
+import statistics
+import sys
+import tempfile
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import (
+    BalanceCheckpoint, BatchRequest, Budget, CategoryStats, DescriptionSuggestion, FinancialInsight, InsightJob,
+    Transaction, MonthlyRollup, StatementImport
+)
+from . import (
+    analytics, anomalies, balances, budgets, caching, currencies, dashboard, forecast, imports, insights, jobs, periods,
+    renderers, replicas, rollups, rows, search, statements, suggestions, sync, timeseries
+)
+from .pagination import Position, TransactionCursorPagination
+from .search import full_text_search
+from .serializers import BudgetSerializer, TransactionSerializer
+
+
+class QueryPlanTests(TestCase):
+    """Run EXPLAIN on the hot queries and fail on sequential scans."""
+
+    USERS = 200
+    TRANSACTIONS_PER_USER = 100
+    TABLES = (
+        'transactions_transaction', 'transactions_monthlyrollup', 'transactions_descriptionsuggestion',
+        'transactions_balancecheckpoint',
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        User.objects.bulk_create([
+            User(email=f'user{i}@example.com') for i in range(cls.USERS)
+        ])
+        users = list(User.objects.all())
+        cls.user = users[0]
+
+        rng = random.Random(42)
+        categories = [choice[0] for choice in Transaction.Category.choices]
+        start = date(2020, 1, 1)
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=user,
+                amount=Decimal(rng.randint(100, 100000)) / 100,
+                transaction_type=rng.choice(['IN', 'EX']),
+                category=rng.choice(categories),
+                description='Seeded transaction',
+                date=start + timedelta(days=rng.randint(0, 5 * 365)),
+            )
+            for user in users
+            for _ in range(cls.TRANSACTIONS_PER_USER)
+        ], batch_size=2000)
+        # bulk_create bypasses the save signals
+        rollups.rebuild()
+        suggestions.rebuild()
+        balances.rebuild()
+
+        with connection.cursor() as cursor:
+            for table in cls.TABLES:
+                cursor.execute(f'ANALYZE {table}')
+
+    def assertNoSequentialScan(self, queryset):
+        plan = queryset.explain()
+        if connection.vendor == 'postgresql':
+            pattern = r'Seq Scan on ({})\b'
+        elif connection.vendor == 'sqlite':
+            # "SEARCH" uses an index to narrow the rows, "SCAN" reads them all
+            pattern = r'\bSCAN ({})\b'
+        else:
+            self.skipTest(f'No plan checks for {connection.vendor}')
+        match = re.search(pattern.format('|'.join(self.TABLES)), plan)
+        self.assertIsNone(match, f'Sequential scan in query plan:\n{plan}')
+
+    def test_transaction_list(self):
+        self.assertNoSequentialScan(Transaction.objects.filter(user=self.user))
+
+    def test_transaction_list_keyset_page(self):
+        last = Transaction.objects.filter(user=self.user).order_by('-date', '-created_at', '-id')[50]
+        position = Position(last.date, last.created_at, last.pk)
+        queryset = Transaction.objects.filter(
+            TransactionCursorPagination._before(position),
+            user=self.user
+        ).order_by(*TransactionCursorPagination.ordering)[:11]
+        self.assertNoSequentialScan(queryset)
+
+    def test_delta_sync_changes(self):
+        token = sync.SyncToken(seq=1, id=self.user.transactions.first().pk)
+        queryset = Transaction.objects.filter(
+            sync._after(token, 'change_seq', 'id'),
+            user=self.user,
+            change_seq__lte=2
+        ).order_by('change_seq', 'id')[:101]
+        self.assertNoSequentialScan(queryset)
+
+    def test_full_text_search(self):
+        self.assertNoSequentialScan(full_text_search(
+            Transaction.objects.filter(user=self.user), '"seeded transaction" sal*', self.user
+        ))
+
+    def test_autocomplete_prefix(self):
+        vocabulary = DescriptionSuggestion.objects.filter(user=self.user)
+        self.assertNoSequentialScan(suggestions._prefix_rows(vocabulary, 'seeded'))
+
+    def test_balance_checkpoint(self):
+        checkpoints = BalanceCheckpoint.objects.filter(user=self.user, month__lt=date(2023, 6, 1))
+        self.assertNoSequentialScan(checkpoints.order_by('-month').values_list('balance')[:1])
+
+    def test_transaction_list_filtered_by_type(self):
+        self.assertNoSequentialScan(
+            Transaction.objects.filter(user=self.user, transaction_type='EX')
+        )
+
+    def test_transaction_list_filtered_by_category(self):
+        self.assertNoSequentialScan(
+            Transaction.objects.filter(user=self.user, category='FOOD')
+        )
+
+    def test_month_range(self):
+        queryset = Transaction.objects.filter(
+            user=self.user,
+            **periods.month_range(2022, 12).as_filter()
+        ).values('transaction_type').annotate(total=Sum('amount')).order_by()
+        self.assertNoSequentialScan(queryset)
+
+    def test_last_n_days_expenses_by_category(self):
+        queryset = Transaction.objects.filter(
+            user=self.user,
+            transaction_type='EX',
+            **periods.last_n_days(90, date(2023, 6, 15)).as_filter()
+        ).values('category').annotate(total=Sum('amount')).order_by()
+        self.assertNoSequentialScan(queryset)
+
+    def test_daily_series(self):
+        queryset = Transaction.objects.filter(
+            user=self.user,
+            **periods.DateRange(date(2023, 1, 1), date(2023, 4, 1)).as_filter()
+        ).annotate(bucket=TruncDay('date')).values('bucket').annotate(
+            income=Sum('amount', filter=Q(transaction_type='IN')),
+            expenses=Sum('amount', filter=Q(transaction_type='EX'))
+        ).order_by()
+        self.assertNoSequentialScan(queryset)
+
+    def test_monthly_rollup_range(self):
+        queryset = MonthlyRollup.objects.filter(
+            rollups.months_q(periods.DateRange(date(2022, 1, 1), date(2023, 1, 1))),
+            user=self.user
+        ).values('year', 'month').annotate(total=Sum('total')).order_by()
+        self.assertNoSequentialScan(queryset)
+
+
+class TransactionRowsTests(TestCase):
+    """The values-based read path must match TransactionSerializer exactly."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='rows@example.com')
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=cls.user,
+                amount=Decimal(amount),
+                transaction_type=transaction_type,
+                category=category,
+                description=description,
+                date=date(2024, 2, 29),
+            )
+            for amount, description in (('0.10', ''), ('1234567890.50', 'Caffè & croissant'), ('7', 'Rent'))
+            for transaction_type in Transaction.TransactionType.values
+            for category in Transaction.Category.values
+        ])
+
+    def test_matches_serializer(self):
+        queryset = Transaction.objects.filter(user=self.user).order_by('id')
+        expected = [list(item.items()) for item in TransactionSerializer(queryset, many=True).data]
+        actual = [list(item.items()) for item in rows.transaction_dicts(rows.values_queryset(queryset))]
+        self.assertEqual(actual, expected)
+
+
+class SearchTests(TestCase):
+    """Full-text search parses phrases and prefixes, ranks matches and follows every write."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='search@example.com')
+        other = get_user_model().objects.create(email='search-other@example.com')
+        cls.ids = {}
+        for description, category in (
+            ('Travel insurance', 'TRAVEL'),
+            ('Flight to Lisbon', 'TRAVEL'),
+            ('Travel mug', 'SHOPPING'),
+            ('New York pizza', 'FOOD'),
+            ('York street parking', 'TRANSPORT'),
+        ):
+            cls.ids[description] = Transaction.objects.create(
+                user=cls.user, amount=10, transaction_type='EX', category=category,
+                description=description, date=date(2024, 3, 1)
+            ).pk
+        Transaction.objects.create(
+            user=other, amount=10, transaction_type='EX', category='TRAVEL', description='Travel', date=date(2024, 3, 1)
+        )
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def matches(self, text, **kwargs):
+        queryset = full_text_search(Transaction.objects.filter(user=self.user), text, self.user, **kwargs)
+        return list(queryset.order_by('-search_rank', 'id').values_list('description', flat=True))
+
+    def test_parse_query(self):
+        self.assertEqual(search.parse_query('Coffee "new  york"* piz* e-mail'), [
+            search.SearchTerm(('coffee',)),
+            search.SearchTerm(('new', 'york'), True),
+            search.SearchTerm(('piz',), True),
+            search.SearchTerm(('e', 'mail')),
+        ])
+        self.assertEqual(search.parse_query('"new york" pizza', prefix_words=True), [
+            search.SearchTerm(('new', 'york')), search.SearchTerm(('pizza',), True),
+        ])
+        self.assertEqual(search.parse_query(' "" ? '), [])
+
+    def test_matching(self):
+        self.assertEqual(self.matches('"new york"'), ['New York pizza'])
+        self.assertEqual(sorted(self.matches('york')), ['New York pizza', 'York street parking'])
+        self.assertEqual(self.matches('insur*'), ['Travel insurance'])
+        self.assertEqual(self.matches('insur'), [])
+        self.assertEqual(self.matches('insur', prefix_words=True), ['Travel insurance'])
+
+    def test_ranking(self):
+        if search.search_backend() is None:
+            self.skipTest('The database has no text index')
+        # Matches in the description rank above matches in the category
+        self.assertEqual(self.matches('travel'), ['Travel insurance', 'Travel mug', 'Flight to Lisbon'])
+        data = self.client.get('/api/v1/transactions/search/', {'q': 'travel'}).json()
+        self.assertEqual(
+            [item['description'] for item in data['results']], ['Travel insurance', 'Travel mug', 'Flight to Lisbon']
+        )
+        self.assertEqual(self.client.get('/api/v1/transactions/search/', {'q': '""'}).status_code, 400)
+
+    def test_list_filter(self):
+        data = self.client.get('/api/v1/transactions/', {'search': 'trav'}).json()
+        self.assertEqual(
+            {item['id'] for item in data['results']},
+            {self.ids['Travel insurance'], self.ids['Flight to Lisbon'], self.ids['Travel mug']}
+        )
+        data = self.client.get('/api/v1/transactions/', {'search': 'trav', 'category': 'SHOPPING'}).json()
+        self.assertEqual([item['id'] for item in data['results']], [self.ids['Travel mug']])
+
+    def test_index_follows_writes(self):
+        mug = Transaction.objects.get(pk=self.ids['Travel mug'])
+        mug.description = 'Coffee mug'
+        mug.save()
+        self.assertEqual(self.matches('coffee'), ['Coffee mug'])
+        self.assertNotIn('Coffee mug', self.matches('travel'))
+        Transaction.objects.filter(pk=self.ids['Travel insurance']).update(category='HEALTH')
+        self.assertEqual(self.matches('health'), ['Travel insurance'])
+        Transaction.objects.filter(pk=mug.pk).delete()
+        self.assertEqual(self.matches('coffee'), [])
+
+    def test_triggers_restored_after_migrate(self):
+        if search.search_backend() != 'sqlite':
+            self.skipTest('Only SQLite keeps its text index with triggers')
+        def triggers():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'transaction_fts_%'"
+                )
+                return sorted(name for name, in cursor.fetchall())
+
+        names = ['transaction_fts_delete', 'transaction_fts_insert', 'transaction_fts_update']
+        self.assertEqual(triggers(), names)
+        # As a migration rebuilding the table would
+        with connection.cursor() as cursor:
+            for name in names:
+                cursor.execute(f'DROP TRIGGER {name}')
+        emit_post_migrate_signal(verbosity=0, interactive=False, db=connection.alias)
+        self.assertEqual(triggers(), names)
+        Transaction.objects.create(
+            user=self.user, amount=1, transaction_type='EX', category='FOOD', description='Bagel', date=date(2024, 3, 2)
+        )
+        self.assertEqual(self.matches('bagel'), ['Bagel'])
+
+
+class SuggestionTests(TestCase):
+    """Autocomplete finds prefixes and near misses, ranked by decayed use count."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='suggest@example.com')
+        cls.today = timezone.now().date()
+        long_ago = cls.today - timedelta(days=2 * suggestions.HALF_LIFE_DAYS)
+        for description, category, day, times in (
+            ('Grocery  store', 'FOOD', long_ago, 3),
+            ('Grocer Joe', 'FOOD', cls.today, 2),
+            ('Gym membership', 'HEALTH', cls.today, 1),
+            ('Gas station', 'TRANSPORT', cls.today, 4),
+        ):
+            for _ in range(times):
+                Transaction.objects.create(
+                    user=cls.user, amount=25, transaction_type='EX', category=category,
+                    description=description, date=day
+                )
+
+    def descriptions(self, text, limit=5):
+        return [item['description'] for item in suggestions.suggest(self.user, text, limit)]
+
+    def test_prefix(self):
+        self.assertEqual(self.descriptions('GROC'), ['Grocer Joe', 'Grocery  store'])
+        self.assertEqual(self.descriptions('g', limit=2), ['Gas station', 'Grocer Joe'])
+        self.assertEqual(self.descriptions('bakery'), [])
+
+        suggestion = suggestions.suggest(self.user, 'gym')[0]
+        self.assertEqual(
+            (suggestion['category'], suggestion['amount'], suggestion['count'], suggestion['last_used']),
+            ('HEALTH', Decimal('25.00'), 1, self.today)
+        )
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.user)
+        data = client.get('/api/v1/transactions/autocomplete/', {'q': 'gro', 'limit': 1}).json()
+        self.assertEqual([item['description'] for item in data], ['Grocer Joe'])
+
+    def test_typo(self):
+        # "grocey" is no prefix of either description, but close to both
+        self.assertEqual(self.descriptions('grocey'), ['Grocer Joe', 'Grocery  store'])
+        self.assertEqual(self.descriptions('gas sy'), ['Gas station'])
+        # Too short to compare
+        self.assertEqual(self.descriptions('gx'), [])
+
+    def test_ranking(self):
+        today = self.today
+        self.assertEqual(suggestions._score(4, today, today), 4)
+        self.assertEqual(suggestions._score(4, today - timedelta(days=suggestions.HALF_LIFE_DAYS), today), 2)
+        # Three uses two half-lives ago weigh less than two uses today
+        self.assertLess(suggestions._score(3, today - timedelta(days=180), today), suggestions._score(2, today, today))
+
+    def test_vocabulary_follows_edits_and_deletes(self):
+        gym = Transaction.objects.get(user=self.user, description='Gym membership')
+        gym.description = 'Yoga class'
+        gym.save()
+        self.assertEqual(self.descriptions('gym'), [])
+        self.assertEqual(self.descriptions('yoga'), ['Yoga class'])
+
+        Transaction.objects.filter(pk=gym.pk).delete()
+        self.assertEqual(self.descriptions('yoga'), [])
+        self.assertFalse(
+            DescriptionSuggestion.objects.filter(user=self.user, key__in=['gym membership', 'yoga class']).exists()
+        )
+
+        # Until the last use is gone, the count only drops
+        Transaction.objects.filter(user=self.user, description='Gas station').first().delete()
+        self.assertEqual(suggestions.suggest(self.user, 'gas')[0]['count'], 3)
+
+
+class PaginationTests(TestCase):
+    """Keyset pages cover every row once in both directions; page numbers stay available."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='pages@example.com')
+        for day, amount in ((3, 5), (2, 1), (2, 9), (2, 4), (2, 7), (2, 2), (2, 8), (1, 3), (1, 6)):
+            Transaction.objects.create(
+                user=cls.user, amount=amount, transaction_type='EX', category='FOOD',
+                description='Market' if amount % 2 else 'Bakery', date=date(2024, 3, day)
+            )
+        # Ties on both date and created_at leave the id to order the rows
+        tied = Transaction.objects.filter(user=cls.user, date=date(2024, 3, 2))
+        tied.update(created_at=tied.first().created_at)
+        cls.expected = list(Transaction.objects.filter(user=cls.user).order_by(
+            '-date', '-created_at', '-id'
+        ).values_list('id', flat=True))
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([item['id'] for item in data['results']])
+            url = data[link]
+        return pages
+
+    def test_keyset_pages(self):
+        forward = self.walk('/api/v1/transactions/?page_size=4', 'next')
+        self.assertEqual([len(page) for page in forward], [4, 4, 1])
+        self.assertEqual([pk for page in forward for pk in page], self.expected)
+
+        last = self.client.get('/api/v1/transactions/?page_size=4').json()['next']
+        last = self.client.get(last).json()['next']
+        backward = self.walk(last, 'previous')
+        self.assertEqual(backward, forward[::-1])
+        self.assertNotIn('count', self.client.get('/api/v1/transactions/').json())
+
+    def test_page_size_cap(self):
+        with mock.patch.object(TransactionCursorPagination, 'max_page_size', 3):
+            data = self.client.get('/api/v1/transactions/', {'page_size': 100}).json()
+        self.assertEqual([item['id'] for item in data['results']], self.expected[:3])
+        response = self.client.get('/api/v1/transactions/', {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_page_numbers(self):
+        data = self.client.get('/api/v1/transactions/', {'page': 2, 'page_size': 4}).json()
+        self.assertEqual(data['count'], 9)
+        self.assertEqual([item['id'] for item in data['results']], self.expected[4:8])
+
+        data = self.client.get('/api/v1/transactions/', {'ordering': 'amount'}).json()
+        self.assertEqual(data['count'], 9)
+        self.assertEqual([item['amount'] for item in data['results']], [f'{amount}.00' for amount in range(1, 10)])
+
+        data = self.client.get('/api/v1/transactions/search/', {'q': 'market'}).json()
+        self.assertEqual(data['count'], 5)
+
+
+class SyncTests(TestCase):
+    """Sync tokens page through every change once: new and updated rows, then tombstones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='sync@example.com')
+        other = get_user_model().objects.create(email='sync-other@example.com')
+        cls.ids = [
+            Transaction.objects.create(
+                user=cls.user, amount=10 + day, transaction_type='EX', category='FOOD', date=date(2024, 3, day)
+            ).pk
+            for day in range(1, 6)
+        ]
+        Transaction.objects.create(user=other, amount=1, transaction_type='EX', category='FOOD', date=date(2024, 3, 1))
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def sync(self, since=None, page_size=100):
+        params = {'page_size': page_size}
+        if since:
+            params['since'] = since
+        return self.client.get('/api/v1/transactions/changes/', params)
+
+    def sync_all(self, since=None, page_size=2):
+        changed, deleted, pages = [], [], 0
+        while True:
+            data = self.sync(since, page_size).json()
+            changed += [item['id'] for item in data['changed']]
+            deleted += data['deleted']
+            since = data['token']
+            pages += 1
+            if not data['has_more']:
+                return changed, deleted, since, pages
+
+    def test_paging(self):
+        changed, deleted, token, pages = self.sync_all()
+        self.assertEqual(sorted(changed), self.ids)
+        self.assertEqual((deleted, pages), ([], 3))
+        self.assertEqual(self.sync_all(token), ([], [], token, 1))
+
+    def test_updates_and_deletes(self):
+        token = self.sync_all()[2]
+        edited, dropped = self.ids[1], self.ids[3]
+        self.client.patch(f'/api/v1/transactions/{edited}/', {'amount': '99.00'}, format='json')
+        self.client.delete(f'/api/v1/transactions/{dropped}/')
+        data = self.sync(token).json()
+        self.assertEqual([(item['id'], item['amount']) for item in data['changed']], [(edited, '99.00')])
+        self.assertEqual(data['deleted'], [dropped])
+        self.assertFalse(data['has_more'])
+
+        # A row created and deleted between two syncs only leaves a tombstone
+        created = Transaction.objects.create(
+            user=self.user, amount=5, transaction_type='EX', category='FOOD', date=date(2024, 3, 9)
+        ).pk
+        Transaction.objects.filter(pk=created).delete()
+        self.assertEqual(self.sync_all(data['token'])[:2], ([], [created]))
+        # A snapshot never lists deleted rows
+        changed, deleted, *_ = self.sync_all()
+        self.assertEqual((len(changed), deleted), (4, []))
+
+    def test_invalid_and_expired_tokens(self):
+        response = self.sync('not-a-token')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('since', response.json())
+
+        token = self.sync().json()['token']
+        Transaction.objects.get(pk=self.ids[0]).delete()
+        self.assertEqual(sync.compact(), 0)
+        self.assertEqual(self.sync(token).json()['deleted'], [self.ids[0]])
+
+        later = timezone.now() + timedelta(seconds=settings.TRANSACTION_SYNC_TOMBSTONE_TTL + 1)
+        self.assertEqual(sync.compact(now=later), 1)
+        self.assertEqual(self.sync(token).status_code, 410)
+        with self.assertRaises(sync.TokenExpired):
+            sync.changes(self.user, sync.SyncToken.decode(token))
+        # Starting over works
+        response = self.sync()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['changed']), 4)
+
+
+class MonthlyRollupTests(TestCase):
+    """Rollups maintained on writes must match a fresh aggregation of the transactions."""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create(email='rollups@example.com')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_writes_keep_rollups_consistent(self):
+        today = date.today()
+        last_month = periods.months_back(today, 1)
+        ids = []
+        for amount, transaction_type, category, day in (
+            ('2500.00', 'IN', 'SALARY', today),
+            ('80.25', 'EX', 'FOOD', today),
+            ('40.10', 'EX', 'FOOD', today),
+            ('900.00', 'EX', 'HOUSING', today),
+            ('15.00', 'EX', 'ENTERTAIN', last_month),
+        ):
+            response = self.client.post('/api/v1/transactions/', {
+                'amount': amount, 'transaction_type': transaction_type, 'category': category, 'date': day
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.content)
+            ids.append(self.user.transactions.latest('id').pk)
+        self.assertEqual(rollups.check_consistency(self.user), [])
+
+        edits = (
+            {'amount': '95.00'},
+            # Into another month, then another type
+            {'date': last_month.isoformat()},
+            {'transaction_type': 'IN', 'category': 'GIFT'},
+        )
+        for pk, changes in zip(ids[1:], edits):
+            response = self.client.patch(f'/api/v1/transactions/{pk}/', changes, format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(rollups.check_consistency(self.user), [])
+        response = self.client.delete(f'/api/v1/transactions/{ids[-1]}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(rollups.check_consistency(self.user), [])
+
+        summary = self.client.get('/api/v1/transactions/summary/').json()
+        current = self.user.transactions.filter(date__year=today.year, date__month=today.month)
+        totals = current.aggregate(
+            income=Sum('amount', filter=Q(transaction_type='IN')),
+            expenses=Sum('amount', filter=Q(transaction_type='EX'))
+        )
+        self.assertEqual(Decimal(str(summary['total_income'])), totals['income'])
+        self.assertEqual(Decimal(str(summary['total_expenses'])), totals['expenses'])
+        self.assertEqual(
+            {item['category']: Decimal(str(item['total'])) for item in summary['category_expenses']},
+            dict(current.filter(transaction_type='EX').values_list('category').annotate(total=Sum('amount')))
+        )
+        everything = self.user.transactions.aggregate(
+            income=Sum('amount', filter=Q(transaction_type='IN')),
+            expenses=Sum('amount', filter=Q(transaction_type='EX'))
+        )
+        self.assertEqual(Decimal(str(summary['balance'])), everything['income'] - everything['expenses'])
+
+
+class TimeSeriesTests(TestCase):
+    """Series have one zero-filled bucket per period; both query paths agree."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='series@example.com')
+        for amount, transaction_type, category, day in (
+            (999, 'EX', 'FOOD', date(2024, 2, 29)),
+            (1000, 'IN', 'SALARY', date(2024, 3, 1)),
+            (200, 'EX', 'HOUSING', date(2024, 3, 4)),
+            (50, 'EX', 'FOOD', date(2024, 3, 5)),
+            (30, 'EX', 'FOOD', date(2024, 5, 15)),
+            (80, 'IN', 'GIFT', date(2024, 12, 24)),
+        ):
+            Transaction.objects.create(
+                user=cls.user, amount=amount, transaction_type=transaction_type, category=category, date=day
+            )
+
+    def totals(self, start, end, granularity):
+        return [
+            (item['period'], item['income'], item['expenses'], item['savings'])
+            for item in timeseries.income_expense_series(self.user, start, end, granularity)
+        ]
+
+    def test_days(self):
+        self.assertEqual(self.totals(date(2024, 3, 1), date(2024, 3, 5), 'day'), [
+            (date(2024, 3, 1), 1000, 0, 1000),
+            (date(2024, 3, 2), 0, 0, 0),
+            (date(2024, 3, 3), 0, 0, 0),
+            (date(2024, 3, 4), 0, 200, -200),
+            (date(2024, 3, 5), 0, 50, -50),
+        ])
+
+    def test_weeks(self):
+        # Weeks start on Monday; the first one reaches back into February
+        self.assertEqual(self.totals(date(2024, 3, 1), date(2024, 3, 12), 'week'), [
+            (date(2024, 2, 26), 1000, 999, 1),
+            (date(2024, 3, 4), 0, 250, -250),
+            (date(2024, 3, 11), 0, 0, 0),
+        ])
+
+    def test_months(self):
+        # Whole months, whatever the days of start and end
+        self.assertEqual(self.totals(date(2024, 2, 10), date(2024, 5, 1), 'month'), [
+            (date(2024, 2, 1), 0, 999, -999),
+            (date(2024, 3, 1), 1000, 250, 750),
+            (date(2024, 4, 1), 0, 0, 0),
+            (date(2024, 5, 1), 0, 30, -30),
+        ])
+        self.assertEqual(self.totals(date(2024, 1, 1), date(2024, 1, 31), 'month'), [(date(2024, 1, 1), 0, 0, 0)])
+
+    def test_rollups_match_transactions(self):
+        first, stop = date(2024, 1, 1), date(2025, 1, 1)
+        days = timeseries._totals_from_transactions(self.user, first, stop, 'day')
+        for granularity in ('month', 'quarter', 'year'):
+            expected = {}
+            for day, (income, expenses) in days.items():
+                key = timeseries.bucket_start(day, granularity)
+                bucket_income, bucket_expenses = expected.get(key, (0, 0))
+                expected[key] = (bucket_income + income, bucket_expenses + expenses)
+            self.assertEqual(timeseries._totals_from_rollups(self.user, first, stop, granularity), expected)
+        self.assertEqual(self.totals(first, date(2024, 12, 31), 'year'), [(date(2024, 1, 1), 1080, 1279, -199)])
+
+    def test_monthly_summary(self):
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.user)
+        response = client.get('/api/v1/transactions/monthly_summary/', {'start': '2024-03-01', 'end': '2024-04-30'})
+        # Savings are income minus expenses
+        self.assertEqual(json.loads(response.content), [
+            {'period': '2024-03-01', 'year': 2024, 'month': 3, 'income': 1000.0, 'expenses': 250.0, 'savings': 750.0},
+            {'period': '2024-04-01', 'year': 2024, 'month': 4, 'income': 0, 'expenses': 0, 'savings': 0},
+        ])
+        response = client.get('/api/v1/transactions/monthly_summary/', {'granularity': 'hour'})
+        self.assertEqual(response.status_code, 400)
+
+
+class DashboardTests(TestCase):
+    """The dashboard must return the same payloads as the separate endpoints."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='dashboard@example.com')
+        rng = random.Random(7)
+        categories = Transaction.Category.values
+        today = date.today()
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=cls.user,
+                amount=Decimal(rng.randint(100, 100000)) / 100,
+                transaction_type=rng.choice(['IN', 'EX']),
+                category=rng.choice(categories),
+                date=today - timedelta(days=rng.randint(0, 800)),
+            )
+            for _ in range(300)
+        ])
+        rollups.rebuild()
+        balances.rebuild()
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def get(self, path, **params):
+        response = self.client.get(f'/api/v1/{path}', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_matches_endpoints(self):
+        for time_range in dashboard.TIME_RANGES:
+            with self.subTest(time_range=time_range):
+                data = self.get('dashboard/', monthly_time_range=time_range, category_time_range=time_range)
+                self.assertEqual(data['summary'], self.get('transactions/summary/'))
+                self.assertEqual(data['categories'], self.get('transactions/categories/'))
+                self.assertEqual(
+                    data['monthly_summary'], self.get('transactions/monthly_summary/', time_range=time_range)
+                )
+                self.assertEqual(
+                    data['category_summary'], self.get('transactions/category_summary/', time_range=time_range)
+                )
+                self.assertEqual(data['transactions'], self.get('transactions/changes/'))
+
+    def test_fixed_query_count(self):
+        def count_queries(**params):
+            # A new version each time, so the response cache is missed
+            caching.bump_data_versions([self.user.pk])
+            with CaptureQueriesContext(connection) as queries:
+                self.get('dashboard/', **params)
+            return len(queries)
+
+        expected = count_queries(monthly_time_range='all', category_time_range='1year')
+        for time_range in dashboard.TIME_RANGES:
+            self.assertEqual(count_queries(monthly_time_range=time_range, category_time_range='3months'), expected)
+
+
+class BatchTests(TestCase):
+    """Batches apply all their operations or none, once per idempotency key."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create(email='batch@example.com')
+        cls.other = User.objects.create(email='not-mine@example.com')
+        cls.kept, cls.edited, cls.dropped = [
+            Transaction.objects.create(
+                user=cls.user, amount=amount, transaction_type='EX', category='FOOD',
+                description=description, date=date(2024, 3, 5)
+            )
+            for amount, description in ((10, 'Bakery'), (20, 'Grocer'), (30, 'Cafe'))
+        ]
+        cls.foreign = Transaction.objects.create(
+            user=cls.other, amount=5, transaction_type='EX', category='FOOD', date=date(2024, 3, 5)
+        )
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def batch(self, operations, key=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/v1/transactions/batch/', {'operations': operations}, format='json', **headers)
+
+    def create(self, amount='12.00', **data):
+        return {'op': 'create', 'data': {
+            'amount': amount, 'transaction_type': 'EX', 'category': 'FOOD', 'date': '2024-04-02', **data
+        }}
+
+    def test_all_or_nothing(self):
+        response = self.batch([
+            self.create(),
+            self.create(amount='lots'),
+            {'op': 'update', 'data': {'amount': '1.00'}},
+            {'op': 'move', 'id': self.kept.pk},
+            {'op': 'delete', 'id': self.dropped.pk},
+        ])
+        self.assertEqual(response.status_code, 400)
+        errors = response.json()['errors']
+        self.assertEqual([error['index'] for error in errors], [1, 2, 3])
+        self.assertIn('amount', errors[0]['errors'])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+
+        # Ownership is checked when applying: the valid create is rolled back
+        response = self.batch([self.create(), {'op': 'delete', 'id': self.foreign.pk}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'], [{'index': 1, 'errors': {'id': ['Not found.']}}])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+        self.assertTrue(Transaction.objects.filter(pk=self.foreign.pk).exists())
+
+    def test_operation_limit(self):
+        with override_settings(TRANSACTION_BATCH_MAX_OPERATIONS=2):
+            response = self.batch([self.create(), self.create(), self.create()])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('operations', response.json())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+
+    def test_idempotency_key(self):
+        operations = [self.create(), {'op': 'delete', 'id': self.dropped.pk}]
+        first = self.batch(operations, key='retry-1')
+        self.assertEqual(first.status_code, 200)
+        replay = self.batch(operations, key='retry-1')
+        self.assertEqual(replay.status_code, 200)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(BatchRequest.objects.filter(user=self.user).count(), 1)
+
+        response = self.batch([self.create(amount='99.00')], key='retry-1')
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Transaction.objects.filter(user=self.user, amount=99).exists())
+
+    def test_derived_data(self):
+        since = self.client.get('/api/v1/transactions/changes/').json()['token']
+        response = self.batch([
+            self.create(description='Bakery'),
+            self.create(amount='2500.00', transaction_type='IN', category='SALARY', description='Payroll'),
+            {'op': 'update', 'id': self.edited.pk, 'data': {'amount': '25.00', 'date': '2024-05-01'}},
+            {'op': 'update', 'id': self.kept.pk, 'data': {'transaction_type': 'IN', 'category': 'GIFT'}},
+            {'op': 'delete', 'id': self.dropped.pk},
+        ])
+        self.assertEqual(response.status_code, 200, response.content)
+        results = response.json()['results']
+        self.assertEqual([result['status'] for result in results], [201, 201, 200, 200, 204])
+
+        self.assertEqual(rollups.check_consistency(self.user), [])
+        self.assertEqual(balances.check_consistency(self.user), [])
+
+        def vocabulary():
+            return set(DescriptionSuggestion.objects.filter(user=self.user).values_list(
+                'key', 'description', 'transaction_type', 'category', 'count', 'last_used'
+            ))
+        maintained = vocabulary()
+        suggestions.rebuild(self.user)
+        self.assertEqual(maintained, vocabulary())
+        self.assertNotIn('cafe', {key for key, *_ in maintained})
+
+        changes = self.client.get('/api/v1/transactions/changes/', {'since': since}).json()
+        self.assertEqual(
+            {item['id'] for item in changes['changed']},
+            {results[0]['id'], results[1]['id'], self.edited.pk, self.kept.pk}
+        )
+        self.assertEqual(changes['deleted'], [self.dropped.pk])
+
+
+class ExportTests(TestCase):
+    """Every export and compact format decodes back into the list endpoint's rows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='export@example.com')
+        for day, description, transaction_type, category in (
+            (1, 'Rent, "March"', 'EX', 'HOUSING'),
+            (2, 'Multi\nline café', 'EX', 'FOOD'),
+            (3, '', 'IN', 'SALARY'),
+        ):
+            Transaction.objects.create(
+                user=cls.user, amount=Decimal(f'{day}00.25'), transaction_type=transaction_type,
+                category=category, description=description, date=date(2024, 3, day)
+            )
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        self.rows = self.client.get('/api/v1/transactions/', {'page_size': 100}).json()['results']
+        self.assertEqual(len(self.rows), 3)
+
+    def export(self, export_format):
+        response = self.client.get('/api/v1/transactions/export/', {'format': export_format})
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def by_id(self, rows):
+        return sorted(rows, key=lambda row: row['id'])
+
+    def decode_columnar(self, block, dictionaries):
+        columns = dict(block['columns'])
+        for field, table in dictionaries.items():
+            indexes = columns[field]
+            columns[field] = [table['values'][index] for index in indexes]
+            columns[field + renderers.DISPLAY_SUFFIX] = [table['labels'][index] for index in indexes]
+        return [{field: columns[field][index] for field in rows.COLUMNS} for index in range(block['length'])]
+
+    def test_csv(self):
+        exported = list(csv.DictReader(io.StringIO(self.export('csv').decode())))
+        # CSV has no types: compare the text of every cell
+        expected = [{field: str(row[field]) for field in rows.COLUMNS} for row in self.rows]
+        self.assertEqual(self.by_id(exported), self.by_id(expected))
+
+    def test_ndjson(self):
+        exported = [json.loads(line) for line in self.export('ndjson').decode().splitlines()]
+        self.assertEqual(self.by_id(exported), self.by_id(self.rows))
+
+    def test_columnar(self):
+        document = json.loads(self.export('columnar'))
+        exported = [
+            row for block in document['chunks'] for row in self.decode_columnar(block, document['dictionaries'])
+        ]
+        self.assertEqual(self.by_id(exported), self.by_id(self.rows))
+
+        page = self.client.get('/api/v1/transactions/', {'page_size': 100, 'format': 'columnar'}).json()
+        block = page['results']
+        self.assertEqual(self.decode_columnar(block, block['dictionaries']), self.rows)
+
+    @skipUnless(renderers.msgpack is not None, 'msgpack is not installed')
+    def test_msgpack(self):
+        response = self.client.get('/api/v1/transactions/', {'page_size': 100}, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(renderers.msgpack.unpackb(response.content)['results'], self.rows)
+        exported = list(renderers.msgpack.Unpacker(io.BytesIO(self.export('msgpack'))))
+        self.assertEqual(self.by_id(exported), self.by_id(self.rows))
+
+    def test_msgpack_is_optional(self):
+        # A fresh copy of the module, imported as if msgpack were missing
+        spec = importlib.util.spec_from_file_location('transactions.renderers_without_msgpack', renderers.__file__)
+        module = importlib.util.module_from_spec(spec)
+        with mock.patch.dict(sys.modules, {'msgpack': None}):
+            spec.loader.exec_module(module)
+        self.assertEqual([renderer.format for renderer in module.COMPACT_RENDERERS], ['columnar'])
+        self.assertEqual(
+            [renderer.format for renderer in renderers.COMPACT_RENDERERS],
+            ['columnar', 'msgpack'] if renderers.msgpack is not None else ['columnar']
+        )
+
+
+class ETagTests(TestCase):
+    """Safe requests answer 304 while the ETag matches, until the user writes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='etags@example.com')
+
+    def setUp(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_not_modified_until_write(self):
+        response = self.client.get('/api/v1/transactions/summary/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get('/api/v1/transactions/summary/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.post('/api/v1/transactions/', {
+            'amount': '12.00', 'transaction_type': 'EX', 'category': 'FOOD', 'date': date.today()
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.client.get('/api/v1/transactions/summary/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['total_expenses'], 12.0)
+
+
+class ResponseCacheTests(TestCase):
+    """Summaries are served from the cache until a write bumps the data version."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='cache@example.com', is_staff=True)
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def summary(self):
+        response = self.client.get('/api/v1/transactions/summary/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cached_until_write(self):
+        first = self.summary()
+        # A hit only reads the data version
+        with self.assertNumQueries(1):
+            self.assertEqual(self.summary(), first)
+
+        Transaction.objects.create(user=self.user, amount=30, transaction_type='EX', category='FOOD', date=date.today())
+        self.assertEqual(self.summary()['total_expenses'], first['total_expenses'] + 30)
+
+        stats = self.client.get('/api/v1/cache-stats/').json()['summary']
+        self.assertEqual(stats, {'hits': 1, 'misses': 2, 'hit_rate': round(1 / 3, 4)})
+
+
+class BalanceCheckpointTests(TestCase):
+    """Checkpoints maintained on writes must match balances computed from scratch."""
+
+    def test_backdated_writes(self):
+        user = get_user_model().objects.create(email='balances@example.com')
+        rng = random.Random(3)
+        start = date(2023, 1, 1)
+
+        def random_day():
+            return start + timedelta(days=rng.randint(0, 700))
+
+        for _ in range(150):
+            ids = list(user.transactions.values_list('id', flat=True))
+            choice = rng.random()
+            if choice < 0.5 or not ids:
+                Transaction.objects.create(
+                    user=user,
+                    amount=Decimal(rng.randint(1, 100000)) / 100,
+                    transaction_type=rng.choice(['IN', 'EX']),
+                    category='OTHER_EXP',
+                    date=random_day(),
+                )
+            elif choice < 0.8:
+                transaction = Transaction.objects.get(pk=rng.choice(ids))
+                transaction.date = random_day()
+                transaction.transaction_type = rng.choice(['IN', 'EX'])
+                transaction.save()
+            else:
+                Transaction.objects.get(pk=rng.choice(ids)).delete()
+
+        self.assertEqual(balances.check_consistency(user), [])
+
+        def expected_balance(day):
+            totals = user.transactions.filter(date__lte=day).aggregate(
+                income=Sum('amount', filter=Q(transaction_type='IN')),
+                expenses=Sum('amount', filter=Q(transaction_type='EX'))
+            )
+            return (Decimal(totals['income'] or 0) - (totals['expenses'] or 0)).quantize(Decimal('0.01'))
+
+        for day in (start - timedelta(days=1), date(2023, 7, 14), date(2024, 2, 29), date(2030, 1, 1)):
+            self.assertEqual(balances.balance_as_of(user, day).quantize(Decimal('0.01')), expected_balance(day))
+        for item in balances.balance_series(user, date(2023, 3, 5), date(2024, 11, 20), 'week'):
+            self.assertEqual(
+                item['balance'].quantize(Decimal('0.01')), expected_balance(item['period'] + timedelta(days=6))
+            )
+
+
+class CategoryStatsTests(TestCase):
+    """Statistics maintained on writes must match the transactions; outliers are flagged."""
+
+    def test_running_statistics(self):
+        user = get_user_model().objects.create(email='stats@example.com')
+        rng = random.Random(5)
+        for _ in range(150):
+            ids = list(user.transactions.values_list('id', flat=True))
+            choice = rng.random()
+            if choice < 0.6 or not ids:
+                Transaction.objects.create(
+                    user=user,
+                    amount=Decimal(rng.randint(1, 100000)) / 100,
+                    transaction_type='EX',
+                    category=rng.choice(['FOOD', 'TRAVEL']),
+                    date=date(2023, 1, 1) + timedelta(days=rng.randint(0, 700)),
+                )
+            elif choice < 0.8:
+                transaction = Transaction.objects.get(pk=rng.choice(ids))
+                transaction.amount = Decimal(rng.randint(1, 100000)) / 100
+                transaction.category = rng.choice(['FOOD', 'TRAVEL'])
+                transaction.save()
+            else:
+                Transaction.objects.get(pk=rng.choice(ids)).delete()
+
+        for stats in CategoryStats.objects.filter(user=user):
+            amounts = [float(amount) for amount in user.transactions.filter(
+                category=stats.category
+            ).values_list('amount', flat=True)]
+            self.assertEqual(stats.count, len(amounts))
+            self.assertAlmostEqual(stats.mean, statistics.mean(amounts), places=6)
+            self.assertAlmostEqual(stats.variance, statistics.variance(amounts), delta=1e-6 * stats.variance)
+
+    def test_flags_outliers(self):
+        user = get_user_model().objects.create(email='anomaly@example.com')
+        today = date.today()
+        for day in range(anomalies.ANOMALY_MIN_COUNT):
+            Transaction.objects.create(
+                user=user, amount=Decimal('20') + day, transaction_type='EX', category='FOOD',
+                date=today - timedelta(days=day)
+            )
+        anomalies_of_user = FinancialInsight.objects.filter(user=user, insight_type='ANOMALY')
+
+        Transaction.objects.create(user=user, amount=Decimal('26'), transaction_type='EX', category='FOOD', date=today)
+        self.assertFalse(anomalies_of_user.exists())
+
+        outlier = Transaction.objects.create(
+            user=user, amount=Decimal('400'), transaction_type='EX', category='FOOD', date=today
+        )
+        insight = anomalies_of_user.get()
+        self.assertEqual(insight.data['transaction_id'], outlier.pk)
+        self.assertEqual(insight.data['category'], 'FOOD')
+
+        # Edits that don't change the amount or category are not scored again
+        stats = CategoryStats.objects.get(user=user, category='FOOD')
+        for description in ('Dinner party', 'Dinner party for 12'):
+            outlier.description = description
+            outlier.date = today - timedelta(days=1)
+            outlier.save()
+        self.assertEqual(anomalies_of_user.count(), 1)
+        edited = CategoryStats.objects.get(user=user, category='FOOD')
+        self.assertEqual(
+            (edited.count, edited.mean, edited.recent_mean), (stats.count, stats.mean, stats.recent_mean)
+        )
+
+        # A new amount is
+        outlier.amount = Decimal('450')
+        outlier.save()
+        self.assertEqual(anomalies_of_user.count(), 2)
+
+
+class ForecastTests(TestCase):
+    """Forecasts separate salary, lump payments and daily spending, and are cached until a write."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='forecast@example.com')
+        cls.today = date(2024, 5, 10)
+        day = date(2024, 1, 1)
+        while day <= cls.today:
+            if day.day == 1:
+                Transaction.objects.create(user=cls.user, amount=3000, transaction_type='IN', category='SALARY', date=day)
+            if day.day == 3:
+                Transaction.objects.create(user=cls.user, amount=1200, transaction_type='EX', category='HOUSING', date=day)
+            Transaction.objects.create(user=cls.user, amount=10, transaction_type='EX', category='FOOD', date=day)
+            day += timedelta(days=1)
+
+    def test_projection(self):
+        fitted = forecast.fit(self.user, self.today)
+        self.assertEqual(fitted.category('SALARY', 'IN').remaining, 0)
+        self.assertEqual(fitted.category('HOUSING').remaining, 0)
+        # Four whole months averaging 10 a day, 21 days left in May
+        self.assertEqual(fitted.category('FOOD').monthly, Decimal('302.50'))
+        self.assertEqual(fitted.category('FOOD').remaining, (Decimal('302.50') * 21 / 31).quantize(Decimal('0.01')))
+
+        projection = forecast.project(fitted, months_ahead=2)
+        expected = fitted.balance - fitted.category('FOOD').remaining
+        self.assertEqual(projection['end_of_month']['balance'], expected)
+        self.assertEqual(projection['months'][0]['recurring_income'], 3000)
+        self.assertEqual(projection['months'][1]['balance'], expected + 2 * (3000 - 1200 - Decimal('302.50')))
+
+    def test_cached_until_write(self):
+        fitted = forecast.get_forecast(self.user, today=self.today)
+        with self.assertNumQueries(1):
+            self.assertEqual(forecast.get_forecast(self.user, today=self.today), fitted)
+        Transaction.objects.create(user=self.user, amount=50, transaction_type='EX', category='FOOD', date=self.today)
+        self.assertEqual(
+            forecast.get_forecast(self.user, today=self.today).category('FOOD').month_to_date,
+            fitted.category('FOOD').month_to_date + 50
+        )
+
+
+class BudgetTests(TestCase):
+    """Budget usage comes from one rollup query and projections add the forecast's remaining spending."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='budgets@example.com')
+        cls.today = date(2024, 5, 10)
+        day = date(2024, 1, 1)
+        while day <= cls.today:
+            if day.day == 3:
+                Transaction.objects.create(
+                    user=cls.user, amount=1200, transaction_type='EX', category='HOUSING', date=day
+                )
+            Transaction.objects.create(user=cls.user, amount=10, transaction_type='EX', category='FOOD', date=day)
+            day += timedelta(days=1)
+        monthly, yearly = Budget.Period.MONTHLY, Budget.Period.YEARLY
+        cls.food = Budget.objects.create(user=cls.user, category='FOOD', amount=400, period=monthly)
+        cls.food_yearly = Budget.objects.create(user=cls.user, category='FOOD', amount=3000, period=yearly)
+        cls.housing = Budget.objects.create(user=cls.user, category='HOUSING', amount=1000, period=monthly)
+        cls.travel = Budget.objects.create(user=cls.user, category='TRAVEL', amount=100, period=monthly)
+
+    def test_usage_percentage(self):
+        self.assertEqual(budgets.usage_percentage(Decimal('45'), Decimal('60')), 75)
+        self.assertEqual(budgets.usage_percentage(Decimal('-20'), Decimal('60')), 33)
+        self.assertEqual(budgets.usage_percentage(Decimal('90'), Decimal('60')), 100)
+        self.assertEqual(budgets.usage_percentage(Decimal('0'), Decimal('60')), 0)
+        self.assertEqual(budgets.usage_percentage(Decimal('10'), Decimal('0')), 0)
+
+    def test_usage_and_projection(self):
+        context = {
+            'budget_usage': budgets.BudgetUsageCalculator(self.user, self.today.year, self.today.month),
+            'budget_forecast': forecast.fit(self.user, self.today),
+        }
+        data = {row['category'] + row['period']: row for row in BudgetSerializer(
+            [self.food, self.food_yearly, self.housing, self.travel], many=True, context=context
+        ).data}
+        # 21 of May's 31 days are left at 302.50 a month, and 7 more months for the yearly budget
+        food_remaining = (Decimal('302.50') * 21 / 31).quantize(Decimal('0.01'))
+        expected = {
+            'FOODMONTHLY': (100, 300, 25, 100 + food_remaining, False),
+            'FOODYEARLY': (1310, 1690, 43, 1310 + food_remaining + 7 * Decimal('302.50'), True),
+            'HOUSINGMONTHLY': (1200, 0, 100, 1200, True),
+            'TRAVELMONTHLY': (0, 100, 0, 0, False),
+        }
+        for key, (spent, remaining, percentage, projected, exceed) in expected.items():
+            with self.subTest(key):
+                row = data[key]
+                self.assertEqual(Decimal(str(row['spent_amount'])), spent)
+                self.assertEqual(Decimal(str(row['remaining_amount'])), remaining)
+                self.assertEqual(row['usage_percentage'], percentage)
+                self.assertEqual(Decimal(str(row['projected_amount'])), projected)
+                self.assertEqual(row['projected_to_exceed'], exceed)
+
+    def test_calculator_single_query(self):
+        calculator = budgets.BudgetUsageCalculator(self.user, self.today.year, self.today.month)
+        with self.assertNumQueries(1):
+            for budget in (self.food, self.food_yearly, self.housing, self.travel):
+                calculator.usage(budget)
+
+    def test_fixed_query_count(self):
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(self.user)
+
+        def list_budgets():
+            # A new version each time, so the cached forecast is missed
+            caching.bump_data_versions([self.user.pk])
+            response = client.get('/api/v1/budgets/')
+            self.assertEqual(response.status_code, 200)
+            return response.json()['results']
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(list_budgets()), 4)
+        for category in ('HEALTH', 'ENTERTAIN', 'EDUCATION', 'SHOPPING', 'UTILITIES'):
+            Budget.objects.create(user=self.user, category=category, amount=50)
+        with self.assertNumQueries(len(queries)):
+            self.assertEqual(len(list_budgets()), 9)
+
+
+class InsightTests(TestCase):
+    """Every insight builder reads the one shared aggregation of the user's transactions."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='insights@example.com')
+        cls.today = date(2024, 5, 20)
+
+        def add(amount, transaction_type, category, day):
+            Transaction.objects.create(
+                user=cls.user, amount=amount, transaction_type=transaction_type, category=category, date=day
+            )
+
+        add(5000, 'IN', 'SALARY', date(2024, 5, 10))
+        add(1500, 'EX', 'HOUSING', date(2024, 5, 12))
+        add(100, 'EX', 'TRAVEL', date(2024, 5, 13))
+        for day in range(11, 17):
+            add(50, 'EX', 'FOOD', date(2024, 5, day))
+        # Only in the current year, outside the 3 month window
+        add(200, 'EX', 'ENTERTAIN', date(2024, 1, 15))
+        monthly, yearly = Budget.Period.MONTHLY, Budget.Period.YEARLY
+        Budget.objects.create(user=cls.user, category='HOUSING', amount=1500, period=monthly)
+        Budget.objects.create(user=cls.user, category='FOOD', amount=350, period=monthly)
+        Budget.objects.create(user=cls.user, category='TRAVEL', amount=1000, period=monthly)
+        Budget.objects.create(user=cls.user, category='ENTERTAIN', amount=220, period=yearly)
+
+    def test_single_aggregation(self):
+        # One grouped query, after the rollup count that picks the engine
+        engine_check = 1 if analytics.available() else 0
+        with self.assertNumQueries(1 + engine_check):
+            stats = insights.collect_stats(self.user, self.today)
+        self.assertEqual(stats.by_category('last_month', 'EX'), {
+            'HOUSING': (1500, 1), 'TRAVEL': (100, 1), 'FOOD': (300, 6),
+        })
+        self.assertEqual(stats.total('current_year', 'EX'), 2100)
+        self.assertEqual(stats.count('last_3_months'), 9)
+        self.assertEqual(stats.count('current_year', 'IN'), 1)
+        # The builders add a single budget query
+        with self.assertNumQueries(2 + engine_check):
+            insights.generate_insights(self.user, self.today)
+
+    def test_insights(self):
+        generated = defaultdict(list)
+        for insight in insights.generate_insights(self.user, self.today):
+            generated[insight.insight_type].append(insight)
+        Type = FinancialInsight.InsightType
+        self.assertEqual(set(generated), {
+            Type.SPENDING_PATTERN, Type.BUDGET_ALERT, Type.SAVINGS_OPPORTUNITY, Type.GENERAL_ADVICE
+        })
+
+        [pattern] = generated[Type.SPENDING_PATTERN]
+        self.assertEqual(pattern.title, '78% of your spending is on Housing')
+        self.assertEqual(pattern.data, {
+            'category': 'HOUSING', 'category_display': 'Housing', 'amount': 1500.0, 'percentage': 78,
+            'time_period': '3 months',
+        })
+
+        alerts = {alert.data['category']: alert for alert in generated[Type.BUDGET_ALERT]}
+        self.assertEqual(set(alerts), {'HOUSING', 'FOOD', 'ENTERTAIN'})
+        self.assertEqual(alerts['HOUSING'].title, 'Budget exceeded for Housing')
+        self.assertEqual(alerts['HOUSING'].data['usage_percentage'], 100)
+        self.assertEqual(alerts['FOOD'].title, 'Budget almost reached for Food')
+        self.assertEqual(alerts['FOOD'].data['usage_percentage'], 85)
+        self.assertEqual(alerts['ENTERTAIN'].data, {
+            'category': 'ENTERTAIN', 'category_display': 'Entertainment',
+            'budget_amount': 220.0, 'usage_percentage': 90, 'period': 'YEARLY',
+        })
+
+        # Food is the only category with 5 or more transactions last month
+        [savings] = generated[Type.SAVINGS_OPPORTUNITY]
+        self.assertEqual(savings.data, {
+            'category': 'FOOD', 'category_display': 'Food', 'transaction_count': 6, 'total_amount': 300.0,
+            'time_period': '1 month',
+        })
+
+        # The January expense is outside the 3 month window
+        [advice] = generated[Type.GENERAL_ADVICE]
+        self.assertEqual(advice.title, 'Excellent savings rate')
+        self.assertEqual(advice.data, {
+            'income': 5000.0, 'expenses': 1900.0, 'savings': 3100.0, 'savings_rate': 62.0, 'time_period': '3 months',
+        })
+
+    def test_no_transactions(self):
+        user = get_user_model().objects.create(email='no-insights@example.com')
+        self.assertEqual(insights.generate_insights(user, self.today), [])
+
+
+class InsightJobTests(TestCase):
+    """Jobs are queued once per user, claimed by one worker and survive a killed worker."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = [User.objects.create(email=f'jobs{index}@example.com') for index in range(3)]
+        Transaction.objects.create(
+            user=cls.users[0], amount=40, transaction_type='EX', category='FOOD', date=date.today()
+        )
+
+    def test_one_pending_job_per_user(self):
+        job, created = jobs.enqueue_insight_job(self.users[0])
+        self.assertTrue(created)
+        self.assertEqual(jobs.enqueue_insight_job(self.users[0]), (job, False))
+        # A concurrent request that missed the pending job hits the constraint
+        with mock.patch.object(QuerySet, 'first', return_value=None):
+            self.assertEqual(jobs.enqueue_insight_job(self.users[0]), (job, False))
+        self.assertEqual(InsightJob.objects.filter(user=self.users[0]).count(), 1)
+
+    def test_claim_jobs(self):
+        queued = [jobs.enqueue_insight_job(user)[0] for user in self.users]
+        first = jobs.claim_jobs(2)
+        self.assertEqual([job.pk for job in first], [job.pk for job in queued[:2]])
+        self.assertEqual({job.status for job in first}, {InsightJob.Status.RUNNING})
+        self.assertEqual(len({job.worker for job in first}), 1)
+        second = jobs.claim_jobs(2)
+        self.assertEqual([job.pk for job in second], [queued[2].pk])
+        self.assertNotEqual(second[0].worker, first[0].worker)
+        self.assertEqual(jobs.claim_jobs(2), [])
+
+    def test_process_batch(self):
+        succeeding, _ = jobs.enqueue_insight_job(self.users[0])
+        self.assertEqual(jobs.process_batch(10, concurrency=1), 1)
+        succeeding.refresh_from_db()
+        self.assertEqual(succeeding.status, InsightJob.Status.SUCCEEDED)
+        expected = [insight.insight_type for insight in insights.generate_insights(self.users[0])]
+        self.assertTrue(expected)
+        self.assertEqual([item['insight_type'] for item in succeeding.result], expected)
+        self.assertIsNotNone(succeeding.finished_at)
+
+        failing, _ = jobs.enqueue_insight_job(self.users[1])
+        with mock.patch.object(jobs, 'generate_insights', side_effect=ValueError('no data')):
+            self.assertEqual(jobs.process_batch(10, concurrency=1), 1)
+        failing.refresh_from_db()
+        self.assertEqual(failing.status, InsightJob.Status.FAILED)
+        self.assertEqual(failing.error, 'ValueError: no data')
+        self.assertEqual(jobs.process_batch(10, concurrency=1), 0)
+
+    def test_requeue_stale_jobs(self):
+        stale, _ = jobs.enqueue_insight_job(self.users[0])
+        replaced, _ = jobs.enqueue_insight_job(self.users[1])
+        jobs.claim_jobs(2)
+        InsightJob.objects.update(started_at=timezone.now() - timedelta(hours=1))
+        # users[1] queued another job meanwhile
+        newer, _ = jobs.enqueue_insight_job(self.users[1])
+
+        self.assertEqual(jobs.requeue_stale_jobs(timedelta(minutes=10)), 1)
+        statuses = dict(InsightJob.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[stale.pk], InsightJob.Status.PENDING)
+        self.assertEqual(statuses[replaced.pk], InsightJob.Status.FAILED)
+        self.assertEqual(statuses[newer.pk], InsightJob.Status.PENDING)
+
+
+class StatementImportTests(TestCase):
+    """Uploads are queued and imported by a worker, chunk by chunk, skipping invalid rows."""
+
+    STATEMENT = (
+        'Date,Description,Debit,Credit,Category\n'
+        '2024-03-01,Payroll,,2500.00,Salary\n'
+        '2024-03-02,Grocer,45.10,,Food\n'
+        '2024-03-03,Broken,abc,,\n'
+        '2024-03-04,Rent,"1,200.00",,Housing\n'
+        '03/05/2024,Cafe,4.50,,\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='imports@example.com')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def upload(self, content=STATEMENT, name='statement.csv'):
+        response = self.client.post(
+            '/api/v1/imports/', {'file': SimpleUploadedFile(name, content.encode())}, format='multipart'
+        )
+        self.assertEqual(response.status_code, 202, response.content)
+        return StatementImport.objects.get(pk=response.json()['id'])
+
+    def test_parsers(self):
+        records = list(statements.parse_csv(io.StringIO(self.STATEMENT)))
+        self.assertEqual(
+            [(record.line, record.date, record.amount, record.category) for record in records[:2]],
+            [(2, '2024-03-01', '2500.00', 'Salary'), (3, '2024-03-02', '-45.10', 'Food')]
+        )
+        ofx = (
+            'OFXHEADER:100\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>'
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000[0:GMT]<TRNAMT>-12.50<NAME>Cafe<MEMO>Lunch'
+            '</STMTTRN>\n<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240306<TRNAMT>100.00<NAME>Refund</STMTTRN>'
+            '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+        )
+        self.assertEqual(
+            [(record.date, record.amount, record.description) for record in statements.parse_ofx(io.StringIO(ofx))],
+            [('20240305', '-12.50', 'Cafe - Lunch'), ('20240306', '100.00', 'Refund')]
+        )
+        qif = '!Type:Bank\nD3/ 5\'24\nT-1,234.00\nPLandlord\nLHousing:Rent\n^\nD03/06/2024\nU20.00\nMGift\n'
+        records = list(statements.parse_qif(io.StringIO(qif)))
+        self.assertEqual(
+            [(record.date, record.amount, record.description, record.category) for record in records],
+            [("3/05'24", '-1,234.00', 'Landlord', 'Housing'), ('03/06/2024', '20.00', 'Gift', None)]
+        )
+        data, errors = imports.clean_record(records[0], 'QIF', {})
+        self.assertEqual(errors, {})
+        self.assertEqual(
+            (data['date'], data['amount'], data['transaction_type'], data['category']),
+            (date(2024, 3, 5), Decimal('1234.00'), 'EX', 'HOUSING')
+        )
+        with self.assertRaises(statements.StatementError):
+            list(statements.parse_csv(io.StringIO('Day,Total\n2024-03-01,1\n')))
+
+    def test_upload_is_queued(self):
+        statement_import = self.upload()
+        self.assertEqual(statement_import.status, StatementImport.Status.PENDING)
+        self.assertTrue(statement_import.file)
+        self.assertFalse(Transaction.objects.filter(user=self.user).exists())
+
+        progress = []
+        import_chunk = imports._import_chunk
+
+        def record_progress(statement_import, records):
+            import_chunk(statement_import, records)
+            progress.append(
+                (statement_import.rows_processed, statement_import.rows_imported, statement_import.rows_failed)
+            )
+
+        with mock.patch.object(imports, 'CHUNK_SIZE', 2), mock.patch.object(imports, '_import_chunk', record_progress):
+            self.assertEqual(imports.process_imports(5), 1)
+        self.assertEqual(progress, [(2, 2, 0), (4, 3, 1), (5, 3, 2)])
+
+        statement_import.refresh_from_db()
+        self.assertEqual(statement_import.status, StatementImport.Status.SUCCEEDED)
+        self.assertFalse(statement_import.file)
+        self.assertEqual(
+            set(Transaction.objects.filter(user=self.user).values_list('amount', 'transaction_type', 'category')),
+            {(Decimal('2500.00'), 'IN', 'SALARY'), (Decimal('45.10'), 'EX', 'FOOD'),
+             (Decimal('1200.00'), 'EX', 'HOUSING')}
+        )
+        self.assertEqual(rollups.check_consistency(self.user), [])
+
+        errors = self.client.get(f'/api/v1/imports/{statement_import.pk}/errors/').json()['results']
+        self.assertEqual([(error['line'], list(error['errors'])) for error in errors], [(4, ['amount']), (6, ['date'])])
+
+    def test_stale_imports(self):
+        statement_import = self.upload()
+        import_chunk = imports._import_chunk
+
+        def killed_after_one_chunk(statement_import, records):
+            if statement_import.rows_processed:
+                raise KeyboardInterrupt
+            import_chunk(statement_import, records)
+
+        with mock.patch.object(imports, 'CHUNK_SIZE', 2), \
+                mock.patch.object(imports, '_import_chunk', killed_after_one_chunk):
+            with self.assertRaises(KeyboardInterrupt):
+                imports.process_imports(5)
+        # Run outside the queue, so it can't be resumed
+        unqueued = imports.create_import(self.user, 'local.csv', 'CSV')
+        StatementImport.objects.filter(pk=unqueued.pk).update(status=StatementImport.Status.RUNNING)
+
+        self.assertEqual(imports.requeue_stale_imports(timedelta(minutes=5)), 0)
+        StatementImport.objects.update(updated_at=timezone.now() - timedelta(minutes=10))
+        self.assertEqual(imports.requeue_stale_imports(timedelta(minutes=5)), 1)
+        unqueued.refresh_from_db()
+        self.assertEqual(unqueued.status, StatementImport.Status.FAILED)
+
+        statement_import.refresh_from_db()
+        self.assertEqual(
+            (statement_import.status, statement_import.worker, statement_import.rows_processed),
+            (StatementImport.Status.PENDING, '', 2)
+        )
+        self.assertEqual(imports.process_imports(5), 1)
+        statement_import.refresh_from_db()
+        self.assertEqual(
+            (statement_import.status, statement_import.rows_processed, statement_import.rows_imported),
+            (StatementImport.Status.SUCCEEDED, 5, 3)
+        )
+        # The rows of the first chunk were not imported twice
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 3)
+        self.assertEqual(statement_import.row_errors.count(), 2)
+
+    def test_insert_transactions(self):
+        self.assertEqual(imports._copy_value('a\\b\tc\r\nd'), 'a\\\\b\\tc\\r\\nd')
+        self.assertEqual(imports._copy_value(None), '\\N')
+        # COPY on PostgreSQL, bulk_create elsewhere
+        transactions = [
+            Transaction(
+                user=self.user, amount=Decimal('10.50'), transaction_type='EX', category='FOOD',
+                description=description, date=date(2024, 3, day)
+            )
+            for day, description in ((1, 'Tab\tand\\backslash'), (2, 'Line\nbreak'))
+        ]
+        imports.insert_transactions(transactions)
+        self.assertEqual(
+            list(Transaction.objects.filter(user=self.user).order_by('date').values_list('pk', 'description')),
+            [(transaction.pk, transaction.description) for transaction in transactions]
+        )
+        created = Transaction.objects.create(
+            user=self.user, amount=1, transaction_type='EX', category='FOOD', date=date(2024, 3, 3)
+        )
+        self.assertGreater(created.pk, transactions[-1].pk)
+class CurrencyTests(TestCase):
+    """Foreign amounts are converted at their month's rate in every total."""
+
+    RATES = (
+        'date,currency,rate\n'
+        '2024-03-01,EUR,0.80\n'
+        '2024-03-15,EUR,1.00\n'
+        '2024-04-01,EUR,0.50\n'
+        '2024-04-01,USD,1\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create(email='currency@example.com')
+        cls.other = User.objects.create(email='dollars@example.com')
+        for day, amount in ((date(2024, 2, 10), 18), (date(2024, 3, 10), 90), (date(2024, 5, 10), 10)):
+            Transaction.objects.create(
+                user=cls.user, amount=amount, currency='EUR', transaction_type='EX', category='FOOD', date=day
+            )
+        Transaction.objects.create(
+            user=cls.user, amount=500, transaction_type='IN', category='SALARY', date=date(2024, 3, 1)
+        )
+        Transaction.objects.create(
+            user=cls.other, amount=500, transaction_type='IN', category='SALARY', date=date(2024, 3, 1)
+        )
+
+    def setUp(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as rate_file:
+            rate_file.write(self.RATES)
+        versions = {user: caching.get_data_version(user) for user in (self.user, self.other)}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(currencies.load_rates(rate_file.name), (2, ['EUR'], 1))
+        self.assertGreater(caching.get_data_version(self.user), versions[self.user])
+        self.assertEqual(caching.get_data_version(self.other), versions[self.other])
+
+    def tearDown(self):
+        # Rates roll back with the test; check the table again
+        currencies.forget_rates()
+
+    def test_conversion(self):
+        # February has no rate yet: March's (0.9) applies; May uses April's
+        self.assertEqual(currencies.convert(Decimal('18'), 'EUR', 'USD', 2024, 2), Decimal('20.00'))
+        self.assertEqual(currencies.convert(Decimal('10'), 'EUR', 'USD', 2024, 5), Decimal('20.00'))
+        series = timeseries.income_expense_series(self.user, date(2024, 2, 1), date(2024, 5, 31))
+        self.assertEqual([Decimal(item['expenses']) for item in series], [20, 100, 0, 20])
+        self.assertEqual(
+            rollups.expense_totals_by_category(self.user, periods.DateRange(date(2024, 1, 15))),
+            [{'category': 'FOOD', 'total': 140}]
+        )
+        # Balances are valued at the rates of the month they are reported for
+        self.assertEqual(balances.balance_as_of(self.user, date(2024, 3, 31)), Decimal('500') - 120)
+        self.assertEqual(balances.balance_as_of(self.user, date(2024, 5, 31)), Decimal('500') - 236)
+
+    def test_reporting_currency(self):
+        self.user.reporting_currency = 'EUR'
+        self.user.save()
+        series = timeseries.income_expense_series(self.user, date(2024, 3, 1), date(2024, 3, 31))
+        self.assertEqual(Decimal(series[0]['income']), 450)
+        self.assertEqual(Decimal(series[0]['expenses']), 90)
+
+    def test_rates_loaded_elsewhere(self):
+        self.assertEqual(currencies.supported_currencies(), ['EUR', 'USD'])
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as rate_file:
+            rate_file.write('date,currency,rate\n2024-04-01,GBP,0.75\n2024-04-01,EUR,0.60\n')
+        # As if loaded by another process: this one is never told
+        with mock.patch.object(currencies, 'forget_rates'):
+            with self.captureOnCommitCallbacks(execute=True):
+                currencies.load_rates(rate_file.name)
+        with override_settings(EXCHANGE_RATES_CHECK_INTERVAL=0):
+            self.assertTrue(currencies.is_supported('GBP'))
+            self.assertEqual(currencies.rate('EUR', 2024, 5), Decimal('0.6'))
+
+
+class ReplicaTests(TestCase):
+    """Reads go to a healthy replica unless the user just wrote, and fall back to the primary."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create(email='replica@example.com')
+        cls.other = User.objects.create(email='primary@example.com')
+
+    def setUp(self):
+        caching.get_cache().clear()
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def test_read_your_writes(self):
+        router = replicas.ReplicaRouter()
+        # The test database stands in for a replica
+        with override_settings(DATABASE_REPLICAS=['default']):
+            self.assertEqual(replicas.choose_database(self.user), 'default')
+            with replicas.request_scope():
+                replicas.read_from('default')
+                self.assertEqual(router.db_for_read(Transaction), 'default')
+            self.assertIsNone(router.db_for_read(Transaction))
+
+            response = self.client.post('/api/v1/transactions/', {
+                'amount': '12.50', 'transaction_type': 'EX', 'category': 'FOOD', 'date': '2024-03-01'
+            }, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertIsNone(replicas.choose_database(self.user))
+            self.assertEqual(replicas.choose_database(self.other), 'default')
+
+    def test_pins_shared_without_a_shared_cache(self):
+        # Two workers, each with a cache of its own
+        workers = {
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+            for alias in ('writer', 'reader')
+        }
+        with override_settings(CACHES=workers, DATABASE_REPLICAS=['default']):
+            with override_settings(RESPONSE_CACHE_ALIAS='writer'):
+                response = self.client.post('/api/v1/transactions/', {
+                    'amount': '12.50', 'transaction_type': 'EX', 'category': 'FOOD', 'date': '2024-03-01'
+                }, format='json')
+                self.assertEqual(response.status_code, 201)
+            with override_settings(RESPONSE_CACHE_ALIAS='reader'):
+                self.assertIsNone(replicas.choose_database(self.user))
+                self.assertEqual(replicas.choose_database(self.other), 'default')
+                with override_settings(REPLICA_PIN_SECONDS=0):
+                    self.assertEqual(replicas.choose_database(self.user), 'default')
+
+    def test_fallback(self):
+        with override_settings(DATABASE_REPLICAS=['missing']):
+            self.assertEqual(replicas.healthy_replicas(), [])
+            self.assertIsNone(replicas.choose_database(self.user))
+            response = self.client.get('/api/v1/transactions/summary/')
+            self.assertEqual(response.status_code, 200)
+
+
+@skipUnless(analytics.available(), 'NumPy is not installed')
+class AnalyticsTests(TestCase):
+    """The NumPy engine must agree with the database aggregations."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(email='analytics@example.com')
+        rng = random.Random(11)
+        today = date.today()
+        Transaction.objects.bulk_create([
+            Transaction(
+                user=cls.user,
+                amount=Decimal(rng.randint(1, 100000)) / 100,
+                transaction_type=rng.choice(['IN', 'EX']),
+                category=rng.choice(Transaction.Category.values),
+                date=today - timedelta(days=rng.randint(0, 500)),
+            )
+            for _ in range(400)
+        ])
+        rollups.rebuild()
+        cls.history = analytics.load_history(cls.user)
+
+    def test_insight_stats(self):
+        expected = insights.collect_stats(self.user)
+        with override_settings(ANALYTICS_MIN_TRANSACTIONS=1):
+            actual = insights.collect_stats(self.user)
+        self.assertEqual(actual._cells, {
+            key: (total.quantize(Decimal('0.01')), count) for key, (total, count) in expected._cells.items() if count
+        })
+
+    def test_period_totals(self):
+        start, end = date.today() - timedelta(days=400), date.today()
+        for granularity in ('week', 'month', 'quarter'):
+            first, stop = timeseries.bucket_bounds(start, end, granularity)
+            totals = analytics.period_totals(self.history, granularity, periods.DateRange(first, stop))
+            series = timeseries.fill_series(totals, first, stop, granularity)
+            expected = timeseries.income_expense_series(self.user, start, end, granularity)
+            for item, expected_item in zip(series, expected, strict=True):
+                self.assertEqual(item['period'], expected_item['period'])
+                self.assertEqual(item['income'], Decimal(expected_item['income']).quantize(Decimal('0.01')))
+
+    def test_rolling_totals(self):
+        date_range = periods.last_n_days(60)
+        for item in analytics.rolling_totals(self.history, 7, date_range)[::10]:
+            total = self.user.transactions.filter(
+                transaction_type='EX', date__gt=item['date'] - timedelta(days=7), date__lte=item['date']
+            ).aggregate(total=Sum('amount'))['total'] or 0
+            self.assertEqual(item['total'], Decimal(total).quantize(Decimal('0.01')))
@@ -0,0 +1,157 @@
+"""
+Income/expense series bucketed by day, week, month, quarter or year.
+
+Every series is built with a single GROUP BY query: month, quarter and year
+buckets are folded from the monthly rollups, day and week buckets are
+truncated from the Transaction table. Amounts are converted into the user's
+reporting currency inside the query. Buckets without any transactions are
+filled with zeros.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.db.models.functions import TruncDay, TruncWeek
+
+from .models import MonthlyRollup, Transaction
+from . import currencies, periods, rollups
+
+DAY = 'day'
+WEEK = 'week'
+MONTH = 'month'
+QUARTER = 'quarter'
+YEAR = 'year'
+GRANULARITIES = (DAY, WEEK, MONTH, QUARTER, YEAR)
+
+# Upper bound on the number of buckets a single series may contain
+MAX_BUCKETS = 5000
+
+_TRUNC_FUNCTIONS = {
+    DAY: TruncDay,
+    WEEK: TruncWeek,
+}
+
+
+def bucket_start(day, granularity):
+    """Return the first day of the bucket containing ``day``."""
+    if granularity == DAY:
+        return day
+    if granularity == WEEK:
+        # Weeks start on Monday, like TruncWeek
+        return day - timedelta(days=day.weekday())
+    if granularity == MONTH:
+        return day.replace(day=1)
+    if granularity == QUARTER:
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if granularity == YEAR:
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def next_bucket(start, granularity):
+    """Return the first day of the bucket following the one starting at ``start``."""
+    if granularity == DAY:
+        return start + timedelta(days=1)
+    if granularity == WEEK:
+        return start + timedelta(days=7)
+    if granularity == MONTH:
+        return periods.next_month(start)
+    if granularity == QUARTER:
+        return periods.next_month(periods.next_month(periods.next_month(start)))
+    if granularity == YEAR:
+        return start.replace(year=start.year + 1)
+    raise ValueError(f"Unsupported granularity: {granularity}")
+
+
+def bucket_bounds(start, end, granularity):
+    """Return the first day of the first bucket and the day after the last one."""
+    return bucket_start(start, granularity), next_bucket(bucket_start(end, granularity), granularity)
+
+
+def bucket_count(start, end, granularity):
+    """Return how many buckets are needed to cover ``start``..``end`` inclusive."""
+    first, last = bucket_start(start, granularity), bucket_start(end, granularity)
+    if granularity == DAY:
+        return (last - first).days + 1
+    if granularity == WEEK:
+        return (last - first).days // 7 + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    return months // {MONTH: 1, QUARTER: 3, YEAR: 12}[granularity] + 1
+
+
+def fold_months(months, granularity):
+    """Fold ``(year, month, income, expenses)`` tuples into buckets."""
+    totals = {}
+    for year, month, income, expenses in months:
+        key = bucket_start(date(year, month, 1), granularity)
+        bucket_income, bucket_expenses = totals.get(key, (Decimal('0'), Decimal('0')))
+        totals[key] = (bucket_income + (income or 0), bucket_expenses + (expenses or 0))
+    return totals
+
+
+def _totals_from_rollups(user, first, stop, granularity):
+    """Fold monthly rollups into buckets; one query grouped by month."""
+    total = currencies.converted('total', user.reporting_currency)
+    months = MonthlyRollup.objects.filter(
+        rollups.months_q(periods.DateRange(first, stop)),
+        user=user
+    ).values_list('year', 'month').annotate(
+        income=Sum(total, filter=Q(transaction_type=Transaction.TransactionType.INCOME)),
+        expenses=Sum(total, filter=Q(transaction_type=Transaction.TransactionType.EXPENSE))
+    ).order_by()
+    return fold_months(months, granularity)
+
+
+def _totals_from_transactions(user, first, stop, granularity):
+    """Group raw transactions by truncated date; one query."""
+    amount = currencies.converted('amount', user.reporting_currency)
+    buckets = rollups.with_month(Transaction.objects.filter(
+        user=user,
+        **periods.DateRange(first, stop).as_filter()
+    )).annotate(
+        bucket=_TRUNC_FUNCTIONS[granularity]('date')
+    ).values('bucket').annotate(
+        income=Sum(amount, filter=Q(transaction_type=Transaction.TransactionType.INCOME)),
+        expenses=Sum(amount, filter=Q(transaction_type=Transaction.TransactionType.EXPENSE))
+    ).order_by()
+    return {
+        item['bucket']: (item['income'] or 0, item['expenses'] or 0)
+        for item in buckets
+    }
+
+
+def income_expense_series(user, start, end, granularity=MONTH):
+    """Return income, expenses and savings per bucket covering ``start``..``end``.
+
+    Each bucket aggregates its whole period, so the first and last buckets may
+    include transactions outside ``start``..``end``. The result is a list of
+    dicts ordered by period, with zeros for buckets without transactions.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unsupported granularity: {granularity}")
+
+    first, stop = bucket_bounds(start, end, granularity)
+
+    if granularity in _TRUNC_FUNCTIONS:
+        totals = _totals_from_transactions(user, first, stop, granularity)
+    else:
+        totals = _totals_from_rollups(user, first, stop, granularity)
+    return fill_series(totals, first, stop, granularity)
+
+
+def fill_series(totals, first, stop, granularity):
+    """Turn ``{bucket start: (income, expenses)}`` into a zero-filled series."""
+    series = []
+    period = first
+    while period < stop:
+        income, expenses = totals.get(period, (0, 0))
+        series.append({
+            'period': period,
+            'year': period.year,
+            'month': period.month,
+            'income': income,
+            'expenses': abs(expenses),
+            'savings': income - abs(expenses)
+        })
+        period = next_bucket(period, granularity)
+    return series
@@ -8,12 +8,15 @@ router = DefaultRouter()
 router.register(r'transactions', views.TransactionViewSet, basename='transaction')
 router.register(r'budgets', views.BudgetViewSet, basename='budget')
 router.register(r'insights', views.FinancialInsightViewSet, basename='insight')
+router.register(r'imports', views.StatementImportViewSet, basename='statement-import')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('summary/', views.TransactionViewSet.as_view({'get': 'summary'}), name='transaction-summary'),
     path('monthly-summary/', views.TransactionViewSet.as_view({'get': 'monthly_summary'}), name='monthly-summary'),
+    path('dashboard/', views.TransactionViewSet.as_view({'get': 'dashboard'}), name='dashboard'),
     path('categories/', views.CategoryAPIView.as_view(), name='categories'),
+    path('cache-stats/', views.CacheStatsAPIView.as_view(), name='cache-stats'),
     # Anche disponibile come metodo nella viewset
     path('transactions/categories/', views.TransactionViewSet.as_view({'get': 'categories'}), name='transaction-categories'),
 ]
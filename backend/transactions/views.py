@@ -1,37 +1,70 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
 from django.db.models import Sum, Q, Count, Avg, F, ExpressionWrapper, FloatField
 from django.utils import timezone
-from datetime import timedelta, date
-from collections import defaultdict
-import random
+from datetime import date
+from decimal import Decimal
 
-from .models import Transaction, Budget, FinancialInsight
+from .models import Transaction, MonthlyRollup, Budget, FinancialInsight, InsightJob, StatementImport
+from . import analytics, balances, currencies, forecast, imports, periods, rollups, rows, suggestions, sync, timeseries
+from .batch import BatchInvalid, IdempotencyConflict, run_batch
+from .budgets import BudgetUsageCalculator
+from .dashboard import CATEGORY_DAYS, TIME_RANGES, build_dashboard, categories_by_type
+from .export import export_response
+from .caching import cache_stats, cached_response, request_data_version
+from .mixins import ETagMixin, ReplicaReadMixin
+from .renderers import COMPACT_RENDERERS, LIST_RENDERERS, CSVRenderer, NDJSONRenderer
+from .search import FullTextSearchFilter, full_text_search, parse_query
+from .pagination import (
+    TransactionCursorPagination, TransactionPageNumberPagination, uses_page_numbers
+)
+from .jobs import enqueue_insight_job
 from .serializers import (
     TransactionSerializer, TransactionCreateUpdateSerializer,
-    BudgetSerializer, FinancialInsightSerializer
+    BudgetSerializer, FinancialInsightSerializer, InsightJobSerializer,
+    StatementImportSerializer, StatementUploadSerializer, ImportRowErrorSerializer,
+    DescriptionSuggestionSerializer
 )
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ReplicaReadMixin, ETagMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows transactions to be viewed or edited.
     """
     permission_classes = [IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    etag_actions = (
+        'list', 'retrieve', 'changes', 'export', 'search', 'autocomplete',
+        'summary', 'monthly_summary', 'category_summary', 'categories', 'dashboard',
+        'balance', 'balance_series', 'analytics', 'forecast'
+    )
+    renderer_classes = LIST_RENDERERS
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['transaction_type', 'category', 'date']
     ordering_fields = ['date', 'amount', 'created_at']
-    search_fields = ['description', 'category']
-    ordering = ['-date', '-created_at']
+    ordering = ['-date', '-created_at', '-id']
 
     def get_queryset(self):
         """Return only the transactions for the current user."""
         return Transaction.objects.filter(user=self.request.user)
 
+    @property
+    def paginator(self):
+        """Use keyset pagination unless the client asks for page numbers."""
+        if not hasattr(self, '_paginator'):
+            # Search results are ordered by rank, which the keyset can't follow
+            if self.action == 'search' or uses_page_numbers(self.request):
+                self._paginator = TransactionPageNumberPagination()
+            else:
+                self._paginator = TransactionCursorPagination()
+        return self._paginator
+
     def get_serializer_class(self):
         """Return appropriate serializer class."""
         if self.action in ['create', 'update', 'partial_update']:
@@ -39,164 +72,304 @@ class TransactionViewSet(viewsets.ModelViewSet):
         return TransactionSerializer
 
     def perform_create(self, serializer):
-        """Set the user to the current user when creating a transaction."""
+        """Set the user to the current user when creating a transaction.
+
+        Without a currency, the transaction is in the user's reporting currency.
+        """
+        serializer.validated_data.setdefault('currency', self.request.user.reporting_currency)
         serializer.save(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        """List transactions, serialized from values rows (see rows.py)."""
+        queryset = rows.values_queryset(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.transaction_dicts(page))
+        return Response(rows.transaction_dicts(queryset))
+
+    def retrieve(self, request, *args, **kwargs):
+        """Return one transaction, serialized from a values row (see rows.py)."""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            rows.values_queryset(self.filter_queryset(self.get_queryset())),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        )
+        self.check_object_permissions(request, row)
+        return Response(rows.transaction_dicts([row])[0])
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Search transaction descriptions and categories, best matches first.
+
+        ``q`` takes words, ``"quoted phrases"`` and ``prefix*`` terms, all of
+        which must match. The list filters (type, category, date) apply too.
+        """
+        text = request.query_params.get('q', '')
+        if not parse_query(text):
+            raise ValidationError({'q': 'Enter at least one search term.'})
+        queryset = full_text_search(self.filter_queryset(self.get_queryset()), text, request.user)
+        queryset = queryset.order_by('-search_rank', '-date', '-created_at', '-id')
+        page = self.paginate_queryset(rows.values_queryset(queryset))
+        return self.get_paginated_response(rows.transaction_dicts(page))
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """Return the transactions changed since a sync token.
+
+        Without ``since`` every transaction is returned. Pass the ``token``
+        of each response as ``since`` to the next request: while ``has_more``
+        is true there are more pages, after that the token fetches later
+        changes. ``deleted`` lists the ids of deleted transactions. A
+        410 response means the token expired and syncing must start over.
+        """
+        try:
+            return Response(self._changes_data(request))
+        except sync.TokenExpired:
+            return self._sync_token_expired()
+
+    def _changes_data(self, request, version=None):
+        """Return the next page of changes for the ``since`` and ``page_size`` parameters."""
+        token = None
+        if request.query_params.get('since'):
+            try:
+                token = sync.SyncToken.decode(request.query_params['since'])
+            except sync.InvalidToken:
+                raise ValidationError({'since': 'Invalid sync token.'})
+        try:
+            page_size = int(request.query_params.get('page_size', 100))
+        except ValueError:
+            raise ValidationError({'page_size': 'Enter a whole number.'})
+        page_size = min(max(page_size, 1), settings.TRANSACTION_MAX_PAGE_SIZE)
+
+        change_set = sync.changes(request.user, token, page_size, version)
+        return {
+            'token': change_set.token.encode(),
+            'has_more': change_set.has_more,
+            'changed': TransactionSerializer(change_set.changed, many=True).data,
+            'deleted': change_set.deleted,
+        }
+
+    @staticmethod
+    def _sync_token_expired():
+        return Response(
+            {'message': 'This sync token has expired; sync again without since.'},
+            status=status.HTTP_410_GONE
+        )
+
     @action(detail=False, methods=['get'])
+    @cached_response('dashboard')
+    def dashboard(self, request):
+        """Get everything the dashboard page shows in one response.
+
+        Returns the ``summary``, ``monthly_summary``, ``category_summary`` and
+        ``categories`` payloads of the endpoints of those names, computed
+        from one read of the monthly rollups, and a page of ``transactions``
+        changes as returned by ``changes``.
+
+        Query parameters:
+        - ``monthly_time_range`` / ``category_time_range``: 3months,
+          6months (default), 1year or all
+        - ``since`` / ``page_size``: as for ``changes``
+        """
+        time_ranges = {}
+        for name in ('monthly_time_range', 'category_time_range'):
+            time_ranges[name] = request.query_params.get(name, '6months')
+            if time_ranges[name] not in TIME_RANGES:
+                raise ValidationError({name: f"Must be one of: {', '.join(TIME_RANGES)}."})
+
+        try:
+            # The version read for the cache key bounds the sync page
+            changes = self._changes_data(request, request_data_version(request))
+        except sync.TokenExpired:
+            return self._sync_token_expired()
+        data = build_dashboard(request.user, **time_ranges)
+        data['transactions'] = changes
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """Suggest past descriptions starting with ``q``, most used first.
+
+        Close matches are suggested too, so small typos are tolerated. Each
+        suggestion comes with its usual category and last amount. ``limit``
+        defaults to 5.
+        """
+        text = request.query_params.get('q', '')
+        if not suggestions.normalize(text):
+            raise ValidationError({'q': 'This parameter is required.'})
+        try:
+            limit = int(request.query_params.get('limit', 5))
+        except ValueError:
+            raise ValidationError({'limit': 'Enter a whole number.'})
+        if not 1 <= limit <= suggestions.MAX_LIMIT:
+            raise ValidationError({'limit': f'Must be between 1 and {suggestions.MAX_LIMIT}.'})
+        results = suggestions.suggest(request.user, text, limit)
+        return Response(DescriptionSuggestionSerializer(results, many=True).data)
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer, *COMPACT_RENDERERS])
+    def export(self, request):
+        """Stream every transaction matching the list filters as a file.
+
+        CSV by default; NDJSON, columnar JSON or MessagePack with
+        ``?format=ndjson|columnar|msgpack`` or the matching Accept header.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        return export_response(queryset, request.accepted_renderer.format)
+
+    @action(detail=False, methods=['post'])
+    def batch(self, request):
+        """Create, update and delete many transactions in one request.
+
+        The body is ``{"operations": [...]}`` where each operation is
+        ``{"op": "create", "data": {...}}``, ``{"op": "update", "id": ..., "data": {...}}``
+        or ``{"op": "delete", "id": ...}``. Either every operation is applied
+        or none is. Send an ``Idempotency-Key`` header to make retries safe.
+        """
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        try:
+            data = run_batch(request.user, operations, request.headers.get('Idempotency-Key'))
+        except BatchInvalid as exc:
+            return Response(
+                {'message': 'No operations were applied.', 'errors': exc.errors},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except IdempotencyConflict as exc:
+            return Response({'message': str(exc)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    @cached_response('summary')
     def summary(self, request):
         """Get summary of transactions for the current user."""
         today = timezone.now().date()
-        start_of_month = today.replace(day=1)
+        
+        # Totals are read from the monthly rollups, not the raw transactions,
+        # and converted into the reporting currency by the queries
+        user_rollups = MonthlyRollup.objects.filter(user=request.user)
+        current_month = user_rollups.filter(year=today.year, month=today.month)
+        total = currencies.converted('total', request.user.reporting_currency)
         
         # Calculate total income and expenses for the current month
-        monthly_data = Transaction.objects.filter(
-            user=request.user,
-            date__year=today.year,
-            date__month=today.month
-        ).aggregate(
-            total_income=Sum('amount', filter=Q(transaction_type='IN')),
-            total_expenses=Sum('amount', filter=Q(transaction_type='EX'))
+        monthly_data = current_month.aggregate(
+            total_income=Sum(total, filter=Q(transaction_type='IN')),
+            total_expenses=Sum(total, filter=Q(transaction_type='EX'))
         )
         
-        # Calculate total balance
-        total_balance = Transaction.objects.filter(
-            user=request.user
-        ).aggregate(
-            balance=Sum('amount', filter=Q(transaction_type='IN')) - 
-                   Sum('amount', filter=Q(transaction_type='EX'))
-        )['balance'] or 0
+        # The all-time balance is the latest balance checkpoint
+        total_balance = balances.current_balance(request.user)
         
         # Calculate category-wise expenses for the current month
-        category_expenses = Transaction.objects.filter(
-            user=request.user,
-            transaction_type='EX',
-            date__year=today.year,
-            date__month=today.month
+        category_expenses = current_month.filter(
+            transaction_type='EX'
         ).values('category').annotate(
-            total=Sum('amount')
+            total=Sum(total)
         ).order_by('-total')
         
         return Response({
             'total_income': monthly_data['total_income'] or 0,
             'total_expenses': abs(monthly_data['total_expenses'] or 0),
             'balance': total_balance,
-            'category_expenses': category_expenses
+            'category_expenses': list(category_expenses)
         })
 
     @action(detail=False, methods=['get'])
+    @cached_response('monthly_summary')
     def monthly_summary(self, request):
-        """Get monthly summary of income and expenses based on selected time range."""
-        # Get time range from query parameters with default of 6 months
-        time_range = request.query_params.get('time_range', '6months')
-        
-        # Calculate date range based on time_range parameter
-        today = timezone.now().date()
-        current_year = today.year
-        current_month = today.month
-        
-        # Define start date based on time range
-        if time_range == '3months':
-            months_to_include = 3
-            if current_month >= months_to_include:
-                start_date = today.replace(month=current_month - months_to_include + 1, day=1)
-                start_year = current_year
-            else:
-                # Handle case where time range spans previous year
-                months_from_prev_year = months_to_include - current_month
-                start_month = 12 - months_from_prev_year + 1
-                start_date = today.replace(year=current_year - 1, month=start_month, day=1)
-                start_year = current_year - 1
-        elif time_range == '6months':
-            months_to_include = 6
-            if current_month >= months_to_include:
-                start_date = today.replace(month=current_month - months_to_include + 1, day=1)
-                start_year = current_year
-            else:
-                # Handle case where time range spans previous year
-                months_from_prev_year = months_to_include - current_month
-                start_month = 12 - months_from_prev_year + 1
-                start_date = today.replace(year=current_year - 1, month=start_month, day=1)
-                start_year = current_year - 1
-        elif time_range == '1year':
-            start_date = today.replace(year=current_year - 1, month=current_month, day=1)
-            start_year = current_year - 1
-        else:  # 'all' or any other value
-            # Get the date of the first transaction for this user
-            first_transaction = Transaction.objects.filter(user=request.user).order_by('date').first()
-            if first_transaction:
-                start_date = first_transaction.date.replace(day=1)
-                start_year = start_date.year
-            else:
-                # If no transactions, default to beginning of current year
-                start_date = today.replace(month=1, day=1)
-                start_year = current_year
+        """Get income and expenses per period for the selected date range.
+
+        Query parameters:
+        - ``time_range``: 3months, 6months (default), 1year or all; used when
+          ``start`` is not given
+        - ``start`` / ``end``: explicit ISO dates (``end`` defaults to today)
+        - ``granularity``: day, week, month (default), quarter or year
+        """
+        start_date, end_date, granularity = self._series_params(request)
+        
+        # One grouped query for the whole range; empty periods are zero-filled
+        monthly_summaries = timeseries.income_expense_series(
+            request.user, start_date, end_date, granularity
+        )
         
-        # Get all relevant months between start_date and today
-        monthly_summaries = []
+        return Response(monthly_summaries)
+
+    @action(detail=False, methods=['get'])
+    @cached_response('balance')
+    def balance(self, request):
+        """Get the balance at the end of a day (``date``, default today)."""
+        day = self._parse_date_param(request, 'date') or timezone.now().date()
+        return Response({'date': day, 'balance': balances.balance_as_of(request.user, day)})
+
+    @action(detail=False, methods=['get'])
+    @cached_response('balance_series')
+    def balance_series(self, request):
+        """Get the running balance at the end of each period of the selected date range.
+
+        Takes the same query parameters as ``monthly_summary``.
+        """
+        start_date, end_date, granularity = self._series_params(request)
+        return Response(balances.balance_series(request.user, start_date, end_date, granularity))
+
+    def _series_params(self, request):
+        """Parse the date range and granularity of a series endpoint.
+
+        Returns ``(start, end, granularity)``; see ``monthly_summary``.
+        """
+        granularity = request.query_params.get('granularity', timeseries.MONTH)
+        if granularity not in timeseries.GRANULARITIES:
+            raise ValidationError({'granularity': f"Must be one of: {', '.join(timeseries.GRANULARITIES)}."})
         
-        # Calculate total number of months to loop through
-        total_months = (current_year - start_year) * 12 + current_month - start_date.month + 1
+        today = timezone.now().date()
+        start_date = self._parse_date_param(request, 'start')
+        end_date = self._parse_date_param(request, 'end') or today
         
-        for i in range(total_months):
-            # Calculate year and month for current iteration
-            target_month = ((start_date.month - 1 + i) % 12) + 1
-            target_year = start_year + (start_date.month - 1 + i) // 12
-            
-            # Only include months up to current date
-            if target_year > current_year or (target_year == current_year and target_month > current_month):
-                break
-                
-            # Get data for this month
-            monthly_data = Transaction.objects.filter(
-                user=request.user,
-                date__year=target_year,
-                date__month=target_month
-            ).aggregate(
-                income=Sum('amount', filter=Q(transaction_type='IN')),
-                expenses=Sum('amount', filter=Q(transaction_type='EX'))
-            )
+        if start_date is None:
+            # Get time range from query parameters with default of 6 months
+            time_range = request.query_params.get('time_range', '6months')
             
-            monthly_summaries.append({
-                'month': target_month,
-                'year': target_year,
-                'income': monthly_data['income'] or 0,
-                'expenses': abs(monthly_data['expenses'] or 0),
-                'savings': (monthly_data['income'] or 0) + (monthly_data['expenses'] or 0)
+            # Define start date based on time range
+            if time_range == '3months':
+                start_date = periods.months_back(end_date, 2)
+            elif time_range == '6months':
+                start_date = periods.months_back(end_date, 5)
+            elif time_range == '1year':
+                start_date = periods.months_back(end_date, 12)
+            else:  # 'all' or any other value
+                # Get the month of the first transaction for this user
+                first_rollup = MonthlyRollup.objects.filter(user=request.user).order_by('year', 'month').first()
+                if first_rollup:
+                    start_date = date(first_rollup.year, first_rollup.month, 1)
+                else:
+                    # If no transactions, default to beginning of current year
+                    start_date = end_date.replace(month=1, day=1)
+        
+        if start_date > end_date:
+            raise ValidationError({'start': 'Must not be after end.'})
+        if timeseries.bucket_count(start_date, end_date, granularity) > timeseries.MAX_BUCKETS:
+            raise ValidationError({
+                'granularity': f'Too many {granularity} buckets for this range (max {timeseries.MAX_BUCKETS}).'
             })
-        
-        return Response(monthly_summaries)
+        return start_date, end_date, granularity
+
+    @staticmethod
+    def _parse_date_param(request, name):
+        """Parse an optional ISO date query parameter."""
+        value = request.query_params.get(name)
+        if not value:
+            return None
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise ValidationError({name: 'Enter a valid date in YYYY-MM-DD format.'})
 
     @action(detail=False, methods=['get'])
+    @cached_response('categories')
     def categories(self, request):
         """Get all available transaction categories divided by type."""
-        # Get all category choices from the model
-        income_categories = []
-        expense_categories = []
-        
-        for choice in Transaction.Category.choices:
-            category_code = choice[0]
-            category_name = choice[1]
-            
-            # Check if this is an income or expense category based on naming convention
-            # This assumes income categories have specific identifiers like SALARY, FREELANCE, etc.
-            if category_code in ['SALARY', 'FREELANCE', 'INVESTMENT', 'GIFT', 'OTHER_INC']:
-                income_categories.append({
-                    'value': category_code,
-                    'label': category_name
-                })
-            else:
-                expense_categories.append({
-                    'value': category_code,
-                    'label': category_name
-                })
-        
-        return Response({
-            'income': income_categories,
-            'expense': expense_categories
-        })
+        return Response(categories_by_type())
 
 
     @action(detail=False, methods=['get'])
+    @cached_response('category_summary')
     def category_summary(self, request):
         """Get summary of expenses by category based on selected time range."""
         # Get time range from query parameters with default of 6 months
@@ -207,25 +380,16 @@ class TransactionViewSet(viewsets.ModelViewSet):
         
         # Define date range based on time range
         if time_range == '3months':
-            start_date = today - timedelta(days=90)
+            date_range = periods.last_n_days(90, today)
         elif time_range == '6months':
-            start_date = today - timedelta(days=180)
+            date_range = periods.last_n_days(180, today)
         elif time_range == '1year':
-            start_date = today - timedelta(days=365)
+            date_range = periods.last_n_days(365, today)
         else:  # 'all' or any other value
-            start_date = None
+            date_range = None
         
-        # Create base queryset
-        queryset = Transaction.objects.filter(user=request.user, transaction_type='EX')
-        
-        # Apply date filter if applicable
-        if start_date:
-            queryset = queryset.filter(date__gte=start_date)
-        
-        # Get category-wise expenses
-        category_expenses = queryset.values('category').annotate(
-            total=Sum('amount')
-        ).order_by('-total')
+        # Get category-wise expenses (whole months come from the rollups)
+        category_expenses = rollups.expense_totals_by_category(request.user, date_range)
         
         # Transform to include category display names
         category_dict = dict(Transaction.Category.choices)
@@ -235,6 +399,48 @@ class TransactionViewSet(viewsets.ModelViewSet):
         
         return Response(category_expenses)
 
+    @action(detail=False, methods=['get'])
+    @cached_response('analytics')
+    def analytics(self, request):
+        """Get expense analytics for the selected time range.
+
+        Returns totals per category, a rolling 30-day total per day, the
+        number of expenses per weekday (Monday first) and the distribution
+        of amounts per category. ``time_range`` is 3months, 6months
+        (default), 1year or all. Requires NumPy on the server.
+        """
+        if not analytics.available():
+            return Response(
+                {'message': 'Analytics are not available on this server.'},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+        time_range = request.query_params.get('time_range', '6months')
+        if time_range not in TIME_RANGES:
+            raise ValidationError({'time_range': f"Must be one of: {', '.join(TIME_RANGES)}."})
+
+        today = timezone.now().date()
+        date_range = periods.last_n_days(CATEGORY_DAYS[time_range], today) if time_range in CATEGORY_DAYS else None
+        history = analytics.get_history(request.user, request_data_version(request))
+        return Response(analytics.expense_report(history, date_range, today))
+
+    @action(detail=False, methods=['get'])
+    @cached_response('forecast')
+    def forecast(self, request):
+        """Get the projected balance and spending for the rest of this month and ``months`` ahead.
+
+        ``months`` is the number of following months to project (default 3,
+        at most 12).
+        """
+        try:
+            months_ahead = int(request.query_params.get('months', 3))
+        except ValueError:
+            months_ahead = 0
+        if not 1 <= months_ahead <= forecast.MAX_MONTHS_AHEAD:
+            raise ValidationError({'months': f'Must be a number between 1 and {forecast.MAX_MONTHS_AHEAD}.'})
+
+        fitted = forecast.get_forecast(request.user, request_data_version(request))
+        return Response(forecast.project(fitted, months_ahead))
+
 
 class CategoryAPIView(APIView):
     """API view to get all available categories."""
@@ -242,35 +448,21 @@ class CategoryAPIView(APIView):
     
     def get(self, request):
         """Get all available transaction categories divided by type."""
-        # Get all category choices from the model
-        income_categories = []
-        expense_categories = []
-        
-        for choice in Transaction.Category.choices:
-            category_code = choice[0]
-            category_name = choice[1]
-            
-            # Check if this is an income or expense category based on naming convention
-            # This assumes income categories have specific identifiers like SALARY, FREELANCE, etc.
-            if category_code in ['SALARY', 'FREELANCE', 'INVESTMENT', 'GIFT', 'OTHER_INC']:
-                income_categories.append({
-                    'value': category_code,
-                    'label': category_name
-                })
-            else:
-                expense_categories.append({
-                    'value': category_code,
-                    'label': category_name
-                })
-        
-        return Response({
-            'income': income_categories,
-            'expense': expense_categories
-        })
+        return Response(categories_by_type())
 
-class BudgetViewSet(viewsets.ModelViewSet):
+class CacheStatsAPIView(APIView):
+    """API view exposing response cache hit/miss counters, for sizing the cache."""
+    permission_classes = [IsAdminUser]
+    
+    def get(self, request):
+        """Get hit and miss counters per cached endpoint."""
+        return Response(cache_stats())
+
+
+class BudgetViewSet(ReplicaReadMixin, ETagMixin, viewsets.ModelViewSet):
     """API endpoint that allows budgets to be viewed or edited."""
     permission_classes = [IsAuthenticated]
+    etag_actions = ('summary',)
     serializer_class = BudgetSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['category', 'period']
@@ -281,47 +473,51 @@ class BudgetViewSet(viewsets.ModelViewSet):
         """Return only the budgets for the current user."""
         return Budget.objects.filter(user=self.request.user)
 
+    def get_serializer_context(self):
+        """Share one bulk usage calculator between all serialized budgets."""
+        context = super().get_serializer_context()
+        context['budget_usage'] = BudgetUsageCalculator(self.request.user)
+        return context
+
     def perform_create(self, serializer):
-        """Set the user to the current user when creating a budget."""
+        """Set the user to the current user when creating a budget.
+
+        Without a currency, the budget is in the user's reporting currency.
+        """
+        serializer.validated_data.setdefault('currency', self.request.user.reporting_currency)
         serializer.save(user=self.request.user)
     
     @action(detail=False, methods=['get'])
+    @cached_response('budget_summary')
     def summary(self, request):
         """Get summary of all budgets with their usage percentages."""
-        today = date.today()
-        year = today.year
-        month = today.month
-        
         # Get all budgets for the current user
-        budgets = self.get_queryset()
-        
-        # Calculate total budget and used amount
-        monthly_budgets = budgets.filter(period=Budget.Period.MONTHLY)
-        yearly_budgets = budgets.filter(period=Budget.Period.YEARLY)
+        budgets = list(self.get_queryset())
+        context = self.get_serializer_context()
+        usage = context['budget_usage']
         
-        # Calculate total monthly budget
-        total_monthly_budget = monthly_budgets.aggregate(total=Sum('amount'))['total'] or 0
+        # Calculate total monthly budget, in the reporting currency
+        total_monthly_budget = sum(
+            (usage.amount(budget) for budget in budgets if budget.period == Budget.Period.MONTHLY), Decimal('0')
+        )
         
         # Calculate total yearly budget (divided by 12 for monthly equivalent)
-        total_yearly_budget = yearly_budgets.aggregate(total=Sum('amount'))['total'] or 0
+        total_yearly_budget = sum(
+            (usage.amount(budget) for budget in budgets if budget.period == Budget.Period.YEARLY), Decimal('0')
+        )
         monthly_equivalent_yearly_budget = total_yearly_budget / 12 if total_yearly_budget > 0 else 0
         
         # Calculate total budget (monthly + yearly/12)
         total_budget = total_monthly_budget + monthly_equivalent_yearly_budget
         
-        # Calculate total expenses for current month
-        total_expenses = abs(Transaction.objects.filter(
-            user=request.user,
-            transaction_type=Transaction.TransactionType.EXPENSE,
-            date__year=year,
-            date__month=month
-        ).aggregate(total=Sum('amount'))['total'] or 0)
+        # One grouped rollup query covers the month total and every budget
+        total_expenses = abs(usage.total_monthly_expenses)
         
         # Calculate overall budget usage
         overall_usage_percentage = min(100, int((total_expenses / total_budget) * 100)) if total_budget > 0 else 0
         
         # Get budget details with their usage
-        budget_details = BudgetSerializer(budgets, many=True).data
+        budget_details = BudgetSerializer(budgets, many=True, context=context).data
         
         return Response({
             'total_budget': total_budget,
@@ -359,7 +555,12 @@ class FinancialInsightViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        """Generate AI-powered financial insights based on user's transactions."""
+        """Queue generation of AI-powered financial insights based on user's transactions.
+        
+        Insights are generated by the ``process_insight_jobs`` worker; poll the
+        ``jobs/<id>/`` endpoint for the status and result. While a job is still
+        pending, repeat requests return that job instead of queueing another.
+        """
         user = request.user
         
         # Get all transactions for the user
@@ -371,247 +572,52 @@ class FinancialInsightViewSet(viewsets.ModelViewSet):
                 'message': 'Not enough transaction data to generate insights.'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Generate insights
-        insights = self._generate_insights(user, transactions)
-        
-        # Return the generated insights
-        serializer = self.get_serializer(insights, many=True)
-        return Response(serializer.data)
-    
-    def _generate_insights(self, user, transactions):
-        """Generate financial insights based on user's transaction data."""
-        insights = []
-        today = timezone.now().date()
-        
-        # 1. Spending patterns analysis
-        spending_pattern = self._analyze_spending_patterns(user, transactions)
-        if spending_pattern:
-            insights.append(spending_pattern)
-        
-        # 2. Budget alerts for categories exceeding 80% of budget
-        budget_alerts = self._generate_budget_alerts(user)
-        insights.extend(budget_alerts)
-        
-        # 3. Savings opportunities
-        savings_opportunity = self._find_savings_opportunities(user, transactions)
-        if savings_opportunity:
-            insights.append(savings_opportunity)
-        
-        # 4. General financial advice
-        general_advice = self._generate_general_advice(user, transactions)
-        if general_advice:
-            insights.append(general_advice)
-        
-        return insights
-    
-    def _analyze_spending_patterns(self, user, transactions):
-        """Analyze spending patterns to find categories with significant spending."""
-        today = timezone.now().date()
-        start_date = today - timedelta(days=90)  # Last 3 months
-        
-        # Get expenses from the last 3 months
-        recent_expenses = transactions.filter(
-            transaction_type=Transaction.TransactionType.EXPENSE,
-            date__gte=start_date
-        )
-        
-        if not recent_expenses.exists():
-            return None
-        
-        # Group expenses by category and calculate totals
-        category_totals = defaultdict(float)
-        for expense in recent_expenses:
-            category_totals[expense.category] += abs(expense.amount)
-        
-        # Find the top spending category
-        top_category = max(category_totals.items(), key=lambda x: x[1], default=(None, 0))
-        
-        if not top_category[0]:
-            return None
-        
-        # Get the category display name
-        category_display = dict(Transaction.Category.choices).get(top_category[0], top_category[0])
-        
-        # Calculate the percentage of total spending
-        total_spending = sum(category_totals.values())
-        percentage = int((top_category[1] / total_spending) * 100) if total_spending > 0 else 0
-        
-        # Create the insight
-        insight = FinancialInsight(
-            user=user,
-            insight_type=FinancialInsight.InsightType.SPENDING_PATTERN,
-            title=f"{percentage}% of your spending is on {category_display}",
-            content=f"Over the past 3 months, you've spent ${top_category[1]:.2f} on {category_display}, "
-                   f"which is {percentage}% of your total expenses. Consider if this aligns with your financial goals."
-        )
-        
-        # Add data points
-        insight.data = {
-            'category': top_category[0],
-            'category_display': category_display,
-            'amount': float(top_category[1]),
-            'percentage': percentage,
-            'time_period': '3 months'
-        }
-        
-        return insight
-    
-    def _generate_budget_alerts(self, user):
-        """Generate alerts for categories exceeding budget thresholds."""
-        alerts = []
-        today = timezone.now().date()
-        
-        # Get all budgets for the user
-        budgets = Budget.objects.filter(user=user)
-        
-        for budget in budgets:
-            # Calculate usage percentage
-            usage_percentage = budget.get_usage_percentage()
-            
-            # If usage is over 80%, create an alert
-            if usage_percentage >= 80:
-                # Get category display name
-                category_display = dict(Transaction.Category.choices).get(budget.category, budget.category)
-                
-                # Create alert message based on percentage
-                if usage_percentage >= 100:
-                    title = f"Budget exceeded for {category_display}"
-                    content = (f"You've exceeded your ${budget.amount:.2f} budget for {category_display}. "
-                               f"Consider adjusting your spending or increasing your budget for this category.")
-                else:
-                    title = f"Budget almost reached for {category_display}"
-                    content = (f"You've used {usage_percentage}% of your ${budget.amount:.2f} budget for {category_display}. "
-                               f"Be mindful of your spending in this category for the rest of the period.")
-                
-                # Create the insight
-                alert = FinancialInsight(
-                    user=user,
-                    insight_type=FinancialInsight.InsightType.BUDGET_ALERT,
-                    title=title,
-                    content=content
-                )
-                
-                # Add data points
-                alert.data = {
-                    'category': budget.category,
-                    'category_display': category_display,
-                    'budget_amount': float(budget.amount),
-                    'usage_percentage': usage_percentage,
-                    'period': budget.period
-                }
-                
-                alerts.append(alert)
+        # Queue the job (or reuse the pending one)
+        job, created = enqueue_insight_job(user)
         
-        return alerts
-    
-    def _find_savings_opportunities(self, user, transactions):
-        """Find potential savings opportunities based on transaction patterns."""
-        today = timezone.now().date()
-        start_date = today - timedelta(days=30)  # Last month
-        
-        # Get expenses from the last month
-        recent_expenses = transactions.filter(
-            transaction_type=Transaction.TransactionType.EXPENSE,
-            date__gte=start_date
+        return Response(
+            InsightJobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
         )
-        
-        if not recent_expenses.exists():
-            return None
-        
-        # Simple approach: find categories with frequent small transactions
-        # that could be consolidated or reduced
-        category_counts = defaultdict(int)
-        category_totals = defaultdict(float)
-        
-        for expense in recent_expenses:
-            category_counts[expense.category] += 1
-            category_totals[expense.category] += abs(expense.amount)
-        
-        # Find categories with frequent transactions (at least 5 in a month)
-        frequent_categories = [cat for cat, count in category_counts.items() if count >= 5]
-        
-        if not frequent_categories:
-            return None
-        
-        # Choose a random category from the frequent ones to avoid always showing the same insight
-        target_category = random.choice(frequent_categories)
-        category_display = dict(Transaction.Category.choices).get(target_category, target_category)
-        
-        # Create the insight
-        insight = FinancialInsight(
-            user=user,
-            insight_type=FinancialInsight.InsightType.SAVINGS_OPPORTUNITY,
-            title=f"Potential savings in {category_display}",
-            content=f"You made {category_counts[target_category]} {category_display} transactions last month, "
-                   f"totaling ${category_totals[target_category]:.2f}. Consider consolidating these purchases "
-                   f"or finding alternatives to reduce this expense."
-        )
-        
-        # Add data points
-        insight.data = {
-            'category': target_category,
-            'category_display': category_display,
-            'transaction_count': category_counts[target_category],
-            'total_amount': float(category_totals[target_category]),
-            'time_period': '1 month'
-        }
-        
-        return insight
     
-    def _generate_general_advice(self, user, transactions):
-        """Generate general financial advice based on user's financial situation."""
-        # Calculate income vs expenses for the last 3 months
-        today = timezone.now().date()
-        start_date = today - timedelta(days=90)
-        
-        recent_transactions = transactions.filter(date__gte=start_date)
-        
-        if not recent_transactions.exists():
-            return None
-        
-        # Calculate total income and expenses
-        income = recent_transactions.filter(
-            transaction_type=Transaction.TransactionType.INCOME
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        expenses = recent_transactions.filter(
-            transaction_type=Transaction.TransactionType.EXPENSE
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        expenses = abs(expenses)
-        
-        # Calculate savings rate (income - expenses) / income
-        savings = income - expenses
-        savings_rate = (savings / income) * 100 if income > 0 else 0
-        
-        # Generate appropriate advice based on savings rate
-        if savings_rate < 0:
-            title = "Spending exceeds income"
-            content = "Your expenses have exceeded your income over the last 3 months. Review your spending and consider creating a budget to help manage your finances."
-        elif savings_rate < 10:
-            title = "Low savings rate"
-            content = "Your savings rate is below 10%. Financial experts recommend saving at least 20% of your income. Consider identifying areas where you can reduce expenses."
-        elif savings_rate < 20:
-            title = "Good progress on savings"
-            content = "You're saving between 10-20% of your income, which is good progress. Try to increase this to 20% or more for long-term financial security."
-        else:
-            title = "Excellent savings rate"
-            content = "You're saving over 20% of your income, which is excellent! Consider investing these savings for long-term growth."
-        
-        # Create the insight
-        insight = FinancialInsight(
-            user=user,
-            insight_type=FinancialInsight.InsightType.GENERAL_ADVICE,
-            title=title,
-            content=content
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9]+)')
+    def job(self, request, job_id=None):
+        """Get the status and, once finished, the result of an insight job."""
+        job = get_object_or_404(InsightJob, pk=job_id, user=request.user)
+        return Response(InsightJobSerializer(job).data)
+
+
+class StatementImportViewSet(viewsets.ReadOnlyModelViewSet):
+    """API endpoint to import bank statements (CSV, OFX or QIF) and follow their progress.
+
+    The uploaded file is stored and queued; a worker imports it in chunks
+    that are committed one at a time, so polling an import shows its
+    progress counters move.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = StatementImportSerializer
+
+    def get_queryset(self):
+        """Return only the imports of the current user."""
+        return StatementImport.objects.filter(user=self.request.user)
+
+    def create(self, request):
+        """Upload a statement file and queue its import."""
+        upload = StatementUploadSerializer(data=request.data)
+        upload.is_valid(raise_exception=True)
+        statement_import = imports.create_import(
+            request.user,
+            upload.validated_data['file'].name,
+            upload.validated_data['file_format'],
+            upload.options,
+            upload=upload.validated_data['file']
         )
-        
-        # Add data points
-        insight.data = {
-            'income': float(income),
-            'expenses': float(expenses),
-            'savings': float(savings),
-            'savings_rate': float(savings_rate),
-            'time_period': '3 months'
-        }
-        
-        return insight
+        return Response(StatementImportSerializer(statement_import).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def errors(self, request, pk=None):
+        """List the rows of an import that could not be imported."""
+        statement_import = self.get_object()
+        page = self.paginate_queryset(statement_import.row_errors.all())
+        serializer = ImportRowErrorSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:22
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_create_demo_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='reporting_currency',
+            field=models.CharField(default='USD', max_length=3, validators=[django.core.validators.RegexValidator('^[A-Z]{3}$', 'Enter a three-letter currency code, such as USD.')], verbose_name='reporting currency'),
+        ),
+    ]
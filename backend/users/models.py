@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from django.core.validators import RegexValidator
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
@@ -47,6 +49,13 @@ class User(AbstractUser):
     date_joined = models.DateTimeField(_('date joined'), auto_now_add=True)
     is_active = models.BooleanField(_('active'), default=True)
     is_staff = models.BooleanField(_('staff status'), default=False)
+    # Currency totals and balances are reported in
+    reporting_currency = models.CharField(
+        _('reporting currency'),
+        max_length=3,
+        default=settings.DEFAULT_CURRENCY,
+        validators=[RegexValidator(r'^[A-Z]{3}$', _('Enter a three-letter currency code, such as USD.'))]
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = []
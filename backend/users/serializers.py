@@ -3,6 +3,8 @@ from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 from djoser.serializers import UserSerializer as BaseUserSerializer
 
+from transactions.currencies import is_supported
+
 User = get_user_model()
 
 class UserCreateSerializer(BaseUserCreateSerializer):
@@ -16,5 +18,11 @@ class UserSerializer(BaseUserSerializer):
     """Serializer for users."""
     class Meta(BaseUserSerializer.Meta):
         model = User
-        fields = ('id', 'email', 'first_name', 'last_name', 'is_active', 'is_staff')
+        fields = ('id', 'email', 'first_name', 'last_name', 'reporting_currency', 'is_active', 'is_staff')
         read_only_fields = ('is_active', 'is_staff')
+
+    def validate_reporting_currency(self, value):
+        """Only allow currencies that amounts can be converted into."""
+        if not is_supported(value):
+            raise serializers.ValidationError(f'No exchange rates are loaded for {value}.')
+        return value
@@ -31,6 +31,7 @@ export const useApi = () => {
   
   // Transaction methods
   const getTransactions = () => callApi(apiService.getTransactions)
+  const getTransactionChanges = (since) => callApi(apiService.getTransactionChanges, since)
   const addTransaction = (transaction) => callApi(apiService.addTransaction, transaction)
   const updateTransaction = (id, transaction) => callApi(apiService.updateTransaction, id, transaction)
   const deleteTransaction = (id) => callApi(apiService.deleteTransaction, id)
@@ -42,6 +43,8 @@ export const useApi = () => {
   const getSummary = () => callApi(apiService.getSummary)
   const getMonthlyStats = (timeRange) => callApi(apiService.getMonthlyStats, timeRange)
   const getCategoryStats = (timeRange) => callApi(apiService.getCategoryStats, timeRange)
+  const getDashboard = (monthlyTimeRange, categoryTimeRange, since) =>
+    callApi(apiService.getDashboard, monthlyTimeRange, categoryTimeRange, since)
 
   // Budget methods
   const getBudgets = () => callApi(apiService.getBudgets)
@@ -54,6 +57,7 @@ export const useApi = () => {
     isLoading,
     error,
     getTransactions,
+    getTransactionChanges,
     addTransaction,
     updateTransaction,
     deleteTransaction,
@@ -61,6 +65,7 @@ export const useApi = () => {
     getSummary,
     getMonthlyStats,
     getCategoryStats,
+    getDashboard,
     getBudgets,
     getBudgetSummary,
     addBudget,
@@ -53,7 +53,9 @@ export default class ApiService {
       // Handle non-2xx responses
       if (!response.ok) {
         const errorData = await response.json().catch(() => ({}));
-        throw new Error(errorData.message || `API Error: ${response.status}`);
+        const error = new Error(errorData.message || `API Error: ${response.status}`);
+        error.status = response.status;
+        throw error;
       }
       
       // Check if response is empty
@@ -125,6 +127,39 @@ export default class ApiService {
     }
   }
 
+  /**
+   * Get one page of transaction changes since a sync token
+   * @param {string|null} since - Token of the previous page, or null for a full sync
+   * @returns {Promise} - { token, hasMore, changed, deleted }
+   */
+  async getTransactionChanges(since = null) {
+    const params = new URLSearchParams({ page_size: '500' });
+    if (since) params.set('since', since);
+    const response = await this.request('GET', `transactions/changes/?${params}`);
+    return this.mapChangesPage(response);
+  }
+
+  /**
+   * Convert a page of transaction changes to the frontend format
+   * @param {Object} response - Page returned by the changes endpoint
+   * @returns {Object} - { token, hasMore, changed, deleted }
+   */
+  mapChangesPage(response) {
+    return {
+      token: response.token,
+      hasMore: response.has_more,
+      changed: (response.changed || []).map(transaction => ({
+        id: transaction.id,
+        date: transaction.date,
+        type: transaction.transaction_type === 'IN' ? 'income' : 'expense',
+        category: transaction.category_display || transaction.category,
+        description: transaction.description || '',
+        amount: Math.abs(parseFloat(transaction.amount || 0))
+      })),
+      deleted: response.deleted || []
+    };
+  }
+
   async addTransaction(transaction) {
     // Format date as YYYY-MM-DD as required by Django
     let formattedDate;
@@ -218,6 +253,28 @@ export default class ApiService {
     return this.request('GET', `transactions/category_summary/?time_range=${timeRange}`);
   }
 
+  /**
+   * Get every dashboard payload in one request
+   * @param {string} monthlyTimeRange - Time range of the monthly chart
+   * @param {string} categoryTimeRange - Time range of the category chart
+   * @param {string|null} since - Delta sync token, or null for a full sync
+   * @returns {Promise} - { summary, monthly_summary, category_summary, categories, transactions }
+   */
+  async getDashboard(monthlyTimeRange = '6months', categoryTimeRange = '6months', since = null) {
+    const params = new URLSearchParams({
+      monthly_time_range: monthlyTimeRange,
+      category_time_range: categoryTimeRange,
+      page_size: '500'
+    });
+    if (since) params.set('since', since);
+    const response = await this.request('GET', `dashboard/?${params}`);
+
+    return {
+      ...response,
+      transactions: this.mapChangesPage(response.transactions)
+    };
+  }
+
   // Categories API methods
   async getCategories() {
     try {
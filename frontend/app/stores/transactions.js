@@ -4,6 +4,8 @@ import { useApi } from '~/composables/useApi'
 export const useTransactionsStore = defineStore('transactions', {
   state: () => ({
     transactions: [],
+    // Delta sync token of the last fetch (see fetchTransactions)
+    syncToken: null,
     categories: {
       income: [],
       expense: []
@@ -215,27 +217,53 @@ export const useTransactionsStore = defineStore('transactions', {
   },
 
   actions: {
-    async fetchTransactions() {
+    async fetchTransactions(firstPage = null) {
       this.loading = true
       this.error = null
       
       try {
         const api = useApi()
-        const response = await api.getTransactions()
         
-        // Process the transactions to ensure dates are Date objects
-        const transactions = Array.isArray(response) ? response : []
+        // Only the changes since the last fetch are downloaded; the first
+        // fetch (no token yet) downloads everything. firstPage is a page
+        // already fetched with the current token (see fetchDashboard)
+        const byId = new Map(this.syncToken ? this.transactions.map(t => [t.id, t]) : [])
+        let token = this.syncToken
+        let hasMore = true
+        let page = firstPage
+        
+        while (hasMore) {
+          if (!page) {
+            try {
+              page = await api.getTransactionChanges(token)
+            } catch (error) {
+              if (error.status !== 410 || !token) throw error
+              // The token expired: start over with a full sync
+              byId.clear()
+              token = null
+              continue
+            }
+          }
+          
+          page.changed.forEach(transaction => {
+            byId.set(transaction.id, {
+              ...transaction,
+              date: transaction.date ? new Date(transaction.date) : new Date(),
+              amount: parseFloat(transaction.amount)
+            })
+          })
+          page.deleted.forEach(id => byId.delete(id))
+          token = page.token
+          hasMore = page.hasMore
+          page = null
+        }
         
-        if (transactions.length === 0) {
+        if (byId.size === 0) {
           console.log('No transactions found in the database')
         }
         
-        this.transactions = transactions.map(transaction => ({
-          ...transaction,
-          date: transaction.date ? new Date(transaction.date) : new Date(),
-          // Ensure amount is a number
-          amount: parseFloat(transaction.amount)
-        }))
+        this.transactions = Array.from(byId.values())
+        this.syncToken = token
 
         // Sort transactions by date (newest first)
         this.transactions.sort((a, b) => b.date - a.date)
@@ -245,6 +273,7 @@ export const useTransactionsStore = defineStore('transactions', {
         
         // Fallback to empty array on error
         this.transactions = []
+        this.syncToken = null
       } finally {
         this.loading = false
       }
@@ -267,108 +296,112 @@ export const useTransactionsStore = defineStore('transactions', {
     async fetchSummary() {
       try {
         const api = useApi()
-        const response = await api.getSummary()
-        
-        if (response) {
-          this.summary = {
-            totalBalance: parseFloat(response.balance || 0),
-            monthlyIncome: parseFloat(response.total_income || 0),
-            monthlyExpenses: parseFloat(response.total_expenses || 0),
-            categoryExpenses: Array.isArray(response.category_expenses) ? 
-              response.category_expenses.map(item => ({
-                category: item.category,
-                amount: parseFloat(item.total)
-              })) : []
-          }
-        }
+        this.applySummary(await api.getSummary())
       } catch (error) {
         console.error('Error fetching summary:', error)
         // Keep using calculated values from transactions
       }
     },
     
+    applySummary(response) {
+      if (response) {
+        this.summary = {
+          totalBalance: parseFloat(response.balance || 0),
+          monthlyIncome: parseFloat(response.total_income || 0),
+          monthlyExpenses: parseFloat(response.total_expenses || 0),
+          categoryExpenses: Array.isArray(response.category_expenses) ? 
+            response.category_expenses.map(item => ({
+              category: item.category,
+              amount: parseFloat(item.total)
+            })) : []
+        }
+      }
+    },
+    
     async fetchMonthlyStats(timeRange = '6months') {
       try {
         const api = useApi()
         
-        // Get current date for calculations
-        const currentDate = new Date()
-        const currentMonth = currentDate.getMonth() + 1 // JavaScript months are 0-11, API data is 1-12
-        const currentYear = currentDate.getFullYear()
-        
-        // Calculate start date based on time range
-        let monthsToInclude = 6
-        let startDate = null
-        
-        switch(timeRange) {
-          case '3months':
-            monthsToInclude = 3
-            break
-          case '6months':
-            monthsToInclude = 6
-            break
-          case '1year':
-            monthsToInclude = 12
-            break
-          case 'all':
-            monthsToInclude = null // No limit
-            break
-          default:
-            monthsToInclude = 6
-        }
-        
         // Get data from API with time range parameter
-        const response = await api.getMonthlyStats(timeRange)
-        
-        if (Array.isArray(response)) {
-          console.log('Monthly data received from backend:', response)
-          
-          // Filter months based on selected time range
-          let relevantMonths = response
-          
-          if (monthsToInclude !== null) {
-            relevantMonths = response.filter(item => {
-              // Calculate if this month is within the selected time range
-              // For months in current year
-              if (item.year === currentYear) {
-                return item.month <= currentMonth && item.month > currentMonth - monthsToInclude
-              }
-              
-              // For months in previous year (if timeRange spans across years)
-              if (monthsToInclude > currentMonth && item.year === currentYear - 1) {
-                return item.month > 12 - (monthsToInclude - currentMonth)
-              }
-              
-              return false
-            })
-          }
-          
-          // Sort months chronologically
-          relevantMonths.sort((a, b) => {
-            if (a.year !== b.year) return a.year - b.year
-            return a.month - b.month
-          })
-          
-          console.log('Relevant months selected and sorted:', relevantMonths)
-          
-          // Convert data to the format required by the chart
-          this.monthlyStats = relevantMonths.map(item => {
-            // Convert month number to abbreviated name
-            const monthName = new Date(item.year, item.month - 1, 1).toLocaleString('en-US', { month: 'short' })
+        this.applyMonthlyStats(await api.getMonthlyStats(timeRange), timeRange)
+      } catch (error) {
+        console.error('Error fetching monthly stats:', error)
+        // Keep using calculated values from transactions
+      }
+    },
+    
+    applyMonthlyStats(response, timeRange = '6months') {
+      // Get current date for calculations
+      const currentDate = new Date()
+      const currentMonth = currentDate.getMonth() + 1 // JavaScript months are 0-11, API data is 1-12
+      const currentYear = currentDate.getFullYear()
+      
+      // Calculate start date based on time range
+      let monthsToInclude = 6
+      let startDate = null
+      
+      switch(timeRange) {
+        case '3months':
+          monthsToInclude = 3
+          break
+        case '6months':
+          monthsToInclude = 6
+          break
+        case '1year':
+          monthsToInclude = 12
+          break
+        case 'all':
+          monthsToInclude = null // No limit
+          break
+        default:
+          monthsToInclude = 6
+      }
+      
+      if (Array.isArray(response)) {
+        console.log('Monthly data received from backend:', response)
+        
+        // Filter months based on selected time range
+        let relevantMonths = response
+        
+        if (monthsToInclude !== null) {
+          relevantMonths = response.filter(item => {
+            // Calculate if this month is within the selected time range
+            // For months in current year
+            if (item.year === currentYear) {
+              return item.month <= currentMonth && item.month > currentMonth - monthsToInclude
+            }
             
-            return {
-              month: monthName,
-              income: parseFloat(item.income || 0),
-              expense: parseFloat(item.expenses || 0),
-              balance: parseFloat(item.savings || 0)
+            // For months in previous year (if timeRange spans across years)
+            if (monthsToInclude > currentMonth && item.year === currentYear - 1) {
+              return item.month > 12 - (monthsToInclude - currentMonth)
             }
+            
+            return false
           })
-          
-          console.log('Monthly data processed for chart:', this.monthlyStats)
         }
-      } catch (error) {
-        console.error('Error fetching monthly stats:', error)
-        // Keep using calculated values from transactions
+        
+        // Sort months chronologically
+        relevantMonths.sort((a, b) => {
+          if (a.year !== b.year) return a.year - b.year
+          return a.month - b.month
+        })
+        
+        console.log('Relevant months selected and sorted:', relevantMonths)
+        
+        // Convert data to the format required by the chart
+        this.monthlyStats = relevantMonths.map(item => {
+          // Convert month number to abbreviated name
+          const monthName = new Date(item.year, item.month - 1, 1).toLocaleString('en-US', { month: 'short' })
+          
+          return {
+            month: monthName,
+            income: parseFloat(item.income || 0),
+            expense: parseFloat(item.expenses || 0),
+            balance: parseFloat(item.savings || 0)
+          }
+        })
+        
+        console.log('Monthly data processed for chart:', this.monthlyStats)
       }
     },
     
@@ -377,23 +410,46 @@ export const useTransactionsStore = defineStore('transactions', {
         const api = useApi()
         
         // Get category expense data from API with time range parameter
-        const response = await api.getCategoryStats(timeRange)
-        
-        if (response && response.length > 0) {
-          console.log('Category stats received from backend:', response)
-          
-          // Update category expenses in store
-          this.summary.categoryExpenses = response.map(item => ({
-            category: item.category || item.label,
-            amount: parseFloat(item.total || item.amount || 0)
-          }))
-        }
+        this.applyCategoryStats(await api.getCategoryStats(timeRange))
       } catch (error) {
         console.error('Error fetching category stats:', error)
         // We'll fall back to calculated values from transactions
       }
     },
     
+    applyCategoryStats(response) {
+      if (response && response.length > 0) {
+        console.log('Category stats received from backend:', response)
+        
+        // Update category expenses in store
+        this.summary.categoryExpenses = response.map(item => ({
+          category: item.category || item.label,
+          amount: parseFloat(item.total || item.amount || 0)
+        }))
+      }
+    },
+    
+    async fetchDashboard(monthlyTimeRange = '6months', categoryTimeRange = '6months') {
+      const api = useApi()
+      let response
+      try {
+        response = await api.getDashboard(monthlyTimeRange, categoryTimeRange, this.syncToken)
+      } catch (error) {
+        if (error.status !== 410) throw error
+        // The sync token expired: start over with a full sync
+        this.syncToken = null
+        response = await api.getDashboard(monthlyTimeRange, categoryTimeRange)
+      }
+      
+      // One response carries every payload; the summary goes first so that
+      // the category chart keeps the selected time range
+      this.categories = response.categories
+      this.applySummary(response.summary)
+      this.applyMonthlyStats(response.monthly_summary, monthlyTimeRange)
+      this.applyCategoryStats(response.category_summary)
+      await this.fetchTransactions(response.transactions)
+    },
+    
     async addTransaction(transaction) {
       this.loading = true
       this.error = null